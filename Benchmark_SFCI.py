@@ -0,0 +1,246 @@
+'''
+Benchmark_SFCI.py - Micro-benchmarks of the hot functions in Run_SFCI_Tests, RequestGen
+and utilities, run on a synthetic test corpus, with a stored baseline and a regression gate.
+
+Each benchmark is timed with timeit: the loop count is picked so one timing run takes at
+least 0.2 seconds, and the best of the repeated runs is kept as the time per operation
+(one test file, one board, one call...).  The best run is the one least disturbed by
+the rest of the machine, so it's the steadiest number to compare between runs.
+
+The synthetic corpus is N .passtest and N .expfail files, written in the repo's test
+definition format to a scratch directory, each with a full 32-piece starting board.
+
+Results are compared against the baseline file (if there is one) and any benchmark more
+than the threshold percent slower than its baseline is reported as REGRESSED - and we
+exit with 1, so a build script can gate on it.  Baselines are only meaningful on the
+machine (and python) they were saved on, so save one before starting performance work
+and check against it as you go.
+
+USAGE: python Benchmark_SFCI.py [-n N] [-r R] [-k NAME] [--baseline FILE] [--save-baseline] [--threshold PCT]
+       -n, --size N: synthetic test files of each kind in the corpus (Default 200)
+       -r, --repeat R: timing runs per benchmark, best one kept (Default 5)
+       -k NAME: only run the benchmarks with NAME in their name
+       --baseline FILE: baseline file to compare with & save to (Default Benchmark_Baseline.json)
+       --save-baseline: save these results as the new baseline (merged into any existing one)
+       --threshold PCT: percent slower than the baseline that counts as a regression (Default 20)
+
+Copyright 2016, Dan Doran, Boulder, CO
+'''
+import sys
+import os
+import io
+import json
+import time
+import timeit
+import platform
+import tempfile
+import contextlib
+import utilities # Local Module
+import board # Local Module
+import Run_SFCI_Tests # Local Module - the runner's functions, not a test run
+import RequestGen # Local Module - the generator's functions, not an interactive session
+
+usageMessage = "Usage: python Benchmark_SFCI.py [-n N] [-r R] [-k NAME] [--baseline FILE] [--save-baseline] [--threshold PCT]"
+minTimingSeconds = 0.2 # Each timing run loops until it takes at least this long
+# Command line options that take a value, the benchOptions entry each one sets, and those that are just switched on
+benchOptionNames = {'-n' : "size", '--size' : "size", '-r' : "repeat", '--repeat' : "repeat", '-k' : "nameFilter",
+                    '--baseline' : "baselineFileName", '--threshold' : "threshold"}
+benchFlagNames = {'--save-baseline' : "saveBaseline"}
+
+# The standard starting position, white pieces first
+startRow = "RNBQKBNR"
+startBoard = board.Board()
+for columnIter, column in enumerate(board.boardColumns):
+    startBoard.SetPiece(board.GetSquareIndex(column + "1"), startRow[columnIter])
+    startBoard.SetPiece(board.GetSquareIndex(column + "2"), "P")
+    startBoard.SetPiece(board.GetSquareIndex(column + "7"), "p")
+    startBoard.SetPiece(board.GetSquareIndex(column + "8"), startRow[columnIter].lower())
+
+#================================
+# Function Definitions Start Here
+#================================
+
+# GetStartRequest: The JSON-RPC request string for a move on the starting board
+def GetStartRequest(move, playerState):
+    return json.dumps({"method" : "MakeMove", "params" : {"boardState" : startBoard.ToState(), "move" : move,
+                       "playerState" : playerState}, "id" : 1, "jsonrpc" : "2.0"})
+# END GetStartRequest()
+
+# WriteCorpus: Write numTests functional & numTests expected error test files into corpusDir.
+# Functional tests are the 16 white pawn openings, round & round.  Returns the two test dirs.
+def WriteCorpus(corpusDir, numTests):
+    passDir = os.path.join(corpusDir, "expPassTestDir")
+    failDir = os.path.join(corpusDir, "expFailTestDir")
+    os.mkdir(passDir)
+    os.mkdir(failDir)
+    for testIter in range(numTests):
+        column = board.boardColumns[testIter % 8]
+        toRow = "3" if (testIter // 8) % 2 == 0 else "4"
+        testName = "bench_w_pawn_%s2_%s%s_%d" % (column, column, toRow, testIter)
+        with open(os.path.join(passDir, testName + ".passtest"), "w") as testFile:
+            testFile.write("testName : %s\n" % testName)
+            testFile.write("Description : Synthetic white pawn opening %s%s\n" % (column, toRow))
+            testFile.write("request : %s\n" % GetStartRequest(column + toRow, "w"))
+            testFile.write('"gameState": ""\n')
+            testFile.write('"playerState": "b"\n')
+            testFile.write("movedPieces : [{'type': 'P', 'loc': '%s2'}]\n" % column)
+            testFile.write("expectedResponsePieces : [{'type': 'P', 'loc': '%s%s'}]\n" % (column, toRow))
+        testName = "bench_b_pawn_first_move_error_%d" % testIter
+        with open(os.path.join(failDir, testName + ".expfail"), "w") as testFile:
+            testFile.write("testName : %s\n" % testName)
+            testFile.write("Description : Synthetic black pawn moves first - expected Move Error\n")
+            testFile.write("request : %s\n" % GetStartRequest(column + "6", "b"))
+            testFile.write("errorCode : {'code': -32020}\n")
+    return [passDir, failDir]
+# END WriteCorpus()
+
+# GetBenchmarks: Every benchmark as (name, function to time, operations per call)
+def GetBenchmarks(testDirs):
+    testList = utilities.GetDefaultTests([], testDirs)
+    # A full 32-piece functional test and the correct response to it
+    requestDict = json.loads(GetStartRequest("e4", "w"))
+    responseBoard = startBoard.Copy()
+    responseBoard.RemovePiece(board.GetSquareIndex("e2"))
+    responseBoard.SetPiece(board.GetSquareIndex("e4"), "P")
+    responseApi = {"id" : 1, "jsonrpc" : "2.0",
+                   "result" : {"boardState" : responseBoard.ToState(), "gameState" : "", "playerState" : "b"}}
+    expectResponseList = ["", "b", [{"type" : "P", "loc" : "e2"}], [{"type" : "P", "loc" : "e4"}]]
+    requestBoard = Run_SFCI_Tests.GetRequestBoardState(requestDict)
+
+    def BenchGetFileValue():
+        for fullPathTestFileName in testList:
+            utilities.GetFileValue(fullPathTestFileName, "request")
+    def BenchGetDefaultTests():
+        utilities.GetDefaultTests([], testDirs)
+    def BenchGetFinalTestResult():
+        Run_SFCI_Tests.GetFinalTestResult(responseApi, expectResponseList, False, False, requestBoard)
+    def BenchGetRequestBoardState():
+        Run_SFCI_Tests.GetRequestBoardState(requestDict)
+    def BenchDrawCurrentBoard():
+        RequestGen.DrawCurrentBoard(startBoard)
+    def BenchAssembleRequest():
+        RequestGen.AssembleRequest("w", "e4", startBoard)
+
+    return [("utilities.GetFileValue (per file)", BenchGetFileValue, len(testList)),
+            ("utilities.GetDefaultTests (per listing)", BenchGetDefaultTests, 1),
+            ("Run_SFCI_Tests.GetFinalTestResult (32 pieces)", BenchGetFinalTestResult, 1),
+            ("Run_SFCI_Tests.GetRequestBoardState (32 pieces)", BenchGetRequestBoardState, 1),
+            ("RequestGen.DrawCurrentBoard (32 pieces)", BenchDrawCurrentBoard, 1),
+            ("RequestGen.AssembleRequest (32 pieces)", BenchAssembleRequest, 1)]
+# END GetBenchmarks()
+
+# TimeBenchmark: Best seconds per operation of one benchmark over numRepeats timing runs.
+# Whatever the function prints goes nowhere, so we time the work and not the terminal.
+def TimeBenchmark(benchFunction, opsPerCall, numRepeats):
+    timer = timeit.Timer(benchFunction)
+    with contextlib.redirect_stdout(io.StringIO()):
+        numLoops = 1
+        while timer.timeit(numLoops) < minTimingSeconds:
+            numLoops *= 2
+        bestSeconds = min(timer.repeat(repeat=numRepeats, number=numLoops))
+    return bestSeconds / numLoops / opsPerCall
+# END TimeBenchmark()
+
+# ReadBaseline: The baseline file's contents, or an empty baseline if there isn't one
+def ReadBaseline(baselineFileName):
+    if not(os.path.isfile(baselineFileName)):
+        return {"results" : {}}
+    with open(baselineFileName, "r") as baselineFile:
+        return json.load(baselineFile)
+# END ReadBaseline()
+
+# GetBenchOptions: Parse the command line.  Returns a benchOptions dict, or None to exit.
+def GetBenchOptions(argv):
+    benchOptions = {"size" : 200, "repeat" : 5, "nameFilter" : "", "baselineFileName" : "Benchmark_Baseline.json",
+                    "saveBaseline" : False, "threshold" : 20.0}
+    argIter = 1
+    while argIter < len(argv):
+        option = argv[argIter]
+        if option in ('-h', '-H', '--help'):
+            print(usageMessage)
+            return None
+        if option in benchFlagNames:
+            benchOptions[benchFlagNames[option]] = True
+            argIter += 1
+            continue
+        if option not in benchOptionNames or argIter + 1 >= len(argv):
+            print("Unknown option or missing value for %s" % option)
+            print(usageMessage)
+            return None
+        optionName = benchOptionNames[option]
+        optionValue = argv[argIter + 1]
+        argIter += 2
+        if isinstance(benchOptions[optionName], float):
+            if not(utilities.RepresentsFloat(optionValue)) or float(optionValue) <= 0:
+                print("Invalid value '%s' for %s. Must be a number greater than 0." % (optionValue, option))
+                return None
+            benchOptions[optionName] = float(optionValue)
+        elif isinstance(benchOptions[optionName], int):
+            if not(utilities.RepresentsInt(optionValue)) or int(optionValue) < 1:
+                print("Invalid value '%s' for %s. Must be an integer of 1 or more." % (optionValue, option))
+                return None
+            benchOptions[optionName] = int(optionValue)
+        else:
+            benchOptions[optionName] = optionValue
+    return benchOptions
+# END GetBenchOptions()
+
+# END FUNCTION DEFINITIONS
+
+#=============================================================================
+# main() main() main() main() main() main() main() main() main() main() main()
+#=============================================================================
+def main():
+    benchOptions = GetBenchOptions(sys.argv)
+    if benchOptions == None:
+        return 1
+    baselineFileName = benchOptions["baselineFileName"]
+    baseline = ReadBaseline(baselineFileName)
+    baselineResults = baseline["results"]
+    threshold = benchOptions["threshold"]
+    print("SFCI micro-benchmarks: %d functional & %d expected error synthetic tests, best of %d runs, python %s"\
+          % (benchOptions["size"], benchOptions["size"], benchOptions["repeat"], platform.python_version()))
+    if baselineResults == {}:
+        print("No baseline in %s yet - nothing to compare with.\n" % baselineFileName)
+    else:
+        print("Comparing with baseline %s (saved %s), regression threshold %.1f%%.\n"\
+              % (baselineFileName, baseline.get("saved", "?"), threshold))
+        if baseline.get("python") != platform.python_version():
+            print("WARNING: The baseline was saved with python %s - compare with care.\n" % baseline.get("python"))
+    results = {}
+    regressions = []
+    print("%-50s %12s %12s %9s" % ("benchmark", "us/op", "baseline", "change"))
+    with tempfile.TemporaryDirectory(prefix="sfci_bench_") as corpusDir:
+        testDirs = WriteCorpus(corpusDir, benchOptions["size"])
+        for benchName, benchFunction, opsPerCall in GetBenchmarks(testDirs):
+            if benchOptions["nameFilter"] not in benchName:
+                continue
+            secondsPerOp = TimeBenchmark(benchFunction, opsPerCall, benchOptions["repeat"])
+            results[benchName] = secondsPerOp
+            if benchName not in baselineResults:
+                print("%-50s %12.2f %12s %9s" % (benchName, secondsPerOp * 1e6, "-", "NEW"))
+                continue
+            change = 100.0 * (secondsPerOp / baselineResults[benchName] - 1.0)
+            status = ""
+            if change > threshold:
+                status = "  REGRESSED"
+                regressions.append(benchName)
+            print("%-50s %12.2f %12.2f %+8.1f%%%s" % (benchName, secondsPerOp * 1e6, baselineResults[benchName] * 1e6,
+                                                      change, status))
+    if benchOptions["saveBaseline"]:
+        baselineResults.update(results)
+        baseline = {"saved" : time.strftime("%m/%d/%Y %H:%M:%S"), "python" : platform.python_version(),
+                    "machine" : platform.platform(), "size" : benchOptions["size"], "results" : baselineResults}
+        with open(baselineFileName, "w") as baselineFile:
+            json.dump(baseline, baselineFile, indent=2, sort_keys=True)
+        print("\nSaved these results as the baseline in %s" % baselineFileName)
+    if regressions != []:
+        print("\n%d benchmark(s) more than %.1f%% slower than the baseline:" % (len(regressions), threshold))
+        for benchName in regressions:
+            print("    %s" % benchName)
+        return 1
+    return 0
+
+# This is the standard boilerplate that calls the main() function.
+if __name__ == '__main__':
+  sys.exit(main())
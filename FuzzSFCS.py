@@ -0,0 +1,591 @@
+'''
+FuzzSFCS.py - A MakeMove fuzzer for the SolidFire Chess Service (SFCS) JSON-RPC API.
+Our hand-written Invalid_Boards & expected error tests only cover a sliver of the
+boardState/move/playerState input space, so this generates requests by the thousand and
+fires them at the server concurrently, looking for behavior we haven't seen before.
+
+Requests come two ways:
+    random   - a random board (mostly with a king a side, sometimes broken), a random
+               playerState and a move that's either one a piece on the board could make
+               or a random string in our move notation
+    mutated  - a board from the Test_Boards repository or the request of an expFailTestDir
+               test, with one to three mutations: a piece dropped, added, moved (sometimes
+               off the board), recolored or changed, a new or mangled move, a flipped or
+               junk playerState, a missing or mistyped field
+Every input is deduplicated by a canonical hash of its pieces (in any order), move and
+playerState, so the server never sees the same question twice - in this run or, with the
+state file, in any earlier one.
+
+Each response is bucketed by what our rules engine (chessengine, through oracle.py) says
+the request should get and what SFCS actually answered - error code, or result gameState,
+playerState & shape - e.g. "engine error -32020 (move) / SFCS error -32010 (player)".  A
+bucket we've never seen is new behavior, and its first request is saved as a ready-to-run
+test in expFailTestDir/fuzz or expPassTestDir/fuzz (Run_SFCI_Tests picks up subdirectories),
+expecting what the rules engine says.  A response the engine disagrees with is unexpected
+behavior, so its test fails until one of them is fixed - the test's description says what
+SFCS answered.  We exit with 1 if the server disagreed with the engine anywhere.
+
+The buckets seen and the input hashes sent are kept in a sqlite3 state file, so later runs
+only save what's new since.  Keep one state file per server under test.
+
+USAGE: python FuzzSFCS.py [-n N] [-a N] [--seed S] [--random PCT] [--url URL] [--max-saved N]
+                          [--out-dir DIR] [--state FILE | --no-state]
+       -n, --requests N: distinct requests to send (Default 2000)
+       -a, --in-flight N: requests in flight at once (Default 64)
+       --seed S: random seed, to repeat a run (Default: picked from the clock, and printed)
+       --random PCT: percent of the requests that are random rather than mutated (Default 30)
+       --url URL: SFCS JSON-RPC API url to fuzz (Default: the chesstest.solidfire.net server)
+       --max-saved N: most test files to write in one run (Default 50)
+       --out-dir DIR: test root to write the test files under (Default: this directory)
+       --state FILE: buckets & inputs from earlier runs (Default .sfci_fuzz_state.sqlite)
+       --no-state: start from nothing, and keep nothing for next time
+
+Copyright 2016, Dan Doran, Boulder, CO
+'''
+import sys
+import os
+import ast
+import json
+import time
+import random
+import sqlite3
+import asyncio
+import hashlib
+import utilities # Local Module
+import board # Local Module
+import chessengine # Local Module
+import testcase # Local Module
+import asyncclient # Local Module
+import oracle # Local Module
+import RequestGen # Local Module - for its test file assembly, not an interactive session
+
+usageMessage = "Usage: python FuzzSFCS.py [-n N] [-a N] [--seed S] [--random PCT] [--url URL] [--max-saved N]\n\
+                          [--out-dir DIR] [--state FILE | --no-state]"
+rootTestDir = os.getcwd()
+testBoardDir = os.path.join(rootTestDir, "Test_Boards")
+expFailTestDir = os.path.join(rootTestDir, "expFailTestDir")
+fuzzSubDir = "fuzz" # Saved tests go in this subdirectory of expPassTestDir & expFailTestDir
+defaultApiUrl = "http://chesstest.solidfire.net:8080/json-rpc"
+apiheaders = {'content-type': 'application/json'}
+stateFormatVersion = 1 # Bump whenever the bucket names or input hashes change - older state files are then dropped
+# Command line options that take a value, the fuzzOptions entry each one sets, and those that are just switched on
+fuzzOptionNames = {'-n' : "numRequests", '--requests' : "numRequests", '-a' : "inFlight", '--in-flight' : "inFlight",
+                   '--seed' : "seed", '--random' : "randomPercent", '--url' : "apiurl", '--max-saved' : "maxSaved",
+                   '--out-dir' : "outDir", '--state' : "stateFileName"}
+fuzzFlagNames = {'--no-state' : "noState"}
+maxTriesPerRequest = 20 # Fresh inputs to try for each request before deciding the input space is used up
+
+# Ingredients for broken requests
+junkPieceTypes = ("X", "", "PP", "k ", None, 7)
+junkLocs = ("i1", "a9", "e0", "a10", "", "E4", None)
+junkPlayerStates = ("", "W", "white", "x", None, 1)
+junkMoves = ("", "e9", "Zz4", "0-0-0-0", "O-O+", "exd6ep", "Ke1e2e3", None, 42)
+moveChars = "abcdefgh12345678xKQRBNP=+#()-0O"
+backRowSquares = set(range(8)) | set(range(56, 64))
+
+#================================
+# Function Definitions Start Here
+#================================
+
+# GetFuzzOptions: Parse the command line.  Returns a fuzzOptions dict, or None to exit.
+def GetFuzzOptions(argv):
+    fuzzOptions = {"numRequests" : 2000, "inFlight" : 64, "seed" : 0, "randomPercent" : 30, "apiurl" : defaultApiUrl,
+                   "maxSaved" : 50, "outDir" : rootTestDir, "stateFileName" : ".sfci_fuzz_state.sqlite", "noState" : False}
+    argIter = 1
+    while argIter < len(argv):
+        option = argv[argIter]
+        if option in ('-h', '-H', '--help'):
+            print(usageMessage)
+            return None
+        if option in fuzzFlagNames:
+            fuzzOptions[fuzzFlagNames[option]] = True
+            argIter += 1
+            continue
+        if option not in fuzzOptionNames or argIter + 1 >= len(argv):
+            print("Unknown option or missing value for %s" % option)
+            print(usageMessage)
+            return None
+        optionName = fuzzOptionNames[option]
+        optionValue = argv[argIter + 1]
+        argIter += 2
+        if isinstance(fuzzOptions[optionName], int):
+            minimum = 0 if optionName in ("randomPercent", "maxSaved") else 1
+            if not(utilities.RepresentsInt(optionValue)) or int(optionValue) < minimum:
+                print("Invalid value '%s' for %s. Must be an integer of %d or more." % (optionValue, option, minimum))
+                return None
+            fuzzOptions[optionName] = int(optionValue)
+        else:
+            fuzzOptions[optionName] = optionValue
+    if fuzzOptions["randomPercent"] > 100:
+        print("Invalid value '%d' for --random. Must be a percent from 0 to 100." % fuzzOptions["randomPercent"])
+        return None
+    return fuzzOptions
+# END GetFuzzOptions()
+
+# ReadSeedBoard: The boardState list in a Test_Boards file (JSON, or an older python list), or None
+def ReadSeedBoard(boardFileName):
+    with open(boardFileName, 'r') as boardFile:
+        boardStateStr = boardFile.read()
+    try:
+        boardState = json.loads(boardStateStr)
+    except ValueError:
+        try:
+            boardState = ast.literal_eval(boardStateStr)
+        except (ValueError, SyntaxError):
+            return None
+    return boardState if isinstance(boardState, list) else None
+# END ReadSeedBoard()
+
+# GetSeeds: The (seedName, params) inputs we mutate - every Test_Boards board (with no move yet)
+# and the request params of every expFailTestDir test
+def GetSeeds():
+    seeds = []
+    for boardPath in utilities.IterTestFiles([testBoardDir], testExts=""):
+        boardState = ReadSeedBoard(boardPath)
+        if boardState != None:
+            seeds.append((os.path.relpath(boardPath, rootTestDir), {"boardState" : boardState, "move" : None,
+                                                                      "playerState" : "w"}))
+    for testPath in utilities.IterTestFiles([expFailTestDir]):
+        testCase = testcase.ParseTestFile(testPath)
+        params = oracle.GetRequestParams(testCase.requestDict)
+        if testCase.errors == [] and params != None:
+            seeds.append((testCase.name, params))
+    return seeds
+# END GetSeeds()
+
+# GetRandomLoc: A board loc - now and then one that isn't on the board
+def GetRandomLoc(rng):
+    if rng.random() < 0.03:
+        return rng.choice(junkLocs)
+    return board.GetSquareLoc(rng.randrange(64))
+# END GetRandomLoc()
+
+# GetRandomPiece: A piece object of a random type - now and then one that isn't a piece type at all
+def GetRandomPiece(rng):
+    pieceType = rng.choice(junkPieceTypes) if rng.random() < 0.03 else rng.choice(board.pieceTypes)
+    return {"type" : pieceType, "loc" : GetRandomLoc(rng)}
+# END GetRandomPiece()
+
+# GetRandomBoardState: A random board of 2 to 32 pieces.  Most are set up by the rules - one king a side,
+# every piece on a square of its own, no pawn on the first or last row, and (after a few tries) not both
+# kings in check - so the move gets looked at; the rest are thrown together any old way, for the board checks.
+def GetRandomBoardState(rng):
+    if rng.random() < 0.2:
+        return [GetRandomPiece(rng) for pieceIter in range(rng.randint(0, 32))]
+    for tryIter in range(5):
+        squares = rng.sample(range(64), 2 + int(30 * rng.random() ** 2)) # Mostly sparse - crowded boards are all check
+        testBoard = board.Board()
+        testBoard.SetPiece(squares[0], "K")
+        testBoard.SetPiece(squares[1], "k")
+        for pieceIter, square in enumerate(squares[2:]):
+            pieceType = rng.choice("PPRNBQ") if square not in backRowSquares else rng.choice("RNBQ")
+            testBoard.SetPiece(square, pieceType.lower() if pieceIter % 2 == 1 else pieceType) # Half the pieces each
+        position = chessengine.GetPosition(testBoard)
+        if not(chessengine.IsInCheck(position, 0) and chessengine.IsInCheck(position, 1)):
+            break
+    boardState = testBoard.ToState()
+    rng.shuffle(boardState)
+    return boardState
+# END GetRandomBoardState()
+
+# GetRandomPlayer: w or b to move on a board - on a board where one side is giving check, that side
+def GetRandomPlayer(boardState, rng):
+    playerState = rng.choice(chessengine.playerColors)
+    testBoard, boardError = board.BoardFromState(boardState)
+    if boardError == "" and chessengine.GetBoardError(testBoard) == "":
+        color = chessengine.playerColors.index(playerState)
+        if chessengine.IsInCheck(chessengine.GetPosition(testBoard), 1 - color):
+            return chessengine.playerColors[1 - color]
+    return playerState
+# END GetRandomPlayer()
+
+# FormatMove: One of the engine's (from, to, piece, promotion, kind) moves in our test notation, written
+# one of the ways SFCS should take - with or without the start column or square
+def FormatMove(move, testBoard, rng):
+    fromSquare, toSquare, piece, promotion, kind = move
+    if kind == chessengine.castlingMove:
+        return "0-0" if toSquare > fromSquare else "0-0-0"
+    pieceLetter = "PRNBQK"[piece % 6]
+    fromLoc = board.GetSquareLoc(fromSquare)
+    isCapture = testBoard.squares[toSquare] != 0 or kind == chessengine.enPassantMove
+    moveString = "" if pieceLetter == "P" and rng.random() < 0.9 else pieceLetter
+    moveString += rng.choice(("", fromLoc[0], fromLoc)) if pieceLetter != "P" or not(isCapture) else fromLoc[0]
+    moveString += ("x" if isCapture and rng.random() < 0.95 else "") + board.GetSquareLoc(toSquare)
+    if promotion >= 0:
+        moveString += "=" + "PRNBQK"[promotion % 6]
+    if kind == chessengine.enPassantMove:
+        moveString += "(ep)"
+    return moveString
+# END FormatMove()
+
+# GetRandomMoveString: A random move string in the shape of our notation
+def GetRandomMoveString(rng):
+    if rng.random() < 0.2:
+        return rng.choice(junkMoves)
+    moveString = rng.choice(("", "", "K", "Q", "R", "B", "N", "P")) + rng.choice(("", "", rng.choice(board.boardColumns)))
+    moveString += rng.choice(("", "x")) + (GetRandomLoc(rng) or "")
+    return moveString + rng.choice(("", "", "", "=Q", "=N", "(ep)", "+", "#"))
+# END GetRandomMoveString()
+
+# GetRandomMove: A move for params' board & playerState - one a piece on the board could make (legal or not)
+# most of the time, otherwise a random string
+def GetRandomMove(params, rng):
+    boardState = params.get("boardState")
+    testBoard, boardError = board.BoardFromState(boardState)
+    if boardError != "" or chessengine.GetBoardError(testBoard) != "" or rng.random() < 0.15:
+        return GetRandomMoveString(rng)
+    playerState = params.get("playerState")
+    color = chessengine.playerColors.index(playerState) if playerState in chessengine.playerColors else rng.randrange(2)
+    pseudoMoves = list(chessengine.GetPseudoMoves(chessengine.GetPosition(testBoard), color))
+    if pseudoMoves == []:
+        return GetRandomMoveString(rng)
+    return FormatMove(rng.choice(pseudoMoves), testBoard, rng)
+# END GetRandomMove()
+
+# The mutations - each changes a request's params in place
+def DropPiece(params, rng):
+    if params["boardState"]:
+        params["boardState"].pop(rng.randrange(len(params["boardState"])))
+
+def AddPiece(params, rng):
+    params["boardState"].append(GetRandomPiece(rng))
+
+# (A 'piece' that isn't a piece object at all is replaced with a random one)
+def MovePiece(params, rng):
+    if params["boardState"]:
+        pieceIndex = rng.randrange(len(params["boardState"]))
+        piece = params["boardState"][pieceIndex]
+        if not(isinstance(piece, dict)):
+            piece = GetRandomPiece(rng)
+        params["boardState"][pieceIndex] = dict(piece, loc=GetRandomLoc(rng))
+
+def ChangePiece(params, rng):
+    if params["boardState"]:
+        pieceIndex = rng.randrange(len(params["boardState"]))
+        piece = params["boardState"][pieceIndex]
+        if not(isinstance(piece, dict)):
+            piece = GetRandomPiece(rng)
+        pieceType = piece.get("type")
+        if isinstance(pieceType, str) and rng.random() < 0.5:
+            pieceType = pieceType.swapcase() # Same piece, other side
+        else:
+            pieceType = rng.choice(board.pieceTypes)
+        params["boardState"][pieceIndex] = dict(piece, type=pieceType)
+
+def NewMove(params, rng):
+    params["move"] = GetRandomMove(params, rng)
+
+def MangleMove(params, rng):
+    moveString = params.get("move") if isinstance(params.get("move"), str) else ""
+    editAt = rng.randint(0, len(moveString))
+    editKind = rng.randrange(3)
+    if editKind == 0 or moveString == "": # Insert a character
+        params["move"] = moveString[:editAt] + rng.choice(moveChars) + moveString[editAt:]
+    elif editKind == 1: # Replace one
+        editAt = min(editAt, len(moveString) - 1)
+        params["move"] = moveString[:editAt] + rng.choice(moveChars) + moveString[editAt + 1:]
+    else: # Delete one
+        params["move"] = moveString[:editAt] + moveString[editAt + 1:]
+
+def FlipPlayer(params, rng):
+    if rng.random() < 0.8:
+        params["playerState"] = "b" if params.get("playerState") == "w" else "w"
+    else:
+        params["playerState"] = rng.choice(junkPlayerStates)
+
+def BreakField(params, rng):
+    fieldName = rng.choice(("boardState", "move", "playerState"))
+    if rng.random() < 0.5:
+        params.pop(fieldName, None)
+    else:
+        params[fieldName] = rng.choice(({}, [], 0, "", [params.get(fieldName)]))
+
+# The mutations, as (weight, function) - breaking a field outright is rarely interesting twice
+mutations = ((4, DropPiece), (3, AddPiece), (4, MovePiece), (3, ChangePiece), (5, NewMove), (3, MangleMove),
+             (2, FlipPlayer), (1, BreakField))
+mutationWeights = [weight for weight, Mutate in mutations]
+mutationFunctions = [Mutate for weight, Mutate in mutations]
+# END mutations
+
+# GetFuzzParams: One new set of request params.  Returns (origin, params) - origin says where it came from.
+def GetFuzzParams(seeds, rng, randomPercent):
+    if seeds == [] or rng.random() * 100 < randomPercent:
+        boardState = GetRandomBoardState(rng)
+        params = {"boardState" : boardState, "move" : None, "playerState" : GetRandomPlayer(boardState, rng)}
+        params["move"] = GetRandomMove(params, rng)
+        return ("random", params)
+    seedName, seedParams = rng.choice(seeds)
+    params = dict(seedParams, boardState=[dict(piece) if isinstance(piece, dict) else piece
+                                          for piece in seedParams["boardState"]])
+    if params["move"] == None: # A Test_Boards board - give it a move first
+        NewMove(params, rng)
+    for Mutate in rng.choices(mutationFunctions, mutationWeights, k=rng.randint(1, 3)):
+        if isinstance(params.get("boardState"), list):
+            Mutate(params, rng)
+    return ("mutated from %s" % seedName, params)
+# END GetFuzzParams()
+
+# GetInputKey: The canonical hash of a request - its pieces in any order, move & playerState
+def GetInputKey(requestDict):
+    params = oracle.GetRequestParams(requestDict)
+    verdictKey = oracle.GetVerdictKey(params) if params != None else None
+    if verdictKey != None:
+        canonicalRequest = repr(verdictKey)
+    else:
+        canonicalRequest = json.dumps(requestDict, sort_keys=True, default=repr)
+    return hashlib.sha1(canonicalRequest.encode("utf-8")).hexdigest()
+# END GetInputKey()
+
+# DescribeVerdict: What the rules engine says a request should get, as a bucket part
+def DescribeVerdict(verdict):
+    if verdict == None:
+        return "unjudged"
+    resultBoard, gameState, playerState, errorCode, errorString = verdict
+    if errorCode != 0:
+        return "error %s" % oracle.GetErrorClass(errorCode)
+    return "result gameState '%s'" % gameState
+# END DescribeVerdict()
+
+# DescribeResponse: What SFCS answered, as a bucket part - the error code, or the result's gameState,
+# playerState & shape (its keys, if they aren't the usual three)
+def DescribeResponse(responseApi):
+    if not(isinstance(responseApi, dict)):
+        return str(responseApi) # timeout, connection-error or bad-response
+    if responseApi.get("error") != None:
+        responseError = responseApi["error"]
+        return "error %s" % oracle.GetErrorClass(responseError.get("code") if isinstance(responseError, dict) else None)
+    resultValue = responseApi.get("result")
+    if not(isinstance(resultValue, dict)):
+        return "result %s" % type(resultValue).__name__
+    responseDescription = "result gameState '%s' playerState %s" % (resultValue.get("gameState"), resultValue.get("playerState"))
+    if sorted(resultValue) != ["boardState", "gameState", "playerState"]:
+        responseDescription += " keys %s" % ",".join(sorted(resultValue))
+    return responseDescription
+# END DescribeResponse()
+
+# GetBucketSlug: A bucket as a short test name part, e.g. 'move_error_as_player_error'
+def GetBucketSlug(verdict, responseApi):
+    def GetPart(errorCode, gameState):
+        if errorCode != 0:
+            return "%s_error" % oracle.errorClassNames.get(errorCode, "unknown")
+        return "%s_result" % (gameState or "legal")
+    enginePart = "unjudged" if verdict == None else GetPart(verdict[3], verdict[1])
+    if not(isinstance(responseApi, dict)):
+        return "%s_as_%s" % (enginePart, str(responseApi).replace("-", "_"))
+    if responseApi.get("error") != None:
+        responseError = responseApi["error"]
+        responsePart = GetPart(responseError.get("code") if isinstance(responseError, dict) else None, "")
+    else:
+        resultValue = responseApi.get("result")
+        responsePart = GetPart(0, resultValue.get("gameState") if isinstance(resultValue, dict) else "odd")
+    return "%s_as_%s" % (enginePart, responsePart)
+# END GetBucketSlug()
+
+# GetFindingTest: A ready-to-run test definition for a request we want to keep, expecting what the rules
+# engine says (or, for a request it can't judge, the error SFCS gave).
+# Returns (testType 'e' or 'f', contents), or (None, why not).
+def GetFindingTest(testName, requestDict, verdict, responseApi, testDescription):
+    request = "request : %s" % json.dumps(dict(requestDict, id=1))
+    if verdict == None:
+        if not(isinstance(responseApi, dict)) or not(isinstance(responseApi.get("error"), dict)):
+            return (None, "the rules engine can't judge the request, and SFCS gave no error code to expect")
+        return ('e', RequestGen.AssembleExpErrTestContents(testName, testDescription, request,
+                                                           {"code" : responseApi["error"].get("code")}))
+    resultBoard, gameState, playerState, errorCode, errorString = verdict
+    if errorCode != 0:
+        return ('e', RequestGen.AssembleExpErrTestContents(testName, testDescription, request, {"code" : errorCode}))
+    testBoard, boardError = board.BoardFromState(requestDict["params"]["boardState"])
+    movedPieces, expectedResponsePieces = RequestGen.GetEnginePieces(testBoard, resultBoard)
+    return ('f', RequestGen.AssembleFuncTestContents(testName, testDescription, request,
+                                                     '"gameState": "%s"\n' % gameState, '"playerState": "%s"\n' % playerState,
+                                                     movedPieces, expectedResponsePieces))
+# END GetFindingTest()
+
+# FuzzState: The buckets we've seen and the inputs we've sent, in this run and (from the state file) earlier ones
+class FuzzState:
+    def __init__(self, stateFileName=None):
+        self.connection = None
+        if stateFileName != None:
+            try:
+                self.connection = self.OpenState(stateFileName)
+            except sqlite3.Error:
+                # Unusable state file - start over with a fresh one
+                os.remove(stateFileName)
+                self.connection = self.OpenState(stateFileName)
+        self.sentInputs = set()
+        self.buckets = {} # bucket : test file saved for it ("" if none)
+        if self.connection != None:
+            self.sentInputs = set(row[0] for row in self.connection.execute("SELECT key FROM inputs"))
+            self.buckets = dict(self.connection.execute("SELECT bucket, testFile FROM buckets"))
+        self.numEarlierInputs = len(self.sentInputs)
+        self.pendingInputs = []  # (key,) rows to write
+        self.pendingBuckets = [] # (bucket, testFile) rows to write
+
+    # Open (or create) the state file, dropping what's in it if it was written by an older version of us
+    def OpenState(self, stateFileName):
+        connection = sqlite3.connect(stateFileName)
+        if connection.execute("PRAGMA user_version").fetchone()[0] != stateFormatVersion:
+            connection.execute("DROP TABLE IF EXISTS inputs")
+            connection.execute("DROP TABLE IF EXISTS buckets")
+            connection.execute("PRAGMA user_version = %d" % stateFormatVersion)
+        connection.execute("CREATE TABLE IF NOT EXISTS inputs (key TEXT PRIMARY KEY)")
+        connection.execute("CREATE TABLE IF NOT EXISTS buckets (bucket TEXT PRIMARY KEY, testFile TEXT)")
+        connection.commit()
+        return connection
+
+    # Remember an input we're about to send.  Returns False if it's been sent before.
+    def AddInput(self, inputKey):
+        if inputKey in self.sentInputs:
+            return False
+        self.sentInputs.add(inputKey)
+        self.pendingInputs.append((inputKey,))
+        return True
+
+    def IsNewBucket(self, bucket):
+        return bucket not in self.buckets
+
+    def AddBucket(self, bucket, testFile):
+        self.buckets[bucket] = testFile
+        self.pendingBuckets.append((bucket, testFile))
+
+    # Write what's new to the state file and close it.  Safe to call more than once.
+    def Close(self):
+        if self.connection == None:
+            return
+        self.connection.executemany("INSERT OR IGNORE INTO inputs VALUES (?)", self.pendingInputs)
+        self.connection.executemany("INSERT OR REPLACE INTO buckets VALUES (?, ?)", self.pendingBuckets)
+        self.connection.commit()
+        self.connection.close()
+        self.connection = None
+        self.pendingInputs = []
+        self.pendingBuckets = []
+# END class FuzzState
+
+# RecordResponse: Bucket one response, and save its request as a test if its bucket is new.
+# fuzzRun holds the run's oracle, state, counts & options.
+def RecordResponse(fuzzRun, origin, requestDict, responseApi):
+    fuzzOracle = fuzzRun["oracle"]
+    verdict = fuzzOracle.GetVerdict(requestDict)
+    oracleOutcome, oracleDetails = (oracle.oracleUnchecked, "")
+    if isinstance(responseApi, dict):
+        oracleOutcome, oracleDetails = fuzzOracle.CheckResponse(requestDict, responseApi)
+    bucket = "engine %s / SFCS %s" % (DescribeVerdict(verdict), DescribeResponse(responseApi))
+    if oracleOutcome == oracle.oracleDisagreed:
+        bucket += " (DISAGREES)"
+        fuzzRun["numDisagreed"] += 1
+    fuzzRun["bucketCounts"][bucket] = fuzzRun["bucketCounts"].get(bucket, 0) + 1
+    fuzzState = fuzzRun["state"]
+    if not(fuzzState.IsNewBucket(bucket)):
+        return
+    fuzzRun["newBuckets"].append(bucket)
+    if fuzzRun["numSaved"] >= fuzzRun["options"]["maxSaved"]:
+        fuzzState.AddBucket(bucket, "")
+        return
+    testName = "fuzz_%s_%s" % (GetBucketSlug(verdict, responseApi), GetInputKey(requestDict)[:10])
+    testDescription = "Description : Fuzzed request (%s) - new behavior '%s'." % (origin, bucket)
+    if oracleOutcome == oracle.oracleDisagreed:
+        testDescription += " Expects what the rules engine says; %s." % oracleDetails
+    testType, testFileContents = GetFindingTest("testName : " + testName, requestDict, verdict, responseApi, testDescription + "\n")
+    if testType == None:
+        print("New behavior '%s' - no test written: %s" % (bucket, testFileContents))
+        fuzzState.AddBucket(bucket, "")
+        return
+    testDir = os.path.join(fuzzRun["options"]["outDir"], RequestGen.expFailDir if testType == 'e' else RequestGen.expPassDir, fuzzSubDir)
+    os.makedirs(testDir, exist_ok=True)
+    testPath = os.path.join(testDir, testName + (RequestGen.expFailFileExt if testType == 'e' else RequestGen.expPassFileExt))
+    utilities.WriteFileAtomic(testPath, testFileContents)
+    fuzzRun["numSaved"] += 1
+    fuzzState.AddBucket(bucket, os.path.relpath(testPath, fuzzRun["options"]["outDir"]))
+    print("New behavior '%s' - saved %s" % (bucket, os.path.relpath(testPath, fuzzRun["options"]["outDir"])))
+# END RecordResponse()
+
+# FuzzOne: Post one fuzzed request and bucket the answer
+async def FuzzOne(fuzzRun, apiClient, origin, requestDict):
+    try:
+        responseApi = await apiClient.Post(json.dumps(requestDict))
+    except asyncio.TimeoutError:
+        responseApi = "timeout"
+    except (OSError, asyncio.IncompleteReadError):
+        responseApi = "connection-error"
+    except ValueError:
+        responseApi = "bad-response"
+    RecordResponse(fuzzRun, origin, requestDict, responseApi)
+# END FuzzOne()
+
+# RunFuzzAsync: Generate & send numRequests distinct requests, inFlight at a time.  Returns how many went out.
+async def RunFuzzAsync(fuzzRun, seeds, rng):
+    fuzzOptions = fuzzRun["options"]
+    apiClient = asyncclient.AsyncAPIClient(fuzzOptions["apiurl"], apiheaders, fuzzOptions["inFlight"])
+    pendingRequests = set()
+    numSent = 0
+    try:
+        while numSent < fuzzOptions["numRequests"]:
+            for tryIter in range(maxTriesPerRequest):
+                origin, params = GetFuzzParams(seeds, rng, fuzzOptions["randomPercent"])
+                requestDict = {"method" : "MakeMove", "params" : params, "id" : numSent + 1, "jsonrpc" : "2.0"}
+                if fuzzRun["state"].AddInput(GetInputKey(requestDict)):
+                    break
+                fuzzRun["numDuplicates"] += 1
+            else:
+                print("Only duplicate inputs after %d tries - stopping early." % maxTriesPerRequest)
+                break
+            if len(pendingRequests) >= fuzzOptions["inFlight"]:
+                doneRequests, pendingRequests = await asyncio.wait(pendingRequests, return_when=asyncio.FIRST_COMPLETED)
+                for doneRequest in doneRequests:
+                    doneRequest.result() # Raise anything that went wrong recording it
+            pendingRequests.add(asyncio.ensure_future(FuzzOne(fuzzRun, apiClient, origin, requestDict)))
+            numSent += 1
+        if pendingRequests:
+            await asyncio.gather(*pendingRequests)
+    finally:
+        for pendingRequest in pendingRequests:
+            pendingRequest.cancel()
+        await apiClient.Close()
+    return numSent
+# END RunFuzzAsync()
+
+# END FUNCTION DEFINITIONS
+
+#=============================================================================
+# main() main() main() main() main() main() main() main() main() main() main()
+#=============================================================================
+def main():
+    fuzzOptions = GetFuzzOptions(sys.argv)
+    if fuzzOptions == None:
+        return 1
+    if fuzzOptions["seed"] == 0:
+        fuzzOptions["seed"] = int(time.time() * 1000) % 1000000000
+    rng = random.Random(fuzzOptions["seed"])
+    fuzzOptions["outDir"] = os.path.abspath(fuzzOptions["outDir"])
+    seeds = GetSeeds()
+    fuzzState = FuzzState(None if fuzzOptions["noState"] else fuzzOptions["stateFileName"])
+    fuzzRun = {"options" : fuzzOptions, "oracle" : oracle.Oracle(1000), "state" : fuzzState, "bucketCounts" : {},
+               "newBuckets" : [], "numSaved" : 0, "numDisagreed" : 0, "numDuplicates" : 0}
+    print("Fuzzing %s with %d requests, %d in flight, seed %d: %d%% random, the rest mutated from %d seeds."\
+          % (fuzzOptions["apiurl"], fuzzOptions["numRequests"], fuzzOptions["inFlight"], fuzzOptions["seed"],
+             fuzzOptions["randomPercent"], len(seeds)))
+    if fuzzState.numEarlierInputs > 0 or fuzzState.buckets != {}:
+        print("State file %s: %d inputs & %d buckets from earlier runs.\n" % (fuzzOptions["stateFileName"],
+              fuzzState.numEarlierInputs, len(fuzzState.buckets)))
+    startTime = time.perf_counter()
+    try:
+        numSent = asyncio.run(RunFuzzAsync(fuzzRun, seeds, rng))
+    finally:
+        fuzzState.Close()
+    runSeconds = time.perf_counter() - startTime
+
+    print("\n      **** FUZZ RUN COMPLETED! ****")
+    print("%d distinct requests in %.1f seconds (%.0f/s), %d duplicate inputs skipped." % (numSent, runSeconds,
+          numSent / runSeconds if runSeconds > 0 else 0.0, fuzzRun["numDuplicates"]))
+    print("%d responses the rules engine DISAGREED with, %d new behavior buckets, %d test files written.\n"\
+          % (fuzzRun["numDisagreed"], len(fuzzRun["newBuckets"]), fuzzRun["numSaved"]))
+    print("%8s  %s" % ("count", "bucket (what the rules engine expects / what SFCS answered)"))
+    for bucket, count in sorted(fuzzRun["bucketCounts"].items(), key=lambda bucketCount: -bucketCount[1]):
+        print("%8d  %s%s" % (count, bucket, "  NEW" if bucket in fuzzRun["newBuckets"] else ""))
+    if fuzzRun["numSaved"] > 0:
+        print("\nRun the saved tests with: python Run_SFCI_Tests.py (they're in the %s subdirectories)" % fuzzSubDir)
+    return 1 if fuzzRun["numDisagreed"] > 0 else 0
+
+# This is the standard boilerplate that calls the main() function.
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,257 @@
+'''
+MergeReports.py - Combine the results of a Run_SFCI_Tests run that was split across
+machines with '--shard i/n' into one consolidated set of results.
+
+Give it each shard's Test_Summary_<date>_<time>.json file (or a directory holding them -
+all the summaries in it are used).  The report, log & JSONL record files each summary
+names are looked for next to it, and combined in shard order into:
+    Merged_Results_<date>_<time>.report  - every shard's report, one after the other
+    Merged_API_<date>_<time>.log         - every shard's API log, one after the other
+    Merged_Records_<date>_<time>.jsonl   - every shard's test records (with a new .idx index)
+    Merged_Summary_<date>_<time>.json    - the combined counts ('--oracle' ones too) & phase times
+with the consolidated test summary at the end of the report & log, as in a single run.
+
+It warns (and exits with 1) if a shard of the run is missing or was given twice.
+
+USAGE: python MergeReports.py [-o PREFIX] summary_or_dir [summary_or_dir ...]
+       -o PREFIX: start the merged file names with PREFIX instead of 'Merged'
+
+Copyright 2016, Dan Doran, Boulder, CO
+'''
+import sys
+import os
+import json
+import time
+import shutil
+import sharding # Local Module
+import Run_SFCI_Tests # Local Module - for GetPercent(), so the numbers read like a single run's
+
+usageMessage = "Usage: python MergeReports.py [-o PREFIX] summary_or_dir [summary_or_dir ...]"
+todaysDate = time.strftime("%m_%d_%Y")
+timeStart = time.strftime("%H_%M_%S")
+summaryFilePrefix = "Test_Summary_"
+
+#================================
+# Function Definitions Start Here
+#================================
+
+# GetSummaryFiles: Expand the command line's summary files & directories into a list of summary files
+def GetSummaryFiles(summaryArgs):
+    summaryFiles = []
+    for summaryArg in summaryArgs:
+        if os.path.isdir(summaryArg):
+            summaryFiles.extend(sorted(os.path.join(summaryArg, fileName) for fileName in os.listdir(summaryArg)
+                                       if fileName.startswith(summaryFilePrefix) and fileName.endswith(".json")))
+        else:
+            summaryFiles.append(summaryArg)
+    return summaryFiles
+# END GetSummaryFiles()
+
+# ReadShardSummaries: Read every shard's summary.  Returns a list of summary dicts, each with the
+# directory it came from in "dir", in shard order - or None (after saying why) if one is unusable.
+def ReadShardSummaries(summaryFiles):
+    shardSummaries = []
+    for summaryFileName in summaryFiles:
+        try:
+            with open(summaryFileName, "r") as summaryFile:
+                shardSummary = json.load(summaryFile)
+        except (OSError, ValueError) as readError:
+            print("Process ERROR: Unable to read summary file %s: %s" % (summaryFileName, readError))
+            return None
+        if not(isinstance(shardSummary, dict)) or shardSummary.get("record") != "summary" or "numTests" not in shardSummary:
+            print("Process ERROR: %s is not the summary of a test run (load test summaries can't be merged)." % summaryFileName)
+            return None
+        shardSummary["dir"] = os.path.dirname(os.path.abspath(summaryFileName))
+        shardSummary["summaryFile"] = summaryFileName
+        shardSummaries.append(shardSummary)
+    shardSummaries.sort(key=lambda shardSummary: sharding.ParseShard(shardSummary.get("shard", "")) or (0, 0))
+    return shardSummaries
+# END ReadShardSummaries()
+
+# CheckShards: Warnings about shards that are missing, given twice or from differently split runs
+def CheckShards(shardSummaries):
+    warnings = []
+    shardSpecs = [sharding.ParseShard(shardSummary.get("shard", "")) for shardSummary in shardSummaries]
+    if None in shardSpecs:
+        warnings.append("%d of the summaries are not from a '--shard i/n' run." % shardSpecs.count(None))
+        return warnings
+    numShardsSeen = set(numShards for shardIndex, numShards in shardSpecs)
+    if len(numShardsSeen) > 1:
+        warnings.append("The summaries come from runs split %s ways." % " and ".join(str(n) for n in sorted(numShardsSeen)))
+        return warnings
+    numShards = numShardsSeen.pop()
+    shardIndexes = [shardIndex for shardIndex, numShards in shardSpecs]
+    for shardIndex in range(1, numShards + 1):
+        if shardIndexes.count(shardIndex) == 0:
+            warnings.append("Shard %d/%d is missing." % (shardIndex, numShards))
+        elif shardIndexes.count(shardIndex) > 1:
+            warnings.append("Shard %d/%d was given %d times." % (shardIndex, numShards, shardIndexes.count(shardIndex)))
+    return warnings
+# END CheckShards()
+
+# GetShardLabel: How a shard is named in the merged files
+def GetShardLabel(shardSummary):
+    shardLabel = shardSummary.get("shard") or "unsharded run"
+    return "Shard %s (%s)" % (shardLabel, shardSummary["summaryFile"])
+# END GetShardLabel()
+
+# AppendShardFiles: Copy one kind of file (fileKey: "reportFile" or "logFile") from every shard, in
+# shard order, into the merged file, each under a heading.  Returns the files we couldn't find.
+def AppendShardFiles(shardSummaries, fileKey, mergedFile):
+    missingFiles = []
+    for shardSummary in shardSummaries:
+        shardFileName = os.path.join(shardSummary["dir"], shardSummary.get(fileKey, ""))
+        mergedFile.write("\n==================== %s ====================\n" % GetShardLabel(shardSummary))
+        if shardSummary.get(fileKey, "") == "" or not(os.path.isfile(shardFileName)):
+            mergedFile.write("Process ERROR: %s not found.\n" % shardFileName)
+            missingFiles.append(shardFileName)
+            continue
+        with open(shardFileName, "r") as shardFile:
+            shutil.copyfileobj(shardFile, mergedFile)
+    return missingFiles
+# END AppendShardFiles()
+
+# MergeRecords: Copy every shard's test records (not their summary records) into the merged JSONL
+# file, writing a fresh byte offset index for it.  Returns the files we couldn't find.
+def MergeRecords(shardSummaries, mergedRecordFile, mergedIndexFile):
+    missingFiles = []
+    for shardSummary in shardSummaries:
+        shardFileName = os.path.join(shardSummary["dir"], shardSummary.get("recordFile", ""))
+        if shardSummary.get("recordFile", "") == "" or not(os.path.isfile(shardFileName)):
+            missingFiles.append(shardFileName)
+            continue
+        with open(shardFileName, "rb") as shardFile:
+            for recordLine in shardFile:
+                runRecord = json.loads(recordLine)
+                if runRecord.get("record") == "summary":
+                    continue
+                runRecord["shard"] = shardSummary.get("shard", "")
+                WriteRecord(runRecord, mergedRecordFile, mergedIndexFile)
+    return missingFiles
+# END MergeRecords()
+
+# WriteRecord: Append one run record to the merged JSONL file and its location to the index, as reportwriter does
+def WriteRecord(runRecord, mergedRecordFile, mergedIndexFile):
+    recordLine = (json.dumps(runRecord) + "\n").encode("utf-8")
+    mergedIndexFile.write("%d\t%d\t%s\t%s\n" % (mergedRecordFile.tell(), len(recordLine),
+                                                runRecord.get("outcome", runRecord.get("record")), runRecord.get("name", "")))
+    mergedRecordFile.write(recordLine)
+# END WriteRecord()
+
+# MergePhases: Add up every shard's per-phase test times
+def MergePhases(shardSummaries):
+    mergedPhases = {}
+    for shardSummary in shardSummaries:
+        for phaseName, phaseSummary in shardSummary.get("phases", {}).items():
+            mergedPhase = mergedPhases.setdefault(phaseName, {"count" : 0, "seconds" : 0.0, "mean" : 0.0, "max" : 0.0})
+            mergedPhase["count"] += phaseSummary["count"]
+            mergedPhase["seconds"] = round(mergedPhase["seconds"] + phaseSummary["seconds"], 6)
+            mergedPhase["max"] = max(mergedPhase["max"], phaseSummary["max"])
+    for mergedPhase in mergedPhases.values():
+        if mergedPhase["count"] > 0:
+            mergedPhase["mean"] = round(mergedPhase["seconds"] / mergedPhase["count"], 6)
+    return mergedPhases
+# END MergePhases()
+
+# MergeOracleCounts: Add up the '--oracle' agreed/disagreed/unchecked counts of the shards that ran with it.
+# Returns None if none of them did.
+def MergeOracleCounts(shardSummaries):
+    oracleSummaries = [shardSummary["oracle"] for shardSummary in shardSummaries if "oracle" in shardSummary]
+    if oracleSummaries == []:
+        return None
+    mergedCounts = {}
+    for oracleSummary in oracleSummaries:
+        for oracleOutcome, count in oracleSummary.items():
+            mergedCounts[oracleOutcome] = mergedCounts.get(oracleOutcome, 0) + count
+    return mergedCounts
+# END MergeOracleCounts()
+
+# END FUNCTION DEFINITIONS
+
+#=============================================================================
+# main() main() main() main() main() main() main() main() main() main() main()
+#=============================================================================
+def main():
+    filePrefix = "Merged"
+    summaryArgs = sys.argv[1:]
+    if summaryArgs[:1] == ['-o']:
+        if len(summaryArgs) < 2:
+            print(usageMessage)
+            return 1
+        filePrefix = summaryArgs[1]
+        summaryArgs = summaryArgs[2:]
+    if summaryArgs == [] or summaryArgs[0] in ('-h', '-H', '--help'):
+        print(usageMessage)
+        return 1
+    shardSummaries = ReadShardSummaries(GetSummaryFiles(summaryArgs))
+    if shardSummaries == None:
+        return 1
+    if shardSummaries == []:
+        print("Process ERROR: No %s*.json summary files found." % summaryFilePrefix)
+        return 1
+    mergedReportFileName = "%s_Results_%s_%s.report" % (filePrefix, todaysDate, timeStart)
+    mergedLogFileName = "%s_API_%s_%s.log" % (filePrefix, todaysDate, timeStart)
+    mergedRecordFileName = "%s_Records_%s_%s.jsonl" % (filePrefix, todaysDate, timeStart)
+    mergedIndexFileName = "%s_Records_%s_%s.idx" % (filePrefix, todaysDate, timeStart)
+    mergedSummaryFileName = "%s_Summary_%s_%s.json" % (filePrefix, todaysDate, timeStart)
+    warnings = CheckShards(shardSummaries)
+    with open(mergedReportFileName, "w") as mergedReportFile:
+        warnings.extend("Process ERROR: %s not found." % fileName
+                        for fileName in AppendShardFiles(shardSummaries, "reportFile", mergedReportFile))
+    with open(mergedLogFileName, "w") as mergedLogFile:
+        warnings.extend("Process ERROR: %s not found." % fileName
+                        for fileName in AppendShardFiles(shardSummaries, "logFile", mergedLogFile))
+    with open(mergedRecordFileName, "wb") as mergedRecordFile, open(mergedIndexFileName, "w") as mergedIndexFile:
+        warnings.extend("Process ERROR: %s not found." % fileName
+                        for fileName in MergeRecords(shardSummaries, mergedRecordFile, mergedIndexFile))
+        numTests = sum(shardSummary["numTests"] for shardSummary in shardSummaries)
+        numPassingTests = sum(shardSummary["passed"] for shardSummary in shardSummaries)
+        numFailingTests = sum(shardSummary["failed"] for shardSummary in shardSummaries)
+        numTestsExited = sum(shardSummary["exited"] for shardSummary in shardSummaries)
+        mergedSummary = {"record" : "summary", "date" : todaysDate, "time" : timeStart, "numTests" : numTests,
+                         "passed" : numPassingTests, "failed" : numFailingTests, "exited" : numTestsExited,
+                         "reportFile" : mergedReportFileName, "logFile" : mergedLogFileName,
+                         "recordFile" : mergedRecordFileName, "indexFile" : mergedIndexFileName,
+                         "phases" : MergePhases(shardSummaries), "warnings" : warnings,
+                         "shards" : [{"shard" : shardSummary.get("shard", ""), "summaryFile" : shardSummary["summaryFile"],
+                                      "numTests" : shardSummary["numTests"], "passed" : shardSummary["passed"],
+                                      "failed" : shardSummary["failed"], "exited" : shardSummary["exited"]}
+                                     for shardSummary in shardSummaries]}
+        oracleCounts = MergeOracleCounts(shardSummaries)
+        if oracleCounts != None:
+            mergedSummary["oracle"] = oracleCounts
+        WriteRecord(mergedSummary, mergedRecordFile, mergedIndexFile)
+    with open(mergedSummaryFileName, "w") as mergedSummaryFile:
+        json.dump(mergedSummary, mergedSummaryFile, indent=2)
+
+    summaryMessage = ("\n\n      **** ALL %d TESTS IN %d SHARD(S) COMPLETED! MERGED TEST SUMMARY ****\n\
+           %d of %d Tests PASSED - %s\n\
+           %d of %d Tests FAILED - %s\n\
+           %d of %d Tests UNEXPECTEDLY EXITED - %s\n" \
+    % (numTests, len(shardSummaries), numPassingTests, numTests, Run_SFCI_Tests.GetPercent(numPassingTests, numTests),\
+       numFailingTests, numTests, Run_SFCI_Tests.GetPercent(numFailingTests, numTests),\
+       numTestsExited, numTests, Run_SFCI_Tests.GetPercent(numTestsExited, numTests)))
+    if oracleCounts != None:
+        numOracleChecked = oracleCounts.get("agreed", 0) + oracleCounts.get("disagreed", 0)
+        summaryMessage += "\n           %d of %d Responses checked by the rules engine oracle DISAGREED - %s\n"\
+                          % (oracleCounts.get("disagreed", 0), numOracleChecked,
+                             Run_SFCI_Tests.GetPercent(oracleCounts.get("disagreed", 0), numOracleChecked)
+                             if numOracleChecked > 0 else "n/a")
+    for shardSummary in shardSummaries:
+        summaryMessage += "\n    %s: %d tests, %d PASSED, %d FAILED, %d UNEXPECTEDLY EXITED"\
+                          % (GetShardLabel(shardSummary), shardSummary["numTests"], shardSummary["passed"],
+                             shardSummary["failed"], shardSummary["exited"])
+    for warning in warnings:
+        summaryMessage += "\nWARNING: %s" % warning
+    summaryMessage += "\n"
+    for mergedFileName in (mergedReportFileName, mergedLogFileName):
+        with open(mergedFileName, "a") as mergedFile:
+            mergedFile.write(summaryMessage + "\n")
+    print(summaryMessage)
+    print("Merged report %s, API log %s," % (mergedReportFileName, mergedLogFileName))
+    print("test records %s (index %s) and summary %s" % (mergedRecordFileName, mergedIndexFileName, mergedSummaryFileName))
+    return 1 if warnings != [] else 0
+
+# This is the standard boilerplate that calls the main() function.
+if __name__ == '__main__':
+  sys.exit(main())
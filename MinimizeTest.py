@@ -0,0 +1,330 @@
+'''
+MinimizeTest.py - Shrinks a failing SolidFire Chess Service (SFCS) test to the smallest
+board that still fails the same way.  A FAILED test on a full 32-piece board doesn't say
+which pieces matter; working that out by hand takes RequestGen session after RequestGen
+session.  This takes the .passtest or .expfail, removes pieces - whole groups of them at
+first, then fewer and fewer (delta debugging) - and keeps every reduction that still
+reproduces the test's failure signature, until no single piece can go.
+
+The failure signature is what our rules engine (chessengine, through oracle.py) says the
+request should get against what SFCS answered, e.g. "engine result gameState 'check' /
+SFCS result gameState '' playerState b (DISAGREES: gameState)" - a reduced board has
+different expectations than the test's, so the engine stands in for them.  Only a test
+whose SFCS answer the engine disagrees with can be minimized; if the engine doesn't agree
+with the test's own expectations, the test needs fixing first.
+
+Every reduction is checked with the rules engine first, and one that changes what the
+engine says (removing the moving piece, or a king) is dropped without asking SFCS.  The
+rest of each round's reductions are sent concurrently, and the first one in order that
+still fails is kept, so a run always gives the same answer.  Responses go through the
+same response cache as Run_SFCI_Tests - no request is sent twice, and with
+--response-cache-file the answers carry over to (and from) test runs.  --max-calls caps
+the number of requests sent; if it's reached, the smallest board found so far is kept.
+
+The minimized test is written next to the original as <testName>_min.<ext>, expecting
+what the rules engine says, so it fails the same way the original does.
+
+USAGE: python MinimizeTest.py [-a N] [--max-calls N] [--url URL] [-o FILE]
+                              [--response-cache-file FILE] [--server-version TAG] test_file
+       test_file: the failing .passtest or .expfail test definition file
+       -a, --in-flight N: requests in flight at once (Default 16)
+       --max-calls N: most requests to send to SFCS (Default 200)
+       --url URL: SFCS JSON-RPC API url (Default: the chesstest.solidfire.net server)
+       -o FILE: where to write the minimized test (Default: <testName>_min.<ext> next to test_file)
+       --response-cache-file FILE: keep SFCS responses in FILE, shared with Run_SFCI_Tests runs
+       --server-version TAG: the SFCS server build - cached responses are only used for the same one
+
+Copyright 2016, Dan Doran, Boulder, CO
+'''
+import sys
+import os
+import json
+import time
+import asyncio
+import utilities # Local Module
+import board # Local Module
+import testcase # Local Module
+import asyncclient # Local Module
+import responsecache # Local Module
+import oracle # Local Module
+import FuzzSFCS # Local Module - for its bucket descriptions & test file assembly
+
+usageMessage = "Usage: python MinimizeTest.py [-a N] [--max-calls N] [--url URL] [-o FILE]\n\
+                              [--response-cache-file FILE] [--server-version TAG] test_file\n\
+       test_file: the failing .passtest or .expfail test definition file\n\
+       -a, --in-flight N: requests in flight at once (Default 16)\n\
+       --max-calls N: most requests to send to SFCS (Default 200)\n\
+       --url URL: SFCS JSON-RPC API url (Default: the chesstest.solidfire.net server)\n\
+       -o FILE: where to write the minimized test (Default: <testName>_min.<ext> next to test_file)\n\
+       --response-cache-file FILE: keep SFCS responses in FILE, shared with Run_SFCI_Tests runs\n\
+       --server-version TAG: the SFCS server build - cached responses are only used for the same one\n"
+defaultApiUrl = "http://chesstest.solidfire.net:8080/json-rpc"
+apiheaders = {'content-type': 'application/json'}
+responseCacheSize = 10000 # Responses kept in memory - far more than one minimization sends
+
+minimizeOptionNames = {'-a' : "inFlight", '--in-flight' : "inFlight", '--max-calls' : "maxCalls", '--url' : "apiurl",
+                       '-o' : "outFileName", '--response-cache-file' : "responseCacheFileName",
+                       '--server-version' : "serverVersion"}
+
+#================================
+# Function Definitions Start Here
+#================================
+
+# GetMinimizeOptions: Parse the command line.  Returns a minimizeOptions dict, or None to exit.
+def GetMinimizeOptions(argv):
+    minimizeOptions = {"inFlight" : 16, "maxCalls" : 200, "apiurl" : defaultApiUrl, "outFileName" : "",
+                       "responseCacheFileName" : "", "serverVersion" : "", "testFileName" : ""}
+    argIter = 1
+    while argIter < len(argv):
+        option = argv[argIter]
+        if option in ('-h', '-H', '--help'):
+            print(usageMessage)
+            return None
+        if not(option.startswith("-")):
+            if minimizeOptions["testFileName"] != "":
+                print("Only one test file can be minimized at a time - got %s and %s" % (minimizeOptions["testFileName"], option))
+                return None
+            minimizeOptions["testFileName"] = option
+            argIter += 1
+            continue
+        if option not in minimizeOptionNames or argIter + 1 >= len(argv):
+            print("Unknown option or missing value for %s" % option)
+            print(usageMessage)
+            return None
+        optionName = minimizeOptionNames[option]
+        optionValue = argv[argIter + 1]
+        argIter += 2
+        if isinstance(minimizeOptions[optionName], int):
+            if not(utilities.RepresentsInt(optionValue)) or int(optionValue) < 1:
+                print("Invalid value '%s' for %s. Must be an integer of 1 or more." % (optionValue, option))
+                return None
+            minimizeOptions[optionName] = int(optionValue)
+        else:
+            minimizeOptions[optionName] = optionValue
+    if minimizeOptions["testFileName"] == "":
+        print("No test file to minimize.")
+        print(usageMessage)
+        return None
+    return minimizeOptions
+# END GetMinimizeOptions()
+
+# GetExpectationProblem: Why the rules engine doesn't agree with a test's own expectations, or "" if it does
+def GetExpectationProblem(testCase, verdict):
+    resultBoard, gameState, playerState, errorCode, errorString = verdict
+    if testCase.isExpectedErrorCase:
+        if errorCode != testCase.expectedErrorCode:
+            if errorCode == 0:
+                return "the test expects error %s, but the move is legal" % oracle.GetErrorClass(testCase.expectedErrorCode)
+            return "the test expects error %s, but the request should get error %s: %s"\
+                   % (oracle.GetErrorClass(testCase.expectedErrorCode), oracle.GetErrorClass(errorCode), errorString)
+        return ""
+    if errorCode != 0:
+        return "the test expects a result, but the request should get error %s: %s" % (oracle.GetErrorClass(errorCode), errorString)
+    if (gameState, playerState) != (testCase.expectedGameState, testCase.expectedPlayerState):
+        return "the test expects gameState '%s' & playerState %s, but the move gives gameState '%s' & playerState %s"\
+               % (testCase.expectedGameState, testCase.expectedPlayerState, gameState, playerState)
+    return ""
+# END GetExpectationProblem()
+
+# GetFailureSignature: The failure signature of a request & its response - the FuzzSFCS bucket, plus which
+# result fields disagree when both the engine & SFCS give a result.  None if SFCS gave no JSON-RPC answer.
+def GetFailureSignature(minimizeRun, requestDict, responseApi):
+    if not(isinstance(responseApi, dict)):
+        return None
+    verdict = minimizeRun["oracle"].GetVerdict(requestDict)
+    oracleOutcome, oracleDetails = minimizeRun["oracle"].CheckResponse(requestDict, responseApi)
+    signature = "engine %s / SFCS %s" % (FuzzSFCS.DescribeVerdict(verdict), FuzzSFCS.DescribeResponse(responseApi))
+    if oracleOutcome != oracle.oracleDisagreed:
+        return signature
+    resultValue = responseApi.get("result")
+    if verdict[3] != 0 or responseApi.get("error") != None or not(isinstance(resultValue, dict)):
+        return signature + " (DISAGREES)"
+    disagreeingFields = [fieldName for fieldName, expectedValue in (("gameState", verdict[1]), ("playerState", verdict[2]))
+                         if (resultValue.get(fieldName) or "") != expectedValue]
+    responseBoard, boardError = board.BoardFromState(resultValue.get("boardState"))
+    if boardError != "" or responseBoard.squares != verdict[0].squares:
+        disagreeingFields.append("boardState")
+    return signature + " (DISAGREES: %s)" % ", ".join(disagreeingFields)
+# END GetFailureSignature()
+
+# GetCandidateRequest: The test's request with its boardState swapped for a reduced one
+def GetCandidateRequest(requestDict, pieces):
+    return dict(requestDict, params=dict(requestDict["params"], boardState=pieces))
+# END GetCandidateRequest()
+
+# GetResponse: SFCS's answer to a request - from the response cache if it's been asked before.
+# Returns the decoded response, or None if it couldn't be had (an error, or the --max-calls budget is spent).
+async def GetResponse(minimizeRun, apiClient, requestDict):
+    async def FetchResponse():
+        if minimizeRun["numCalls"] >= minimizeRun["options"]["maxCalls"]:
+            minimizeRun["isOverBudget"] = True
+            return None # Not a complete answer, so the cache won't keep it
+        minimizeRun["numCalls"] += 1
+        return await apiClient.Post(json.dumps(requestDict))
+    responseCache = minimizeRun["responseCache"]
+    requestKey = responsecache.GetRequestKey(requestDict, minimizeRun["serverTag"])
+    try:
+        if requestKey == None:
+            return await FetchResponse()
+        responseApi, isFromCache = await responseCache.GetOrFetchAsync(requestKey, requestDict.get("id"), FetchResponse)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as submitError:
+        print("No valid SFCS API response for a reduced board: %s" % repr(submitError))
+        minimizeRun["numErrors"] += 1
+        return None
+    if isFromCache:
+        minimizeRun["numCached"] += 1
+    return responseApi
+# END GetResponse()
+
+# TryPieces: Does the test's request with just these pieces still fail the same way?
+# Returns (requestDict, responseApi) if it does, otherwise None.
+async def TryPieces(minimizeRun, apiClient, pieces):
+    requestDict = GetCandidateRequest(minimizeRun["requestDict"], pieces)
+    if FuzzSFCS.DescribeVerdict(minimizeRun["oracle"].GetVerdict(requestDict)) != minimizeRun["engineVerdict"]:
+        minimizeRun["numRuledOut"] += 1 # The engine's answer changed, so the signature has too
+        return None
+    responseApi = await GetResponse(minimizeRun, apiClient, requestDict)
+    if GetFailureSignature(minimizeRun, requestDict, responseApi) != minimizeRun["signature"]:
+        return None
+    return (requestDict, responseApi)
+# END TryPieces()
+
+# SplitPieces: A list of pieces in numChunks nearly equal chunks, in order
+def SplitPieces(pieces, numChunks):
+    chunkStarts = [len(pieces) * chunkIter // numChunks for chunkIter in range(numChunks + 1)]
+    return [pieces[chunkStarts[chunkIter]:chunkStarts[chunkIter + 1]] for chunkIter in range(numChunks)]
+# END SplitPieces()
+
+# MinimizePieces: Delta debugging over the request's pieces.  Each round tries the board without each of
+# numChunks groups of pieces, all at once; the first that still fails is kept and the groups get coarser
+# again, otherwise they're split finer, until every single piece has been tried on its own.
+# Returns (pieces, requestDict, responseApi) of the smallest failing board found.
+async def MinimizePieces(minimizeRun, apiClient, responseApi):
+    pieces = minimizeRun["requestDict"]["params"]["boardState"]
+    best = (pieces, minimizeRun["requestDict"], responseApi)
+    numChunks = 2
+    while len(pieces) >= 2 and not(minimizeRun["isOverBudget"]):
+        chunks = SplitPieces(pieces, numChunks)
+        candidates = [[piece for otherIter, chunk in enumerate(chunks) if otherIter != chunkIter for piece in chunk]
+                      for chunkIter in range(numChunks)]
+        minimizeRun["numRounds"] += 1
+        results = await asyncio.gather(*[TryPieces(minimizeRun, apiClient, candidate) for candidate in candidates])
+        reducedIter = next((candidateIter for candidateIter, result in enumerate(results) if result != None), None)
+        if reducedIter != None:
+            pieces = candidates[reducedIter]
+            best = (pieces,) + results[reducedIter]
+            print("Round %d: %d pieces still fail the same way." % (minimizeRun["numRounds"], len(pieces)))
+            numChunks = max(numChunks - 1, 2)
+        elif numChunks >= len(pieces):
+            break # No single piece can go - we're done
+        else:
+            numChunks = min(numChunks * 2, len(pieces))
+    return best
+# END MinimizePieces()
+
+# RunMinimizeAsync: Check the test still fails, then minimize it.
+# Returns (pieces, requestDict, responseApi) of the smallest failing board, or None if there's nothing to minimize.
+async def RunMinimizeAsync(minimizeRun):
+    minimizeOptions = minimizeRun["options"]
+    apiClient = asyncclient.AsyncAPIClient(minimizeOptions["apiurl"], apiheaders, minimizeOptions["inFlight"])
+    try:
+        responseApi = await GetResponse(minimizeRun, apiClient, minimizeRun["requestDict"])
+        minimizeRun["signature"] = GetFailureSignature(minimizeRun, minimizeRun["requestDict"], responseApi)
+        if minimizeRun["signature"] == None:
+            print("Process ERROR: No valid SFCS API response for the test's own request - nothing to minimize.")
+            return None
+        print("SFCS answered: %s" % json.dumps(responseApi))
+        if "DISAGREES" not in minimizeRun["signature"]:
+            print("The rules engine agrees with SFCS's answer (%s) - the test doesn't fail, nothing to minimize."\
+                  % minimizeRun["signature"])
+            return None
+        print("Failure signature: %s\n" % minimizeRun["signature"])
+        return await MinimizePieces(minimizeRun, apiClient, responseApi)
+    finally:
+        await apiClient.Close()
+# END RunMinimizeAsync()
+
+# WriteMinimizedTest: Save the smallest failing board as a ready-to-run test.  Returns the file name, or "" if none was written.
+def WriteMinimizedTest(minimizeRun, requestDict, responseApi, numPieces):
+    testCase = minimizeRun["testCase"]
+    testName = testCase.name + "_min"
+    verdict = minimizeRun["oracle"].GetVerdict(requestDict)
+    oracleOutcome, oracleDetails = minimizeRun["oracle"].CheckResponse(requestDict, responseApi)
+    testDescription = "Description : Minimized from %s (%d of its %d pieces) - still '%s'. Expects what the rules engine says; %s.\n"\
+                      % (testCase.name, numPieces, len(minimizeRun["requestDict"]["params"]["boardState"]),
+                         minimizeRun["signature"], oracleDetails)
+    testType, testFileContents = FuzzSFCS.GetFindingTest("testName : " + testName, requestDict, verdict, responseApi, testDescription)
+    if testType == None:
+        print("No minimized test written: %s" % testFileContents)
+        return ""
+    outFileName = minimizeRun["options"]["outFileName"]
+    if outFileName == "":
+        outFileName = os.path.join(os.path.dirname(testCase.path),
+                                   testName + (testcase.expFailExt if testType == 'e' else testcase.expPassExt))
+    utilities.WriteFileAtomic(outFileName, testFileContents)
+    return outFileName
+# END WriteMinimizedTest()
+
+# END FUNCTION DEFINITIONS
+
+#=============================================================================
+# main() main() main() main() main() main() main() main() main() main() main()
+#=============================================================================
+def main():
+    minimizeOptions = GetMinimizeOptions(sys.argv)
+    if minimizeOptions == None:
+        return 1
+    if not(os.path.isfile(minimizeOptions["testFileName"])):
+        print("Process ERROR: Test File %s not found!" % minimizeOptions["testFileName"])
+        return 1
+    testCase = testcase.ParseTestFile(minimizeOptions["testFileName"])
+    if testCase.errors != []:
+        print("\n".join(testCase.errors))
+        return 1
+    requestDict = testCase.requestDict
+    minimizeRun = {"options" : minimizeOptions, "testCase" : testCase, "requestDict" : requestDict,
+                   "oracle" : oracle.Oracle(1000), "serverTag" : "%s %s" % (minimizeOptions["apiurl"], minimizeOptions["serverVersion"]),
+                   "responseCache" : responsecache.ResponseCache(responseCacheSize, minimizeOptions["responseCacheFileName"] or None),
+                   "signature" : None, "engineVerdict" : "", "isOverBudget" : False,
+                   "numCalls" : 0, "numCached" : 0, "numRuledOut" : 0, "numErrors" : 0, "numRounds" : 0}
+    verdict = minimizeRun["oracle"].GetVerdict(requestDict)
+    if verdict == None:
+        print("Test %s doesn't send a well-formed MakeMove request - there's no board to minimize." % testCase.name)
+        return 1
+    expectationProblem = GetExpectationProblem(testCase, verdict)
+    if expectationProblem != "":
+        print("The rules engine doesn't agree with test %s: %s.  Fix the test before minimizing it." % (testCase.name, expectationProblem))
+        return 1
+    minimizeRun["engineVerdict"] = FuzzSFCS.DescribeVerdict(verdict)
+    print("Minimizing %s (%d pieces) against %s, %d requests in flight, at most %d requests."\
+          % (testCase.name, len(requestDict["params"]["boardState"]), minimizeOptions["apiurl"],
+             minimizeOptions["inFlight"], minimizeOptions["maxCalls"]))
+    startTime = time.perf_counter()
+    try:
+        best = asyncio.run(RunMinimizeAsync(minimizeRun))
+    finally:
+        minimizeRun["responseCache"].Close()
+    runSeconds = time.perf_counter() - startTime
+    if best == None:
+        return 1
+    pieces, bestRequestDict, bestResponseApi = best
+
+    print("\n      **** MINIMIZATION COMPLETED! ****")
+    print("%d pieces down to %d in %d rounds, %.1f seconds: %d requests sent, %d answered from the response cache,"\
+          % (len(requestDict["params"]["boardState"]), len(pieces), minimizeRun["numRounds"], runSeconds,
+             minimizeRun["numCalls"], minimizeRun["numCached"]))
+    print("%d reduced boards ruled out by the rules engine without asking SFCS, %d without a valid SFCS response."\
+          % (minimizeRun["numRuledOut"], minimizeRun["numErrors"]))
+    if minimizeRun["isOverBudget"]:
+        print("The --max-calls budget of %d requests ran out - the board may shrink further with a bigger one."\
+              % minimizeOptions["maxCalls"])
+    print("Minimized boardState: %s" % json.dumps(pieces))
+    outFileName = WriteMinimizedTest(minimizeRun, bestRequestDict, bestResponseApi, len(pieces))
+    if outFileName == "":
+        return 1
+    print("Minimized test written to %s" % outFileName)
+    return 0
+
+# This is the standard boilerplate that calls the main() function.
+if __name__ == '__main__':
+  sys.exit(main())
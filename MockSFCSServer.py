@@ -0,0 +1,231 @@
+'''
+MockSFCSServer.py - A local stand-in for the SolidFire Chess Service (SFCS) JSON-RPC API,
+for benchmarking and tuning Run_SFCI_Tests without the remote chesstest server.
+
+It reads every test definition file in the test case directories at startup and answers
+each 'MakeMove' request with the response that test expects: the moved board, gameState &
+playerState for functional tests, or the expected error code (-32000 board, -32010 player,
+-32020 move, -32030 unknown) for expected error tests.  Requests that don't match any test
+get a -32030 Unknown API Error.  JSON-RPC 2.0 batches (a list of requests) are answered
+with a list of responses.
+
+It runs N worker processes sharing one listening socket (the workers are forked, so
+POSIX only - on Windows it runs a single worker), each answering on as many threads as
+there are open keep-alive connections.  An optional artificial latency is added to every
+HTTP request, to stand in for a real server's think time & network.
+
+USAGE: python MockSFCSServer.py [-p PORT] [--host HOST] [-w WORKERS] [--latency MS]
+       -p PORT: port to listen on (Default 8080)
+       --host HOST: address to listen on (Default 127.0.0.1)
+       -w, --workers N: worker processes (Default 1)
+       --latency MS: milliseconds to wait before answering each HTTP request (Default 0)
+       Then run the tests against it with:
+       python Run_SFCI_Tests.py --url http://127.0.0.1:8080/json-rpc
+
+Copyright 2016, Dan Doran, Boulder, CO
+'''
+import sys
+import os
+import time
+import json
+import signal
+import http.server
+import socketserver
+import utilities # Local Module
+import testcase # Local Module
+import board # Local Module
+
+usageMessage = "Usage: python MockSFCSServer.py [-p PORT] [--host HOST] [-w WORKERS] [--latency MS]"
+rootTestDir = os.getcwd()
+testDirs = [os.path.join(rootTestDir, "expPassTestDir"), os.path.join(rootTestDir, "expFailTestDir")]
+# SFCS API error codes
+boardErrorCode = -32000
+playerErrorCode = -32010
+moveErrorCode = -32020
+unknownErrorCode = -32030
+
+# Command line options and the serverOptions entry each one sets
+serverOptionNames = {'-p' : "port", '--port' : "port", '--host' : "host", '-w' : "workers", '--workers' : "workers",
+                     '--latency' : "latency"}
+
+responseTable = {} # Expected response (w/o id) for every request in the corpus, by GetRequestKey()
+serverLatency = 0.0 # Seconds added to every HTTP request
+
+#================================
+# Function Definitions Start Here
+#================================
+
+# GetRequestKey: What identifies a MakeMove request no matter how it was written - its pieces
+# (in any order), move and playerState.  Returns None if it isn't a MakeMove request at all.
+def GetRequestKey(requestDict):
+    if not(isinstance(requestDict, dict)) or requestDict.get("method") != "MakeMove":
+        return None
+    params = requestDict.get("params")
+    if not(isinstance(params, dict)) or not(isinstance(params.get("boardState"), list)):
+        return None
+    pieces = []
+    for piece in params["boardState"]:
+        if not(isinstance(piece, dict)):
+            return None
+        pieces.append((str(piece.get("loc")), str(piece.get("type"))))
+    return (tuple(sorted(pieces)), str(params.get("move")), str(params.get("playerState")))
+# END GetRequestKey()
+
+# GetExpectedResult: The 'result' a functional test expects - its request board with the
+# movedPieces taken off and the expectedResponsePieces put on
+def GetExpectedResult(testCase):
+    responseBoard, boardError = board.BoardFromState(testCase.requestDict["params"]["boardState"])
+    for mPiece in testCase.movedPieces:
+        responseBoard.RemovePieceObj(mPiece)
+    for erPiece in testCase.expectedResponsePieces:
+        square = board.GetSquareIndex(erPiece["loc"])
+        if square >= 0 and erPiece["type"] in board.pieceCodes:
+            responseBoard.SetPiece(square, erPiece["type"])
+    return {"boardState" : responseBoard.ToState(), "gameState" : testCase.expectedGameState,
+            "playerState" : testCase.expectedPlayerState}
+# END GetExpectedResult()
+
+# LoadResponseTable: Read every test definition file and file its expected response under its request
+def LoadResponseTable(testDirs):
+    testList = utilities.GetDefaultTests([], testDirs)
+    numLoaded = 0
+    for fullPathTestFileName in testList:
+        testCase = testcase.ParseTestFile(fullPathTestFileName)
+        if testCase.errors != []:
+            print("Skipping test %s: %s" % (testCase.name, testCase.errors[0]))
+            continue
+        requestKey = GetRequestKey(testCase.requestDict)
+        if requestKey == None:
+            continue # Malformed on purpose - it gets the unknown error like any other bad request
+        if testCase.isExpectedErrorCase:
+            response = {"error" : {"code" : testCase.expectedErrorCode, "message" : "Expected by test %s" % testCase.name}}
+        else:
+            response = {"result" : GetExpectedResult(testCase)}
+        if requestKey in responseTable and responseTable[requestKey] != response:
+            print("WARNING: Test %s expects a different response to a request another test also makes." % testCase.name)
+        responseTable[requestKey] = response
+        numLoaded += 1
+    return numLoaded
+# END LoadResponseTable()
+
+# GetResponse: The JSON-RPC response to one decoded request
+def GetResponse(requestDict):
+    response = responseTable.get(GetRequestKey(requestDict))
+    if response == None:
+        response = {"error" : {"code" : unknownErrorCode, "message" : "Unknown API Error"}}
+    response = dict(response)
+    response["id"] = requestDict.get("id") if isinstance(requestDict, dict) else None
+    response["jsonrpc"] = "2.0"
+    return response
+# END GetResponse()
+
+# MockSFCSHandler: Answers POSTs on a keep-alive HTTP/1.1 connection
+class MockSFCSHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True # Headers & body go out as separate writes - don't sit on the body
+
+    def log_message(self, format, *args):
+        pass # Don't slow down the benchmark logging every request
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if serverLatency > 0:
+            time.sleep(serverLatency)
+        try:
+            request = json.loads(body.decode("utf-8"))
+        except ValueError:
+            request = None
+        if isinstance(request, list) and request != []: # JSON-RPC 2.0 batch
+            response = [GetResponse(requestDict) for requestDict in request]
+        else:
+            response = GetResponse(request)
+        data = json.dumps(response).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+# END class MockSFCSHandler
+
+class MockSFCSServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024 # Deep listen backlog for benchmarks with lots of connections
+
+# GetServerOptions: Parse the command line.  Returns a serverOptions dict, or None to exit.
+def GetServerOptions(argv):
+    serverOptions = {"port" : 8080, "host" : "127.0.0.1", "workers" : 1, "latency" : 0.0}
+    argIter = 1
+    while argIter < len(argv):
+        option = argv[argIter]
+        if option in ('-h', '-H', '--help'):
+            print(usageMessage)
+            return None
+        if option not in serverOptionNames or argIter + 1 >= len(argv):
+            print("Unknown option or missing value for %s" % option)
+            print(usageMessage)
+            return None
+        optionName = serverOptionNames[option]
+        optionValue = argv[argIter + 1]
+        argIter += 2
+        if optionName == "host":
+            serverOptions[optionName] = optionValue
+        elif optionName == "latency":
+            if not(utilities.RepresentsFloat(optionValue)) or float(optionValue) < 0:
+                print("Invalid value '%s' for %s. Must be 0 or more milliseconds." % (optionValue, option))
+                return None
+            serverOptions[optionName] = float(optionValue) / 1000.0
+        else:
+            if not(utilities.RepresentsInt(optionValue)) or int(optionValue) < 1:
+                print("Invalid value '%s' for %s. Must be an integer of 1 or more." % (optionValue, option))
+                return None
+            serverOptions[optionName] = int(optionValue)
+    return serverOptions
+# END GetServerOptions()
+
+# END FUNCTION DEFINITIONS
+
+#=============================================================================
+# main() main() main() main() main() main() main() main() main() main() main()
+#=============================================================================
+def main():
+    global serverLatency
+    serverOptions = GetServerOptions(sys.argv)
+    if serverOptions == None:
+        return 1
+    serverLatency = serverOptions["latency"]
+    numLoaded = LoadResponseTable(testDirs)
+    print("Loaded expected responses for %d test requests." % numLoaded)
+    server = MockSFCSServer((serverOptions["host"], serverOptions["port"]), MockSFCSHandler)
+    numWorkers = serverOptions["workers"]
+    if not(hasattr(os, "fork")):
+        numWorkers = 1 # No fork() - one worker process only
+    print("Mock SFCS server listening on http://%s:%d/json-rpc with %d worker process(es), %.1f ms latency."\
+          % (serverOptions["host"], serverOptions["port"], numWorkers, serverLatency * 1000.0))
+    sys.stdout.flush()
+    # Fork the extra workers - every one of them accepts connections on the same listening socket
+    workerPids = []
+    for workerIter in range(numWorkers - 1):
+        workerPid = os.fork()
+        if workerPid == 0: # Worker process
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            os._exit(0)
+        workerPids.append(workerPid)
+    signal.signal(signal.SIGTERM, lambda signalNum, frame: sys.exit(0)) # Take the workers down with us
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down the mock SFCS server.")
+    finally:
+        for workerPid in workerPids:
+            os.kill(workerPid, signal.SIGTERM)
+            os.waitpid(workerPid, 0)
+        server.server_close()
+    return 0
+
+# This is the standard boilerplate that calls the main() function.
+if __name__ == '__main__':
+  sys.exit(main())
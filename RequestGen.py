@@ -1,15 +1,53 @@
 '''
 RequestGen.py - A python 3 program for interactively generating both
 functional and expected-fail cases (JSON-RPC request strings)
-for the SolidFire Chess Service (SFCS) 'MakeMove' API.
+for the SolidFire Chess Service (SFCS) 'MakeMove' API.  The chessengine rules engine
+works out what SFCS should answer each request, and offers that as the test's expected values.
+
+With '--spec FILE' it instead compiles a whole JSON spec file of tests - boards from the
+Test_Boards repository, moves, move types & expected outcomes - into test definition
+files without asking anything, on a pool of worker processes:
+    {"defaults" : {"color" : "w", "description" : "Generated {moveType} test"},
+     "tests" : [
+       {"name" : "w_queen_{from}_{to}_gen", "board" : "Piece_Moves/queen_start_positions",
+        "moveType" : "move", "from" : "d1", "to" : ["e2", "f3", "g4"]},
+       {"name" : "b_castling_{side}_gen", "board" : "Piece_Moves/castling_setup_all", "color" : "b",
+        "moveType" : "castling", "side" : ["k", "q"], "expect" : {"gameState" : ""}},
+       {"name" : "w_rook_thru_pawn_error", "board" : "Start_Game/start_board", "moveType" : "move",
+        "from" : "a1", "to" : "a4", "expect" : {"errorCode" : "move"}},
+       {"name" : "b_king_{from}_{to}_gen", "board" : "Piece_Moves/king_advanced_positions", "color" : "b",
+        "moveType" : "all", "from" : "e7"}]}
+A list of values for "board", "color", "from", "to" or "side" makes one test for each (every
+combination, if there are several), named & described by filling in the {field}s.
+"from" is the square of the piece to move ("piece" overrides the piece type found there),
+"expect" holds the response "gameState" (a .passtest) or an "errorCode" (a .expfail) -
+-32000 or 'board', -32010 or 'player', -32020 or 'move', -32030 or 'unknown'.  Anything it
+leaves out - the kind of test too - comes from the rules engine, which has to agree with
+whatever it does give unless the test says "engine" : false.  A "moveType" of "all" makes a
+test of every legal move on the board (from "from" and/or to "to", if given).
+
+See RequestGen_Example_Spec.json for more.
 
 Copyright 2016, Dan Doran, Boulder, CO
 '''
 import sys
 import os
+import io
+import ast
+import json
+import itertools
+import contextlib
+import concurrent.futures
 import utilities # Local
+import board # Local
+import chessengine # Local
 
-usageMessage = "Usage: python RequestGen.py"
+usageMessage = "Usage: python RequestGen.py [--spec FILE [-j N] [--out-dir DIR] [--force]]\n\
+       (no arguments): build one test interactively\n\
+       --spec FILE: compile every test in the JSON spec FILE without asking anything\n\
+       -j, --jobs N: worker processes for '--spec' (Default: the number of CPUs)\n\
+       --out-dir DIR: write the tests under DIR/expPassTestDir & DIR/expFailTestDir (Default: here)\n\
+       --force: overwrite existing test files whose contents differ from the spec's"
 openingMessage = '''\nWelcome to the SFCS Test Case generator Script.  (Copyright 2016, Dan Doran, Boulder CO)\n
 Be aware this script should only allow generation of syntactically-correct test definition files.
 It will however allow the generation of chess-rule invalid boardStates, and allow illegal moves.
@@ -46,7 +84,7 @@ movedPiece = {} # Piece Object(s) we're gonna move {"type":"?", "loc" : "?"}, an
 capturePiece = {} # Piece to check response for in a capture move to make sure it's gone
 destinationSquare = "" # TBD. We'll allow fictional destinations for error checking
 move = "" # TBD, Algebraic Chess Notation.  We will allow bogus moves for expected error cases
-boardStateList = [] # Our Board, List of pieceObjects, each w/ "type" (UpperCase White, LowerCase Black) & "loc" values
+testBoard = None # Our Board (board.Board), pieces w/ "type" (UpperCase White, LowerCase Black) on each square
 moveType = ""
 legalMoveTypes = ["move", "capture", "pawnpromotion", "castling", "enpassant", "check", "checkmate"]
 
@@ -62,6 +100,13 @@ legalCastlingSides = ("k","q") # kingside & queenside
 legalErrorCodes = [{"Invalid Board Error" : -32000},{"Invalid Player Error" : -32010},\
                    {"Invalid Move Error" : -32020},{"Unknown API Error" : -32030}]
 
+# Spec file (batch) mode
+specMoveTypes = legalMoveTypes + ["checkcapture", "checkmatecapture", "pawnpromotioncapture"] # GetMoveType()'s answers
+specErrorCodes = {"board" : -32000, "player" : -32010, "move" : -32020, "unknown" : -32030}
+specGameStates = ("", "check", "checkmate", "stalemate")
+specListKeys = ("board", "color", "from", "to", "side") # Keys that can list several values, one test for each
+specBoards = {} # Test_Boards file : board.Board, read once per worker process
+
 # Expected Values we want to check from the SFCS API response
 responseColor = "" # Always opposite playerColor
 gameState = "" # TBD by test
@@ -126,20 +171,8 @@ def GetExpectedErrorCode():
     return errorCode
 # END GetExpectedErrorCode()
 
-# Little subroutine for DrawCurrentBoard() to return a list of
-# piece objects (dicts) in the supplied row.
-def GetPiecesInRow(boardStateList, row):
-    pieceList = []
-    for pieceObj in boardStateList:
-        loc = pieceObj.get("loc")
-        #See if the row matches...
-        if int(loc[1]) == row:
-            pieceList.append(pieceObj)
-    return pieceList
-# END GetPiecesInRow()
-
 # Little function to draw the current board
-def DrawCurrentBoard(boardStateList):
+def DrawCurrentBoard(testBoard):
     separatorSpace = ("             ") # 14 spaces
     leadSpace = ("         ") # 9 spaces
     separator =  separatorSpace + ("-------------------------------")
@@ -150,27 +183,21 @@ def DrawCurrentBoard(boardStateList):
     # Start at top row and work down, printing a row, then a separator at a time
     row = 8
     while row > 0:
-        rowPieces = GetPiecesInRow(boardStateList, row) # Returns list of Piece objects in the current row, including loc
         rowText = "" # Fill this in left-to-right.
         rowText = (leadSpace + ' ' + str(row) + ' |') # Start the row w/ a row number and edge
-        foundPieceInSquare = False
         for column in legalColumns: # a - h
-            foundPieceInSquare = False
-            for piece in rowPieces: # each piece Dict        
-                loc = piece.get("loc") 
-                locColumn = loc[0]              
-                if locColumn == column: # Found a piece in this square
-                    foundPieceInSquare = True
-                    pieceType = piece.get("type")
-                    rowText += (" %s |" % pieceType) # Add square w/ pieceType
-                    break # Skip any further rowPieces since there can only be 1 piece/square, move on to next column                                  
-            if (foundPieceInSquare == False):  # If we didn't find any pieces for this square, put an empty one in
+            pieceType = testBoard.GetPiece(board.GetSquareIndex(column + str(row)))
+            if pieceType != None: # Found a piece in this square
+                rowText += (" %s |" % pieceType) # Add square w/ pieceType
+            else: # If we didn't find any pieces for this square, put an empty one in
                 rowText += emptySquare
-                continue
         print(rowText) # Print the entire row & the row separator line beneath
         print(separator)
         row -= 1
     print(bottomLine)
+    # Pieces that don't fit on the board above (two on one square, off the board...) for invalid board tests
+    for piece in testBoard.extraPieces:
+        print(leadSpace + "Also on this (invalid) board: %s" % str(piece))
 # END DrawCurrentBoard()
 
 # We need a board (boardState list of piece objects) for our request.
@@ -228,18 +255,24 @@ or build a new board ('b')?")
     return fullBoardName
 # END GetRequestBoardFromRepo()
 
-# Routine to read the contents of the boardFile
-def ReadBoardFile(fullBoardName, boardStateList):
+# Routine to read the contents of the boardFile into a board.Board
+def ReadBoardFile(fullBoardName, testBoard):
     with open(fullBoardName, 'r') as boardFile:
-        boardStateList = boardFile.read() # Comes back as str
-        boardStateList = eval(boardStateList) # Turn it back to a list
-    return boardStateList
+        boardStateStr = boardFile.read() # Comes back as str
+    try:
+        boardState = json.loads(boardStateStr) # Repository boards are saved as JSON lists
+    except ValueError:
+        boardState = ast.literal_eval(boardStateStr) # Older boards may be python lists
+    testBoard, boardError = board.BoardFromState(boardState)
+    if boardError != "":
+        print("NOTE: This is an invalid board (%s) - only good for expected error tests." % boardError)
+    return testBoard
 # END ReadBoardFile()
 
 # Subroutine for BuildNewRequestBoard to request what the user wants to do next
-def GetNextStep(boardStateList):
+def GetNextStep(testBoard):
     print("Current board:")
-    DrawCurrentBoard(boardStateList)
+    DrawCurrentBoard(testBoard)
     promptMessage = ("Would you like to add a new piece ('a'),\n\
 remove an existing piece ('r'),\n\
 or declare the board finished ('f'): ")
@@ -249,8 +282,8 @@ or declare the board finished ('f'): ")
 # END BuildNewRequestBoard
 
 # subroutine to solicit a piece object
-def GetBoardPiece(boardStateList):
-    DrawCurrentBoard(boardStateList)
+def GetBoardPiece(testBoard):
+    DrawCurrentBoard(testBoard)
     isPieceLegal = False
     pieceStr = ""
     colorChar = ""
@@ -291,7 +324,7 @@ def GetBoardPiece(boardStateList):
 # END GetBoardPiece()
 
 # Optionally Save a newly-built starting board to the Test_Boards repository
-def SaveBoardToRepo(boardStateList):
+def SaveBoardToRepo(testBoard):
     promptMessage = ("What Test_Board repository category should this board be saved under?")
     repoBoardTypes = GetListRepoBoardTypes()
     boardType = utilities.ChooseValueFromList(promptMessage, repoBoardTypes)
@@ -302,15 +335,13 @@ def SaveBoardToRepo(boardStateList):
     boardFileName = os.path.join(fullTestBoardDir, boardType, fullBoardName)
     print("Saving new starting board to %s" % boardFileName)
     with open(boardFileName, "w") as boardFile:
-        contents = str(boardStateList)
-        # JSONRPC hates single quotes from lists - Make them double quotes
-        contents = contents.replace("'", '"')
+        contents = json.dumps(testBoard.ToState()) # JSONRPC wants double quotes
         boardFile.write(contents)
     return
 # END SaveBoardToRepo()
 
 # Optional function to build a new starting board from scratch
-def BuildNewRequestBoard(boardStateList):
+def BuildNewRequestBoard(testBoard):
     # for fast board populating ask for this 4-character format, case-insensitive:
     # <color><piece><loc>
     print('''Building a new starting board.\n
@@ -323,39 +354,42 @@ remove a current piece('r'), or finish('f').  The new boardState will be added t
 ''')
     keepGoing = True
     while keepGoing == True:
-        nextStep = GetNextStep(boardStateList)
+        nextStep = GetNextStep(testBoard)
         if nextStep == 'a':
             print("Adding a new piece to our board:")
-            newPiece = GetBoardPiece(boardStateList)
-            boardStateList.append(newPiece)
+            newPiece = GetBoardPiece(testBoard)
+            problem = testBoard.AddPieceObj(newPiece)
+            if problem != "":
+                print("NOTE: Added, but this is now an invalid board: %s" % problem)
         elif nextStep == 'r':
             print("Request to remove a piece from our board - please choose:")
-            pieceToRemove = GetBoardPiece(boardStateList)
-            numPieces = utilities.CountItemsInList(boardStateList)
+            pieceToRemove = GetBoardPiece(testBoard)
+            numPieces = testBoard.NumPieces()
             if numPieces != 0 and numPieces != 1: # Remove the piece if we have 2 or more pieces on the board
-                boardStateList.remove(pieceToRemove)
+                if not(testBoard.RemovePieceObj(pieceToRemove)):
+                    print("There is no %s on the board to remove." % str(pieceToRemove))
             else:
                 print("Can't remove piece on board with %d pieces." % numPieces)
                 continue
         elif nextStep == 'f': #Finish up
             print("Finished Board:")
-            DrawCurrentBoard(boardStateList)
+            DrawCurrentBoard(testBoard)
             keepGoing = False
             promptMessage =("Would you like to add this new board to the Test_Board repository?")
             saveBoard = utilities.GetUserInput(promptMessage, legalYN)
             if saveBoard == 'y':
-                SaveBoardToRepo(boardStateList)
+                SaveBoardToRepo(testBoard)
             else:
                 print("Not saving this board to the Test_Board repository.  Continuing with building test case.")
             print("Adding this board to the SFCS API request")
-            return boardStateList
+            return testBoard
         else:
             print("Process ERROR: Unexpected invalid input '%s' for GetNextStep.  Exiting..." % nextStep)
             sys.exit(1)
 # END BuildNewRequestBoard
 
 def GetRequestBoard():
-    boardStateList = [] # send back as list, not string
+    testBoard = board.Board() # send back as a board.Board, not string
     getBoard = False
     while getBoard == False:
         promptMessage = ("Would you like to use or inspect starting boards in our Test_Board repository?")
@@ -363,9 +397,9 @@ def GetRequestBoard():
         if getRepoBoards == 'y':
             boardFile = GetRequestBoardFromRepo()
             if boardFile != None:
-                boardStateList = ReadBoardFile(boardFile, boardStateList)
+                testBoard = ReadBoardFile(boardFile, testBoard)
                 print("Here is the starting board you've chosen:")
-                DrawCurrentBoard(boardStateList)
+                DrawCurrentBoard(testBoard)
                 promptMessage = ("Is this the board you want to use?")
                 likeThisBoard = utilities.GetUserInput(promptMessage, legalYN)
                 if likeThisBoard == 'y':
@@ -374,14 +408,14 @@ def GetRequestBoard():
                 else:
                     continue # Try again
             else: # User wants to build a new board
-                boardStateList = BuildNewRequestBoard(boardStateList)
+                testBoard = BuildNewRequestBoard(testBoard)
                 getBoard = True
                 break
         elif getRepoBoards == 'n':
             promptMessage = ("Would you like to create a new starting board?")
             getNewBoard = utilities.GetUserInput(promptMessage, legalYN)
             if getNewBoard == 'y':
-                boardStateList = BuildNewRequestBoard(boardStateList)
+                testBoard = BuildNewRequestBoard(testBoard)
                 getBoard = True
                 break
             else:
@@ -390,7 +424,7 @@ def GetRequestBoard():
         else:
             print("Not sure what you want to do... Exiting")
         sys.exit(1)
-    return boardStateList
+    return testBoard
 # END GetRequestBoard
 
 # Return a list of the piece(s) we're moving or removing via capture.  Should *not* be in response board
@@ -425,6 +459,21 @@ def GetResponsePieces(moveType, moveList):
     return responsePiecesLine
 # END GetResponsePieces()
 
+# The movedPieces & expectedResponsePieces lines for the rules engine's resultBoard - pieces that
+# leave (or are taken from) their squares, and the pieces on the squares that changed
+def GetEnginePieces(testBoard, resultBoard):
+    movedPieces = []
+    responsePieces = []
+    for square, (fromCode, toCode) in enumerate(zip(testBoard.squares, resultBoard.squares)):
+        if fromCode == toCode:
+            continue
+        if fromCode != 0:
+            movedPieces.append(utilities.MakePieceObj(testBoard.GetPiece(square), board.GetSquareLoc(square)))
+        if toCode != 0:
+            responsePieces.append(utilities.MakePieceObj(resultBoard.GetPiece(square), board.GetSquareLoc(square)))
+    return ("movedPieces : " + str(movedPieces) + "\n", "expectedResponsePieces : " + str(responsePieces) + "\n")
+# END GetEnginePieces()
+
 def GetMoveType():
     promptMessage = ("What sort of move do you want to make?\n\
 Choose 'check','checkmate' or 'pawnpromotion' even if it includes a capture.")
@@ -503,8 +552,8 @@ def CheckDestinationLegality(testType, destinationSquare):
     return moveMessage
 # END CheckDestinationLegality()
 
-def GetDestinationSquare(testType, moveType, boardStateList):
-    DrawCurrentBoard(boardStateList)
+def GetDestinationSquare(testType, moveType, testBoard):
+    DrawCurrentBoard(testBoard)
     promptMessage = ("What square (loc) do you want to move your piece to for this %s?: " % moveType)
     destinationSquare = input(promptMessage)
     moveMessage = CheckDestinationLegality(testType, destinationSquare)
@@ -512,14 +561,16 @@ def GetDestinationSquare(testType, moveType, boardStateList):
 # END GetDestinationSquare()
 
 # Special function for building a castling move request List. Return the moveList w/ the move,
-# the two moved pieces in their original locs, and the expected result two pieces
-def GetCastlingMove(playerColor, moveList):
+# the two moved pieces in their original locs, and the expected result two pieces.
+# castlingSide ('k' or 'q') is asked for unless it's supplied (spec file mode)
+def GetCastlingMove(playerColor, moveList, castlingSide=None):
     # Determine castling notation here - Add castling move from algebraic chess notation as first list element
     # We have 2 possible castling moves for each playerColor side - 'kingSide' & 'queenSide'
     print("Castling move chosen.")
     move = ""
-    promptMessage = ("Which rook do you want to swap w/ your King - (Kingside ('k') or Queenside ('q')?")
-    castlingSide = utilities.GetUserInput(promptMessage, legalCastlingSides)
+    if castlingSide == None:
+        promptMessage = ("Which rook do you want to swap w/ your King - (Kingside ('k') or Queenside ('q')?")
+        castlingSide = utilities.GetUserInput(promptMessage, legalCastlingSides)
     if castlingSide == "k":
         move = ("0-0")
     elif castlingSide == "q":
@@ -568,7 +619,7 @@ def GetCastlingMove(playerColor, moveList):
 
 # Special pawnpromotion moveList - Always promote to queen
 def GetPawnPromotionMove(playerColor, startColumn, startRow, destinationColumn,\
-                         destinationRow, moveList, boardStateList):
+                         destinationRow, moveList, testBoard):
     #print("DEBUG: Our pawn to be promoted is in column %s, row %d" % (startColumn, startRow))
     move = ""
     origPawn = {}
@@ -593,7 +644,7 @@ def GetPawnPromotionMove(playerColor, startColumn, startRow, destinationColumn,\
             move = destinationSquare + "=Q"
         else: # capture or illegal move for error case
             move = destinationSquare + "x" + "=Q"
-            capturedPiece = GetCapturedPiece(destinationSquare, boardStateList)
+            capturedPiece = GetCapturedPiece(destinationSquare, testBoard)
         newQueen = utilities.MakePieceObj("Q", destinationSquare)
     if playerColor == "b":
         origPawn = utilities.MakePieceObj("p", startSquare)
@@ -601,7 +652,7 @@ def GetPawnPromotionMove(playerColor, startColumn, startRow, destinationColumn,\
             move = destinationSquare + "=q"
         else:
             move = destinationSquare + "x" + "=q"
-            capturedPiece = GetCapturedPiece(destinationSquare, boardStateList)
+            capturedPiece = GetCapturedPiece(destinationSquare, testBoard)
         newQueen = utilities.MakePieceObj("q", destinationSquare)
     # Add two pieces (origPawn & newQueen) if no capture, append the capturedPiece otherwise
     if capturedPiece == {}:
@@ -614,7 +665,7 @@ def GetPawnPromotionMove(playerColor, startColumn, startRow, destinationColumn,\
 # Notation for En Passant is a bit like capture notation with '(ep)' appended:
 # <StartColumn>'x'<destLoc>'(ep)  e.g. exd3(ep)
 def GetPawnEnPassantMove(playerColor, startColumn, startRow, destinationColumn,\
-                         destinationRow, moveList, boardStateList):
+                         destinationRow, moveList, testBoard):
     move = ""
     origPawn = {}
     capturedPawn = {}
@@ -622,7 +673,7 @@ def GetPawnEnPassantMove(playerColor, startColumn, startRow, destinationColumn,\
     destinationSquare = destinationColumn + str(destinationRow)
     # Legality Check - Both move & capture pawns on same row and adjacent to each other
     captureLoc = destinationColumn + str(startRow)
-    capturedPawn = GetCapturedPiece(captureLoc, boardStateList)
+    capturedPawn = GetCapturedPiece(captureLoc, testBoard)
     if capturedPawn == None or capturedPawn == {}:
         print("Process ERROR: Didn't find any piece on En Passant capture square %s" % captureLoc)
         print("Try again... Exiting")
@@ -645,23 +696,26 @@ def GetPawnEnPassantMove(playerColor, startColumn, startRow, destinationColumn,\
 
 # Assemble our Algebraic Chess Notation "move" value, moved Piece(s) and result piece(s) in a list
 # List order is important, and depends upon moveType.  ACN wants all move piece chars upperCase
-def GetMove(testType, moveType, playerColor, boardStateList):
+# The piece to move, its destination and the castling side are asked for unless they're supplied (spec file mode)
+def GetMove(testType, moveType, playerColor, testBoard, movedPiece=None, destinationSquare=None, castlingSide=None):
     moveList = [] # ["<move>", <movedPiece(s)>, <resultPiece(s)>]
     move = ""
     # Get castling moves out of the way immediately so we don't have
     # to dance around moving more than one piece
     if moveType == 'castling':
-        moveList = GetCastlingMove(playerColor, moveList) # We're done with the moveString
+        moveList = GetCastlingMove(playerColor, moveList, castlingSide) # We're done with the moveString
         print("For our %s move, our starting and moved Pieces will be %s\n" % (moveType, moveList))
         return moveList # We're Done
     # All other moveTypes require a single piece to move
-    movedPiece = GetBoardPiece(boardStateList)
+    if movedPiece == None:
+        movedPiece = GetBoardPiece(testBoard)
     startSquare = movedPiece["loc"]
     startColumn = startSquare[0]
     startRow = int(startSquare[1])
     pieceType = movedPiece["type"]
     pieceTypeUC = pieceType.upper() # All move pieces UpperCase
-    destinationSquare = GetDestinationSquare(testType, moveType, boardStateList)
+    if destinationSquare == None:
+        destinationSquare = GetDestinationSquare(testType, moveType, testBoard)
     destinationColumn = destinationSquare[0]
     destinationRow = int(destinationSquare[1])
     # After a move, the moved piece should be in a new location
@@ -675,7 +729,7 @@ def GetMove(testType, moveType, playerColor, boardStateList):
     # Handle pawnpromotion move in its own routine like castling - Always promote to Queen
     elif (moveType == "pawnpromotion" or moveType == "pawnpromotioncapture") and pieceType.lower() == "p":
         moveList = GetPawnPromotionMove(playerColor, startColumn, startRow, destinationColumn,\
-                                        destinationRow, moveList, boardStateList)
+                                        destinationRow, moveList, testBoard)
         move = moveList[0]
         print("Our %s move will be %s\n" % (moveType, move))
         # We're done with this move.
@@ -684,13 +738,13 @@ def GetMove(testType, moveType, playerColor, boardStateList):
     elif moveType.endswith("capture") and pieceType.lower() == "p":
         move = startColumn + "x" + destinationSquare
         print("Our %s move will be %s\n" % (moveType, move))
-        capturedPiece = GetCapturedPiece(destinationSquare, boardStateList)
+        capturedPiece = GetCapturedPiece(destinationSquare, testBoard)
         moveList = [move, movedPiece, capturedPiece, newMovedPiece,]
         return moveList
     # Handle En Passant Moves with its own routine also
     elif moveType == "enpassant":
         moveList = GetPawnEnPassantMove(playerColor, startColumn, startRow, destinationColumn,\
-                                        destinationRow, moveList, boardStateList)
+                                        destinationRow, moveList, testBoard)
         move = moveList[0]
         print("Our %s move will be %s\n" % (moveType, move))
         return moveList
@@ -704,7 +758,7 @@ def GetMove(testType, moveType, playerColor, boardStateList):
     elif moveType.endswith("capture"):
         move = pieceTypeUC + startColumn + 'x' + destinationSquare
         print("Our %s move will be %s\n" % (moveType, move))
-        capturedPiece = GetCapturedPiece(destinationSquare, boardStateList)
+        capturedPiece = GetCapturedPiece(destinationSquare, testBoard)
         moveList = [move, movedPiece,  capturedPiece, newMovedPiece]
         return moveList
     # Append a '+' to indicate a check move
@@ -717,7 +771,7 @@ def GetMove(testType, moveType, playerColor, boardStateList):
     elif moveType == "checkcapture":
         move = pieceTypeUC + startColumn + 'x' + destinationSquare + '+'
         print("Our %s move will be %s\n" % (moveType, move))
-        capturedPiece = GetCapturedPiece(destinationSquare, boardStateList)
+        capturedPiece = GetCapturedPiece(destinationSquare, testBoard)
         moveList = [move, movedPiece, capturedPiece, newMovedPiece]
         return moveList
         # Append a '#' to indicate a checkmate move
@@ -730,7 +784,7 @@ def GetMove(testType, moveType, playerColor, boardStateList):
     elif moveType == "checkmatecapture":
         move = pieceTypeUC + startColumn + 'x' + destinationSquare + '#'
         print("Our %s move will be %s\n" % (moveType, move))
-        capturedPiece = GetCapturedPiece(destinationSquare, boardStateList)
+        capturedPiece = GetCapturedPiece(destinationSquare, testBoard)
         moveList = [move, movedPiece,  capturedPiece, newMovedPiece]
         return moveList
     # Should have covered all bases and not got here...
@@ -739,10 +793,9 @@ def GetMove(testType, moveType, playerColor, boardStateList):
 # END GetMove()
 
 # We'll assemble the request as a concatination of strings
-def AssembleRequest(playerColor, moveValue, boardStateList):
-    boardState = ('"boardState": %s' % str(boardStateList))
-    # Lists give us single quotes when converted to strings. JSON-RPC hates them. Make them double quotes
-    boardState = boardState.replace("'", '"')
+def AssembleRequest(playerColor, moveValue, testBoard):
+    # JSON-RPC only takes double quotes, so let json write the boardState list
+    boardState = ('"boardState": %s' % json.dumps(testBoard.ToState()))
     # We'll assemble the request as a concatination of strings
     move = "" # "move": "<moveValue>"
     move = ('"move": "%s"' % moveValue)
@@ -758,6 +811,22 @@ def AssembleRequest(playerColor, moveValue, boardStateList):
     return fullRequest
 # END AssembleRequest()
 
+# Tell the user what the rules engine expects for this request and ask whether to use it.  Returns True
+# to fill in the expected values from the engine, False to ask for them as usual.
+def UseEngineExpectations(testType, move, resultBoard, engineGameState, engineErrorCode, engineError):
+    if engineErrorCode != 0:
+        print("The rules engine expects error %d for %s: %s" % (engineErrorCode, move, engineError))
+    else:
+        print("The rules engine expects %s to be legal, leaving the board as below with gameState '%s'" % (move, engineGameState))
+        DrawCurrentBoard(resultBoard)
+    if (testType == 'e') != (engineErrorCode != 0):
+        print("WARNING: That's not what a%s test expects - you'll be asked for the expected values yourself."\
+              % (" functional" if testType == 'f' else "n expected error"))
+        return False
+    promptMessage = ("Use the rules engine's expected values for this test?")
+    return utilities.GetUserInput(promptMessage, legalYN) == 'y'
+# END UseEngineExpectations()
+
 # gameState is a tricky since "" (continue play) is a valid response
 def GetExpectedGameState():
     promptMessage = ("What gameState value do you expect in the response?  \"\" for continue play")
@@ -778,12 +847,8 @@ def GetExpectedPlayerState(playerColor):
 # END GetExpectedPlayerState()
 
 # Returns the piece (dict form) in the destinationSquare, None if empty
-def GetCapturedPiece(destinationSquare, boardStateList):
-    capturedPiece = None
-    for capturedPiece in boardStateList:
-        if capturedPiece.get("loc") == destinationSquare:
-            return capturedPiece
-    return capturedPiece 
+def GetCapturedPiece(destinationSquare, testBoard):
+    return testBoard.GetPieceObj(destinationSquare)
 # END GetCapturedPiece()
 
 # Put all the elements of an expected error test definition file together
@@ -808,26 +873,290 @@ def AssembleFuncTestContents(testName, testDescription, request,\
     return contents
 # END AssembleFuncTestContents()
 
-# Finishing function writes our new test definition file to the correct test repository
-def WriteTestFile(testType, testName, testFileContents):
+# Where a test definition file goes - (path relative to testRootDir, absolute path)
+def GetTestFilePath(testType, testName, testRootDir=rootTestDir):
     if testType == 'e':
         fileDir = expFailDir
-        fullFileDir = fullExpFailDir
         testExt = expFailFileExt
     if testType == 'f':
         fileDir = expPassDir
-        fullFileDir = fullExpPassDir
         testExt = expPassFileExt
     # We can get all our paths once we get a test name
     fullTestName = testName + testExt
     testRelPath = os.path.join(fileDir, fullTestName)
-    testAbsPath = os.path.join(fullFileDir, fullTestName)
-    with open(testAbsPath, "w") as testFile:
-        testFile.write(testFileContents)
-    print("Congratulations, test definition file %s/%s has been written \n\
-and is ready for testing with 'Run_SFCS_Tests'." % (fileDir, fullTestName))
+    testAbsPath = os.path.join(testRootDir, fileDir, fullTestName)
+    return (testRelPath, testAbsPath)
+# END GetTestFilePath()
+
+# Finishing function writes our new test definition file to the correct test repository.
+# Written atomically, so a test run never picks up half a file.
+def WriteTestFile(testType, testName, testFileContents, testRootDir=rootTestDir):
+    testRelPath, testAbsPath = GetTestFilePath(testType, testName, testRootDir)
+    utilities.WriteFileAtomic(testAbsPath, testFileContents)
+    print("Congratulations, test definition file %s has been written \n\
+and is ready for testing with 'Run_SFCS_Tests'." % testRelPath)
     return
 
+# Spec file (batch) mode - compile a JSON spec of tests into test definition files with no prompts,
+# through the same GetMove, AssembleRequest, GetMovedPieces & GetResponsePieces as an interactive session
+
+# Read the spec file and expand it into one dict per test, with the defaults filled in and every
+# list value spread out.  Returns (specTests, errorString)
+def ExpandSpec(specFileName):
+    try:
+        with open(specFileName, 'r') as specFile:
+            spec = json.load(specFile)
+    except (OSError, ValueError) as specError:
+        return ([], "Unable to read spec file %s: %s" % (specFileName, specError))
+    if not(isinstance(spec, dict)) or not(isinstance(spec.get("tests"), list)):
+        return ([], "Spec file %s must be a JSON object with a \"tests\" list" % specFileName)
+    defaults = spec.get("defaults", {})
+    specTests = []
+    for entryIter, entry in enumerate(spec["tests"], 1):
+        if not(isinstance(entry, dict)) or not(isinstance(entry.get("name"), str)):
+            return ([], "Spec test #%d must be a JSON object with a \"name\"" % entryIter)
+        entry = dict(defaults, **entry)
+        listKeys = [key for key in specListKeys if isinstance(entry.get(key), list)]
+        entryTests = [dict(entry, **dict(zip(listKeys, values))) for values in itertools.product(*[entry[key] for key in listKeys])]
+        if entry.get("moveType") == "all":
+            try:
+                entryTests = [allTest for specTest in entryTests for allTest in GetAllMoveTests(specTest)]
+            except ValueError as specError:
+                return ([], "Spec test #%d (%s): %s" % (entryIter, entry["name"], specError))
+        for specTest in entryTests:
+            # Fields for the name & description - boards by their file name
+            nameFields = {"from" : "", "to" : "", "side" : "", "piece" : ""} # Not every move type has these
+            nameFields.update({key : str(value) for key, value in specTest.items() if isinstance(value, (str, int))})
+            if isinstance(specTest.get("board"), str):
+                nameFields["board"] = os.path.splitext(os.path.basename(specTest["board"]))[0]
+            try:
+                specTest["name"] = specTest["name"].format(**nameFields)
+                specTest["description"] = str(specTest.get("description", "Generated from spec test %s" % specTest["name"])).format(**nameFields)
+            except (KeyError, IndexError, ValueError) as formatError:
+                return ([], "Spec test #%d (%s): no field %s to fill in" % (entryIter, entry["name"], formatError))
+            specTests.append(specTest)
+    return (specTests, "")
+# END ExpandSpec()
+
+# "moveType" : "all" - one spec test for each legal move on the board (just those from "from" and/or
+# to "to", if given), with the rules engine's gameState.  Pawns always promote to a queen.
+def GetAllMoveTests(specTest):
+    testBoard = ReadSpecBoard(specTest.get("board"))
+    if specTest.get("color") not in legalColors:
+        raise ValueError("\"color\" must be one of %s" % str(legalColors))
+    allTests = []
+    for legalMove in chessengine.GetLegalMoves(testBoard, specTest["color"]):
+        if legalMove["promotion"] not in ("", "Q", "q") or specTest.get("from", legalMove["from"]) != legalMove["from"] or\
+           specTest.get("to", legalMove["to"]) != legalMove["to"]:
+            continue
+        moveTest = dict(specTest, expect={}, piece=legalMove["piece"].lower(), side=legalMove["castling"])
+        moveTest.update({"from" : legalMove["from"], "to" : legalMove["to"]}) # The king's, for castling
+        if legalMove["castling"] != "":
+            moveTest["moveType"] = "castling"
+        else:
+            if legalMove["enpassant"]:
+                moveType = "enpassant"
+            elif legalMove["promotion"] != "":
+                moveType = "pawnpromotion"
+            elif legalMove["gameState"] in ("check", "checkmate") and legalMove["piece"] not in "Pp":
+                moveType = legalMove["gameState"] # GetMove() gives pawn moves no '+' or '#'
+            else:
+                moveType = "move"
+            if legalMove["captured"] != "" and moveType != "enpassant":
+                moveType = "capture" if moveType == "move" else moveType + "capture"
+            moveTest["moveType"] = moveType
+        allTests.append(moveTest)
+    if allTests == []:
+        raise ValueError("no legal moves on board %s" % specTest.get("board"))
+    return allTests
+# END GetAllMoveTests()
+
+# A Test_Boards board ('Piece_Moves/castling_setup_all', with or without .bsfile) as a board.Board
+def ReadSpecBoard(boardName):
+    if not(isinstance(boardName, str)) or boardName == "":
+        raise ValueError("no Test_Boards \"board\" given")
+    fullBoardName = os.path.join(fullTestBoardDir, boardName)
+    if not(os.path.isfile(fullBoardName)) and os.path.isfile(fullBoardName + testBoardExt):
+        fullBoardName += testBoardExt
+    if fullBoardName not in specBoards:
+        try:
+            specBoards[fullBoardName] = ReadBoardFile(fullBoardName, board.Board())
+        except (OSError, ValueError, SyntaxError) as boardError:
+            raise ValueError("unable to read board %s: %s" % (boardName, boardError))
+    return specBoards[fullBoardName].Copy() # Each test gets its own, to be safe
+# END ReadSpecBoard()
+
+# Build one spec test's test definition file.  Returns (testType, testFileContents).
+# Raises ValueError if the spec test doesn't describe a test we can build.
+# The rules engine fills in anything "expect" leaves out - the kind of test too - and has to agree
+# with anything it gives, unless the spec test says "engine" : false.
+def BuildSpecTest(specTest):
+    expect = specTest.get("expect", {})
+    if not(isinstance(expect, dict)):
+        raise ValueError("\"expect\" must be a JSON object")
+    useEngine = specTest.get("engine", True) != False
+    if "errorCode" in expect:
+        testType = 'e'
+    elif "gameState" in expect or not(useEngine):
+        testType = 'f'
+    else:
+        testType = None # Up to the rules engine
+    playerColor = specTest.get("color")
+    if playerColor not in legalColors:
+        raise ValueError("\"color\" must be one of %s" % str(legalColors))
+    testBoard = ReadSpecBoard(specTest.get("board"))
+    moveType = specTest.get("moveType")
+    if moveType not in specMoveTypes:
+        raise ValueError("\"moveType\" must be one of %s" % str(specMoveTypes))
+    movedPiece = None
+    destinationSquare = None
+    castlingSide = None
+    if moveType == "castling":
+        castlingSide = specTest.get("side")
+        if castlingSide not in legalCastlingSides:
+            raise ValueError("castling needs a \"side\" of %s" % str(legalCastlingSides))
+    else:
+        startSquare = specTest.get("from")
+        if board.GetSquareIndex(startSquare) < 0:
+            raise ValueError("\"from\" must be the board square of the piece to move")
+        pieceType = specTest.get("piece")
+        if pieceType == None:
+            pieceType = testBoard.GetPiece(board.GetSquareIndex(startSquare))
+            if pieceType == None:
+                raise ValueError("no piece on %s to move" % startSquare)
+        elif not(isinstance(pieceType, str)) or pieceType.lower() not in legalPieceTypes:
+            raise ValueError("\"piece\" must be one of %s" % str(legalPieceTypes))
+        else: # Same as GetBoardPiece() - white pieces upper case
+            pieceType = pieceType.upper() if playerColor == "w" else pieceType.lower()
+        movedPiece = utilities.MakePieceObj(pieceType, startSquare)
+        destinationSquare = specTest.get("to")
+        # Expected error tests can move off the board, but GetMove() needs <column><row>
+        if not(isinstance(destinationSquare, str)) or len(destinationSquare) != 2 or not(destinationSquare[1].isdigit()):
+            raise ValueError("\"to\" must be a <column><row> destination square")
+        if testType == 'f' and board.GetSquareIndex(destinationSquare) < 0:
+            raise ValueError("functional tests need a \"to\" square on the board")
+    moveList = GetMove(testType or 'e', moveType, playerColor, testBoard, movedPiece, destinationSquare, castlingSide)
+    if testType == 'f' and None in moveList:
+        raise ValueError("no piece to capture on %s" % destinationSquare)
+    request = AssembleRequest(playerColor, moveList[0], testBoard)
+    testDescription = "Description : " + specTest["description"] + "\n"
+    resultBoard, engineGameState, engineErrorCode, engineError = chessengine.PlayMove(testBoard, moveList[0], playerColor)
+    if testType == None:
+        testType = 'e' if engineErrorCode != 0 else 'f'
+    if testType == 'e':
+        errorCode = specErrorCodes.get(expect.get("errorCode"), expect.get("errorCode", engineErrorCode))
+        if not(isinstance(errorCode, int)) or errorCode == 0:
+            raise ValueError("\"errorCode\" must be a non-zero code or one of %s" % str(tuple(specErrorCodes)))
+        if useEngine and errorCode != engineErrorCode:
+            raise ValueError("the rules engine expects %s, not error %d (add \"engine\" : false to build it anyway)"\
+                             % (("error %d - %s" % (engineErrorCode, engineError)) if engineErrorCode != 0 else "a legal move", errorCode))
+        return (testType, AssembleExpErrTestContents("testName : " + specTest["name"], testDescription, request, {"code" : errorCode}))
+    gameStateVal = expect.get("gameState", engineGameState if useEngine else "")
+    if gameStateVal not in specGameStates:
+        raise ValueError("\"gameState\" must be one of %s" % str(specGameStates))
+    if not(useEngine): # Take the spec's word for it
+        movedPieces = GetMovedPieces(moveType, moveList)
+        expectedResponsePieces = GetResponsePieces(moveType, moveList)
+    elif engineErrorCode != 0:
+        raise ValueError("the rules engine expects error %d - %s (add \"engine\" : false to build it anyway)" % (engineErrorCode, engineError))
+    elif gameStateVal != engineGameState:
+        raise ValueError("the rules engine expects gameState '%s', not '%s' (add \"engine\" : false to build it anyway)" % (engineGameState, gameStateVal))
+    else:
+        movedPieces, expectedResponsePieces = GetEnginePieces(testBoard, resultBoard)
+    expectedGameState = ('"gameState": "' + gameStateVal + '"\n')
+    return (testType, AssembleFuncTestContents("testName : " + specTest["name"], testDescription, request,\
+                                               expectedGameState, GetExpectedPlayerState(playerColor),\
+                                               movedPieces, expectedResponsePieces))
+# END BuildSpecTest()
+
+# Process pool entry point - build & write one spec test.  Returns (testName, outcome, message), outcome
+# 'written', 'unchanged' (the file already says exactly this) or 'error'
+def CompileSpecTest(specTest, testRootDir, force):
+    builderOutput = io.StringIO() # The interactive functions' blather - only wanted if they bail out
+    try:
+        with contextlib.redirect_stdout(builderOutput):
+            testType, testFileContents = BuildSpecTest(specTest)
+            testRelPath, testAbsPath = GetTestFilePath(testType, specTest["name"], testRootDir)
+            if os.path.isfile(testAbsPath):
+                with open(testAbsPath, 'r') as testFile:
+                    if testFile.read() == testFileContents:
+                        return (specTest["name"], "unchanged", testRelPath)
+                if not(force):
+                    return (specTest["name"], "error", "%s already exists with other contents (use --force)" % testRelPath)
+            WriteTestFile(testType, specTest["name"], testFileContents, testRootDir)
+    except ValueError as specError:
+        return (specTest["name"], "error", str(specError))
+    except SystemExit: # GetMove() found a move it can't build and tried to exit
+        problemLines = [line for line in builderOutput.getvalue().splitlines() if "ERROR" in line]
+        return (specTest["name"], "error", problemLines[0] if problemLines else "unable to build this move")
+    return (specTest["name"], "written", testRelPath)
+# END CompileSpecTest()
+
+# '--spec FILE' mode.  Returns our exit code - 1 if any spec test couldn't be compiled
+def RunSpecMode(argv):
+    specFileName = ""
+    numJobs = os.cpu_count() or 1
+    testRootDir = rootTestDir
+    force = False
+    argIter = 1
+    while argIter < len(argv):
+        option = argv[argIter]
+        if option == "--force":
+            force = True
+            argIter += 1
+            continue
+        if option not in ("--spec", "-j", "--jobs", "--out-dir") or argIter + 1 >= len(argv):
+            print("Unknown option or missing value: %s" % option)
+            print(usageMessage)
+            return 1
+        optionValue = argv[argIter + 1]
+        argIter += 2
+        if option == "--spec":
+            specFileName = optionValue
+        elif option == "--out-dir":
+            testRootDir = os.path.abspath(optionValue)
+        elif utilities.RepresentsInt(optionValue) and int(optionValue) >= 1:
+            numJobs = int(optionValue)
+        else:
+            print("Invalid value '%s' for %s. Must be an integer of 1 or more." % (optionValue, option))
+            print(usageMessage)
+            return 1
+    if specFileName == "":
+        print("Please supply a '--spec FILE' to compile.")
+        print(usageMessage)
+        return 1
+    specTests, errorString = ExpandSpec(specFileName)
+    if errorString != "":
+        print("Process ERROR: %s" % errorString)
+        return 1
+    testNames = [specTest["name"] for specTest in specTests]
+    duplicateNames = sorted(set(testName for testName in testNames if testNames.count(testName) > 1))
+    if duplicateNames != []:
+        print("Process ERROR: Spec file %s names more than one test %s" % (specFileName, ", ".join(duplicateNames)))
+        return 1
+    for fileDir in (expPassDir, expFailDir):
+        os.makedirs(os.path.join(testRootDir, fileDir), exist_ok=True)
+    print("Compiling %d tests from %s on %d worker process(es)..." % (len(specTests), specFileName, numJobs))
+    outcomeCounts = {"written" : 0, "unchanged" : 0, "error" : 0}
+    compileArgs = (specTests, itertools.repeat(testRootDir), itertools.repeat(force))
+    if numJobs == 1:
+        compileResults = map(CompileSpecTest, *compileArgs)
+        for testName, outcome, message in compileResults:
+            outcomeCounts[outcome] += 1
+            if outcome == "error":
+                print("  %s: %s" % (testName, message))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=numJobs) as executor:
+            chunkSize = max(1, len(specTests) // (numJobs * 8))
+            for testName, outcome, message in executor.map(CompileSpecTest, *compileArgs, chunksize=chunkSize):
+                outcomeCounts[outcome] += 1
+                if outcome == "error":
+                    print("  %s: %s" % (testName, message))
+    print("%d test files written, %d unchanged, %d spec tests with errors." % (outcomeCounts["written"],
+          outcomeCounts["unchanged"], outcomeCounts["error"]))
+    return 1 if outcomeCounts["error"] > 0 else 0
+# END RunSpecMode()
+
 # END FUNCTION DEFINITIONS
 
 #=============================================================================
@@ -836,10 +1165,8 @@ and is ready for testing with 'Run_SFCS_Tests'." % (fileDir, fullTestName))
 def main():
     # Some command line sanity checking  
     arglen = len(sys.argv)
-    if arglen != 1:
-        print("No arguments needed for this script!")
-        print(usageMessage)
-        return 0
+    if arglen != 1: # Compile a spec file instead of asking
+        return RunSpecMode(sys.argv)
     # Now that that's out of the way, start in earnest.  Functions do most of the blather
     print(openingMessage)
     testType = GetTestType() # Expected Error ('e') of functional ('f')
@@ -848,30 +1175,40 @@ def main():
     testNameLine = ("testName : " + testName)
     # We'll always need a full request for both expected error and functional tests
     playerColor = GetPlayerColor() # 'w' or 'b', also sets the expected response player color.
-    boardStateList = GetRequestBoard() # Our Starting Board (list) - either from the Test_Board repository
+    testBoard = GetRequestBoard() # Our Starting Board (board.Board) - either from the Test_Board repository
                                        # or created interactively (optionally saved to the repository)
     moveType = GetMoveType() # move,capture,pawnpromotion,castling,check,checkmate,enpassant
-    moveList = GetMove(testType, moveType, playerColor, boardStateList) # Returns a list:
+    moveList = GetMove(testType, moveType, playerColor, testBoard) # Returns a list:
     #print("DEBUG: our returned moveList from GetMove is %s\n" % moveList)
     # ['move_string'(Algebraic Chess Notation), movedPieces (2 for castling, one for all otherr moveTypes)
     move = moveList[0]
-    request = AssembleRequest(playerColor, move, boardStateList) # Valid request Dict ready for API submission
+    request = AssembleRequest(playerColor, move, testBoard) # Valid request Dict ready for API submission
+    # Let the rules engine work out what SFCS should answer - the user can still say otherwise
+    resultBoard, engineGameState, engineErrorCode, engineError = chessengine.PlayMove(testBoard, move, playerColor)
+    useEngine = UseEngineExpectations(testType, move, resultBoard, engineGameState, engineErrorCode, engineError)
     # Assemble of our test case file with after getting our expected response values
     if testType == 'e': # Expected Error case
-        expectedErrorCode = GetExpectedErrorCode() # None for functional tests
+        if useEngine:
+            expectedErrorCode = {"code" : engineErrorCode}
+        else:
+            expectedErrorCode = GetExpectedErrorCode() # None for functional tests
         testFileContents = AssembleExpErrTestContents(testNameLine, testDescription, request, expectedErrorCode)
     elif testType == 'f': # Functional test, gather expected response values
-        expectedGameState = GetExpectedGameState() # "", "check", "checkmate", "stalemate"
-        #print("DEBUG: our expected response gameState is %s" % expectedGameState)
         expectedPlayerState = GetExpectedPlayerState(playerColor) # Set when we chose playerColor
         #print("DEBUG: our expected response playerState is %s" % expectedPlayerState)
-        movedPieces = GetMovedPieces(moveType, moveList) # string list of one or two pieces we expect *not* to see in response. 
-                                                         # [<movedPiece>, <capturedPiece>] or [<rook>,<king>] for castling
-        #print("DEBUG: Our Moved Pieces are %s" % movedPieces)
-        expectedResponsePieces = GetResponsePieces(moveType, moveList) # string list of pieces new in response
-                                                     # Moved piece(s) in new locs (w/ new type for pawnpromotion), two for castling
+        if useEngine:
+            expectedGameState = ('"gameState": "' + engineGameState + '"\n')
+            movedPieces, expectedResponsePieces = GetEnginePieces(testBoard, resultBoard)
+        else:
+            expectedGameState = GetExpectedGameState() # "", "check", "checkmate", "stalemate"
+            #print("DEBUG: our expected response gameState is %s" % expectedGameState)
+            movedPieces = GetMovedPieces(moveType, moveList) # string list of one or two pieces we expect *not* to see in response.
+                                                             # [<movedPiece>, <capturedPiece>] or [<rook>,<king>] for castling
+            #print("DEBUG: Our Moved Pieces are %s" % movedPieces)
+            expectedResponsePieces = GetResponsePieces(moveType, moveList) # string list of pieces new in response
+                                                         # Moved piece(s) in new locs (w/ new type for pawnpromotion), two for castling
         #print("DEBUG: Our expected Response Pieces are %s" % expectedResponsePieces)
-        testFileContents = AssembleFuncTestContents(testName, testDescription, request,\
+        testFileContents = AssembleFuncTestContents(testNameLine, testDescription, request,\
                                                     expectedGameState, expectedPlayerState,\
                                                     movedPieces, expectedResponsePieces)
     else:
@@ -884,4 +1221,4 @@ def main():
 
 # This is the standard boilerplate that calls the main() function.
 if __name__ == '__main__':
-  main()
+  sys.exit(main())
@@ -5,7 +5,8 @@
     This is the Top-Level Python3 script to run *all* of the testcases in our test case
     repository by default, or from a list of tests, or from a single test case file.
     It reads in the Expected-PASS and Expected-FAIL test case definition files
-    in the test repository and writes a Test_Run_Result.report file (ascii) plus an API.log file.
+    in the test repository and writes a Test_Run_Result.report file (ascii) plus an API.log file,
+    a JSONL record of every test (with a byte offset index) and a JSON summary file.
 
     This test infrastructure is designed to test the SolidFire Chess Service API "MakeMove" Method.
     In addition to python scripts for running tests against the API, it also contains
@@ -19,31 +20,125 @@
                    Ubuntu Linux 14.04 or better, can also be run on windows
                    Web access for machine running the tests (To access the SFCS server).
 
-    USAGE: python Run_SFCS_Tests.py [-l Path_to_list_of_testcase_files] [-s Path_to_single_test_file]
+    USAGE: python Run_SFCS_Tests.py [-l Path_to_list_of_testcase_files] [-s Path_to_single_test_file] [-j N | -a N] [-b K]
            Path_to_list_of_testcase_files: optional ascii file with one testcase name on each line
            Path_to_single_test_file: optional single test case definition file
-           (Default is to run all tests in the test case directories.)
+           -j, --jobs N: optional number of tests to run concurrently (Default 1)
+           -a, --async N: optional asyncio engine, at most N requests in flight (python 3.7+)
+           -b, --batch K: optional JSON-RPC 2.0 batches of K requests per HTTP post (combines with -j)
+           --pool-size N, --connect-timeout S, --read-timeout S, --retries N, --prewarm:
+                optional HTTP transport tuning.  Tests that time out count as UNEXPECTEDLY EXITED.
+           --no-cache, --cache-hash: optional - skip, or also hash-check, the parsed test definition cache
+           --load-rate R [--load-ramp R2,R3...] [--load-duration S] [--load-interval S]: optional load test
+                mode - replay the tests' requests open-loop at a scheduled rate (ramped through each R2,R3...)
+                and report p50/p90/p99/max latency, throughput & error codes for every interval.
+           --metrics FILE: optional OpenMetrics text file of the per-phase test time histograms
+           --response-cache N, --response-cache-file FILE, --server-version TAG: optional - send each
+                distinct request to the SFCS server only once, remembering responses in memory (and in FILE
+                across runs) for the server url & version TAG
+           --changed, --last-failed, --failed-first: optional - run only new or changed tests, only
+                last run's failures, or last run's failures first (from .sfci_run_history.sqlite)
+           --shard i/n [--shard-by-duration]: optional - run only shard i of n of the tests, split by
+                path hash (or balanced by recorded durations).  MergeReports.py combines the shards.
+           --select EXPR: optional - run only the tests whose metadata (type, code, piece, color, move kind,
+                board category...) matches EXPR, e.g. "piece==Q and code==-32020", from .sfci_test_index.sqlite
+           --coordinator ADDR [--spawn-workers N], --worker ADDR: optional distributed run - the coordinator
+                hands tests out over TCP (host:port) or a Unix socket (unix:/path) to any number of workers,
+                local or on other hosts, as they have room for them, and writes the one report, log & summary.
+           --oracle: optional - also check every SFCS response against our own rules engine (chessengine) and
+                report any disagreement in its own ORACLE category, apart from the tests' PASSED/FAILED
+           (Default is to run all .passtest & .expfail tests in the test case directories and their
+           subdirectories, starting on the first tests while the rest are still being found.)
 
 """
 
 # Required Python3 modules (Date, Time, File handling, Blather control...)
 import sys
 import time
+import atexit
 import os
+import itertools
+import collections
+import asyncio            # Event loop for '--async'
+import concurrent.futures # Worker thread pool for '--jobs'
+import socket     # Our host name, for '--worker'
+import subprocess # Local workers for '--spawn-workers'
 import json      # Used for posting to SFCS API
 import requests  # Used for posting to SFCS API
 import utilities # Local Module
+import transport # Local Module
+import asyncclient # Local Module
+import reportwriter # Local Module
+import testcase # Local Module
+import testcache # Local Module
+import board # Local Module
+import loadgen # Local Module
+import phasetimes # Local Module
+import responsecache # Local Module
+import runhistory # Local Module
+import sharding # Local Module
+import workqueue # Local Module
+import testindex # Local Module
+import oracle # Local Module
 
 
 # Global vars and initializations
-usagemessage = "Usage: python Run_SFCS_Tests.py [-l path_to_testcase_list_file] [-s path_to single_testFile]\n\
+usagemessage = "Usage: python Run_SFCS_Tests.py [-l path_to_testcase_list_file] [-s path_to single_testFile] [-j N | -a N] [-b K]\n\
+              [--pool-size N] [--connect-timeout S] [--read-timeout S] [--retries N] [--prewarm]\n\
+              [--url URL] [--no-cache] [--cache-hash]\n\
+              [--load-rate R [--load-ramp R2,R3...] [--load-duration S] [--load-interval S]] [--metrics FILE]\n\
+              [--response-cache N] [--response-cache-file FILE] [--server-version TAG]\n\
+              [--changed] [--last-failed] [--failed-first] [--shard i/n [--shard-by-duration]] [--select EXPR]\n\
+              [--coordinator ADDR [--spawn-workers N] | --worker ADDR] [--oracle]\n\
               -l path_to_testcase_list_file: Optional path to ascii file with one testcase definition file on each line\n\
               -s path_to_single_testFile: Optional path to a single test case definition file.\n\
-              (Default is to run all tests in the test case directories.)\n"
+              -j, --jobs N: Optional number of tests to run at once on a worker thread pool (Default 1).\n\
+              -a, --async N: Optional asyncio engine with at most N MakeMove requests in flight at once.\n\
+              -b, --batch K: Optional JSON-RPC 2.0 batch mode, posting K test requests in each HTTP request.\n\
+              --pool-size N: Keep-alive connections kept in the shared pool (Default: the number of jobs).\n\
+              --connect-timeout S, --read-timeout S: Seconds to wait on the SFCS server (Defaults 5 & 30).\n\
+              --retries N: Times to retry a failed connection, with backoff (Default 2).\n\
+              --prewarm: Open the pooled connections before the first test.\n\
+              --url URL: SFCS JSON-RPC API url to test (Default: the chesstest.solidfire.net server).\n\
+              --no-cache: Parse every test definition file, ignoring the parsed test cache from earlier runs.\n\
+              --cache-hash: Also check the contents (sha1) of each cached test file, not just its mtime & size.\n\
+              --load-rate R: Load test mode - replay the tests' requests open-loop at R requests/second instead of\n\
+                  running them, and report latency percentiles, throughput & error codes for each interval.\n\
+              --load-ramp R2,R3...: Ramp the rate linearly from R through each of these rates over the run.\n\
+              --load-duration S, --load-interval S: Seconds to run the load, and to report on (Defaults 60 & 5).\n\
+                  '-a N' caps the requests in flight in load mode (Default 10000).\n\
+              --metrics FILE: Also write the per-phase test time histograms to FILE in OpenMetrics text format.\n\
+              --response-cache N: Keep up to N SFCS responses in memory and answer identical requests from them.\n\
+              --response-cache-file FILE: Also keep the responses in FILE, for later runs against the same server.\n\
+              --server-version TAG: The SFCS server build under test - cached responses are only used for the same\n\
+                  url & TAG.\n\
+              --changed: Only run the tests that are new, or whose definition file changed, since they last ran.\n\
+              --last-failed: Only run the tests that FAILED or EXITED the last time they ran (all tests if none did).\n\
+              --failed-first: Run the tests that FAILED or EXITED last time first, then the rest.\n\
+              --shard i/n: Only run shard i (1 to n) of the tests, split by a stable hash of each test's path.\n\
+                  Combine the shards' results with MergeReports.py.\n\
+              --shard-by-duration: Balance the shards by the tests' recorded durations instead (needs the same\n\
+                  .sfci_run_history.sqlite on every machine).\n\
+              --select EXPR: Only run the tests whose indexed metadata matches EXPR, e.g. \"piece==Q and code==-32020\".\n\
+                  Fields: name, type (passtest/expfail), code, piece (P R N B Q K), color (w/b), move, capture,\n\
+                  castling, enpassant, promotion, check, checkmate, state, board (start/midgame/endgame/invalid)\n\
+                  and pieces.  Combine with and, or, not, ==, !=, <, <=, >, >=, in & not in.\n\
+              --coordinator ADDR: Hand the tests out to workers connecting on ADDR - host:port for TCP or\n\
+                  unix:/path for a Unix socket - and write their results to this run's report, log & summary.\n\
+              --spawn-workers N: Also start N local workers for the coordinator ('-j N' sets each one's test slots).\n\
+              --worker ADDR: Run tests for the coordinator at ADDR, '-j N' at a time, until it has no more.\n\
+                  The coordinator picks the tests - '-l', '-s', '--shard' etc. are the coordinator's options.\n\
+              --oracle: Also check every SFCS response against our own rules engine - the board after the move,\n\
+                  gameState, playerState or error class - and report disagreements as ORACLE DISAGREEMENTs, apart\n\
+                  from the tests' own PASSED/FAILED.  Give it to '--worker's too (spawned workers get it).\n\
+              (Default is to run all .passtest & .expfail tests in the test case directories and their subdirectories.)\n"
 todaysDate = time.strftime("%m_%d_%Y") # mm/dd/yyyy - 'mericun format
 timeStart = time.strftime("%H_%M_%S")  # 24 Hour format
 testRunResultFileName = "Test_Results_%s_%s.report" % (todaysDate,timeStart)
 testAPILogFileName = "Test_API_%s_%s.log" % (todaysDate,timeStart)
+testRecordFileName = "Test_Records_%s_%s.jsonl" % (todaysDate,timeStart)  # One JSON line per test
+testIndexFileName = "Test_Records_%s_%s.idx" % (todaysDate,timeStart)     # Byte offset of each test's record
+testSummaryFileName = "Test_Summary_%s_%s.json" % (todaysDate,timeStart)  # Run summary sidecar
 testCaseFileName = ""
 rootTestDir = os.getcwd()  # Always run from where we start the script
 fullPathTestFileName = ""  # for portability & consistency, all files opened with the full path.
@@ -52,10 +147,40 @@ expFailTestDir = os.path.join(rootTestDir, "expFailTestDir") # Location of tests
 expPassExt = ".passtest"
 expFailExt = ".expfail"
 numTests = 0 # Our total count of testcases to be run
-# Params supplied for or inferred from API request
-expFailTestParams = ("testName : ","Description : ","request : ","errorCode : ") 
-expPassTestParams = ("testName : ","Description : ","request : ",'"gameState": ',\
-                     '"playerState": ',"movedPieces : ","expectedResponsePieces : ")
+loadMaxInFlight = 10000 # Load test requests in flight at once, unless '-a N' says otherwise
+# Command line options that take a value, and the runOptions entry each one sets
+runOptionNames = {'-l' : "testListFileName", '-s' : "singleTestFileName", '-j' : "jobs", '--jobs' : "jobs",
+                  '-a' : "asyncInFlight", '--async' : "asyncInFlight", '-b' : "batchSize", '--batch' : "batchSize",
+                  '--pool-size' : "poolSize", '--connect-timeout' : "connectTimeout",
+                  '--read-timeout' : "readTimeout", '--retries' : "retries", '--url' : "apiurl",
+                  '--load-rate' : "loadRate", '--load-ramp' : "loadRamp", '--load-duration' : "loadDuration",
+                  '--load-interval' : "loadInterval", '--metrics' : "metricsFileName",
+                  '--response-cache' : "responseCacheSize", '--response-cache-file' : "responseCacheFileName",
+                  '--server-version' : "serverVersion", '--shard' : "shard", '--coordinator' : "coordinator",
+                  '--worker' : "worker", '--spawn-workers' : "spawnWorkers",
+                  '--select' : "select"}
+# Command line options that are just switched on
+runFlagNames = {'--prewarm' : "prewarm", '--no-cache' : "noCache", '--cache-hash' : "cacheHash",
+                '--changed' : "changed", '--last-failed' : "lastFailed", '--failed-first' : "failedFirst",
+                '--shard-by-duration' : "shardByDuration", '--oracle' : "oracle"}
+runWriter = None # The reportwriter.ReportWriter for this run, started by main()
+testCacheFileName = os.path.join(rootTestDir, ".sfci_test_cache.sqlite") # Parsed test definitions from earlier runs
+testCache = None # The testcache.TestCache for this run, unless '--no-cache'
+runPhaseTimes = phasetimes.PhaseTimes() # Histograms of where every test's time went
+responseCache = None # The responsecache.ResponseCache for this run, if '--response-cache' or '--response-cache-file'
+defaultResponseCacheSize = 10000 # Responses kept in memory when only '--response-cache-file' is given
+serverTag = "" # Which server (url & version) our cached responses came from
+runHistoryFileName = os.path.join(rootTestDir, ".sfci_run_history.sqlite") # Each test file's hash & outcome last run
+runHistory = None # The runhistory.RunHistory for this run
+metadataIndexFileName = os.path.join(rootTestDir, ".sfci_test_index.sqlite") # Each test's metadata, for '--select'
+metadataIndex = None # The testindex.TestIndex for this run, if '--select'
+runOracle = None # The oracle.Oracle checking every response against the rules engine, if '--oracle'
+oracleCacheSize = 100000 # Engine verdicts the oracle keeps in memory
+oracleCounts = {oracleOutcome : 0 for oracleOutcome in oracle.oracleOutcomes} # Tallied apart from testCounts
+# Test outcomes tallied for the Report Summary
+testPassed = "PASSED"
+testFailed = "FAILED"
+testExited = "EXITED"
 
 # Variables used in posting API requests
 apiurl = "http://chesstest.solidfire.net:8080/json-rpc"
@@ -68,11 +193,6 @@ whitePieceList = ['P','R','N','B','Q','K']
 blackPieceList = ['p','r','n','b','q','k']
 gameStateList = ['""', "check", "checkmate", "stalemate"]
 requestBoard = [] # Starting board we send in our request
-numRequestBoardPieces = 0  # How many piece objects are on the request boardState
-numMovedPieces = 0 # How many pieces did we move (1 except 2 for castling & capture).  Should *not be in response
-numNewPieces = 0 # Pieces that have different locs on response from request board, 1, except 2 for castling
-numExpectedPieces = 0 # How many piece objects we expect on the response boardState
-numResponsePieces = 0 # Number of pieces on the reponse board
 expectedErrorCode = 0 # If this has a value, then we're dealing with an expected error case
 gameState = "" # Expected response gameState
 playerState = ""  # Expected response playerState. Should always be opposite of request playerState
@@ -84,143 +204,191 @@ receivedResponseError = False # Did we recieve an error back from the SFCS API
 # Function Definitions Begin Here
 #********************************
 
-# Alias some print commands to direct blather to report & log files
-def printterm(data):
-    print(data)
-
-def printreport(data):
-    print(data)
-    with open(testRunResultFileName, "a") as reportFile:
-        print(data, file=reportFile)
-
-def printlog(data):
-    print(data)
-    with open(testAPILogFileName, "a") as logFile:
-        print(data, file=logFile)
-
-def printall(data):
-    print(data)
-    with open(testRunResultFileName, "a") as reportFile:
-        print(data, file=reportFile)
-    with open(testAPILogFileName, "a") as logFile:
-        print(data, file=logFile)
+# Alias some print commands to direct blather to report & log files.
+# Everything goes through the run's single reportwriter.ReportWriter, which owns the
+# report & log files.  When a testOutput list is supplied the data is held in that list
+# as (destination, data) tuples instead, and written out later as one intact block by
+# FlushTestOutput() so concurrently running tests never interleave.
+def printterm(data, testOutput=None):
+    WriteOutput("term", data, testOutput)
+
+def printreport(data, testOutput=None):
+    WriteOutput("report", data, testOutput)
+
+def printlog(data, testOutput=None):
+    WriteOutput("log", data, testOutput)
+
+def printall(data, testOutput=None):
+    WriteOutput("all", data, testOutput)
+
+# Hold, queue or (before main() starts the runWriter) directly write one line of output
+def WriteOutput(destination, data, testOutput):
+    if testOutput is not None:
+        testOutput.append((destination, data))
+    elif runWriter != None:
+        runWriter.Write([(destination, data)])
+    else:
+        print(data)
+        if destination == "report" or destination == "all":
+            with open(testRunResultFileName, "a") as reportFile:
+                print(data, file=reportFile)
+        if destination == "log" or destination == "all":
+            with open(testAPILogFileName, "a") as logFile:
+                print(data, file=logFile)
+
+# Write out a block of buffered test output, in the order it was produced
+def FlushTestOutput(testOutput):
+    if runWriter != None:
+        runWriter.Write(testOutput)
+        return
+    for destination, data in testOutput:
+        WriteOutput(destination, data, None)
 # END printing aliases
 
-# Get the requestBoard from the apiRequest
-def GetRequestBoardState(apiRequest):
-    # turn our apiRequest string to a dict
-    apiRequest = eval(apiRequest)
-    params = apiRequest.get("params")
-    requestBoard = params.get("boardState")
+# Get the requestBoard from the decoded apiRequest.  Hands back a copy, so the caller can't
+# change the parsed TestCase.
+def GetRequestBoardState(requestDict):
+    requestBoard = None
+    if isinstance(requestDict, dict) and isinstance(requestDict.get("params"), dict):
+        requestBoard = requestDict["params"].get("boardState")
     # Make sure we got something  - We'll let the API determine the goodness of our boardState
-    if requestBoard == None: 
-        return ("Process ERROR: GetRequestBoardState gave us nothing from %s\n" % fullPathTestFileName)
-    else:
-        return requestBoard
+    if not(isinstance(requestBoard, list)):
+        return []
+    return list(requestBoard)
 # END GetRequestBoardState()
 
-# Count the number of Piece objects on a board - works for request & response boardStates
-def GetNumBoardPieces(boardState):
-    numPieces = 0
-    numPieces = utilities.CountItemsInList(boardState)
-    # Some chess math
-    if numPieces == 0 or numPieces >= 33:
-        return ("Process ERROR: boardState has %d Pieces on it.  Must be between 1 & 32." % numPieces)
-    return numPieces
-# END GetNumBoardPieces()
-
-# Expected Error cases will have an expected error code from the API response
-def GetExpectedErrorCode(fullPathTestFileName):
-    errorDict = {}
-    errorCode = 0
-    errorValStr = utilities.GetFileValue(fullPathTestFileName, "errorCode")
-    errorValStr = errorValStr.rstrip() # Trim off \n
-    #printterm("DEBUG: Expected Response Error Dict line is %s" % errorValStr)
-    errorDict = eval(errorValStr)
-    if errorDict == {}:
-        return ("Process ERROR: Our testFile returned an empty value on the 'errorCode' line")
-    # Now get the integer errorCode
-    errorCode = errorDict.get("code")
-    if errorCode == 0:
-        return ("Process ERROR: Our testFile returned a '0' value on the 'errorCode' line")
-    else: # We got something...
-        return errorCode
-    return ("Process ERROR: we failed to retrieve any expected errorCode from our expFail test file.")
-# END GetExpectedErrorCode
-
-# What gameState value were we expecting in the API response?
-def GetExpectedGameState(fullPathTestFileName):
-    expectedGameState = ""
-    expectedGameState = utilities.GetFileValue(fullPathTestFileName, '"gameState"')
-    if expectedGameState.startswith("Process ERROR"):
-        return expectedGameState
-    elif expectedGameState == "":
-        return ("Process ERROR: we failed to retrieve any expectedGameState value from our test file.")
-    else:
-        expectedGameState = expectedGameState[2:-2] # strip off leading & trailing quotes, spaces & ]\n
-        return expectedGameState
-# END GetExpectedGameState
-
-# Functional Tests - What playerState value ('w' or 'b') were we expecting in the API response?
-def GetExpectedPlayerState(fullPathTestFileName):
-    expectedPlayerState = "" 
-    expectedPlayerState = utilities.GetFileValue(fullPathTestFileName, '"playerState"') # w/ quotes
-    if expectedPlayerState.startswith("Process ERROR"):
-        return expectedPlayerState
-    elif expectedPlayerState == "":
-        return ("Process ERROR: we failed to retrieve any expectedPlayerState value from our test file.")
-    else:
-        expectedPlayerState = expectedPlayerState[2:-2] # strip off leading & trailing quotes, spaces & ]\n 
-        return expectedPlayerState
-# END GetExpectedGameState
-
-# Get a list of moved and captured pieces which we should *not* see in the response boardState
-def GetMovedPieces(fullPathTestFileName):
-    movedPieces = []
-    movedPiecesStr = utilities.GetFileValue(fullPathTestFileName, "movedPieces")
-    #printterm("DEBUG: Expected movedPieces list string is %s" % movedPiecesStr)
-    if movedPiecesStr.startswith("Process ERROR"):
-        return movedPiecesStr
-    # Turn it back into a list
-    movedPieces = eval(movedPiecesStr)
-    if movedPieces == []:
-        return ("Process ERROR: Our testFile returned an empty list for the movedPieces entry")
-    else:
-        return movedPieces
-    return ("Process ERROR: we failed to retrieve any movedPieces from our test file.")
-# END GetMovedPieces()
-
-# Get a list of new moved piece location(s) that we expect to see in the response boardState
-def GetExpectedResponsePieces(fullPathTestFileName):
-    expectedResponsePieces = []
-    expectedResponsePiecesStr = utilities.GetFileValue(fullPathTestFileName, "expectedResponsePieces")
-    #printterm("DEBUG: Expected expectedResponsePieces list string is %s" % expectedResponsePiecesStr)
-    if expectedResponsePiecesStr.startswith("Process ERROR"):
-        return expectedResponsePiecesStr
-    # Turn it back into a list
-    expectedResponsePieces = eval(expectedResponsePiecesStr)
-    if expectedResponsePieces == []:
-        return ("Process ERROR: Our testFile returned an empty list for the expectedResponsePieces entry")
-    else:
-        return expectedResponsePieces
-    return ("Process ERROR: we failed to retrieve any expectedResponsePieces from our test file.")
-# END GetExpectedResponsePieces()
-            
+# GetBoardDiff: Compare two board.Board's square by square in one pass.
+# Returns a diff dict of what it takes to get from fromBoard to toBoard:
+#   "removed" {square : type} - pieces whose square is empty on toBoard
+#   "added"   {square : type} - pieces on squares that were empty on fromBoard
+#   "changed" {square : (fromType, toType)} - squares holding a different piece on each board
+def GetBoardDiff(fromBoard, toBoard):
+    boardDiff = {"removed" : {}, "added" : {}, "changed" : {}}
+    for square, (fromCode, toCode) in enumerate(zip(fromBoard.squares, toBoard.squares)):
+        if fromCode == toCode:
+            continue
+        if toCode == 0:
+            boardDiff["removed"][square] = fromBoard.GetPiece(square)
+        elif fromCode == 0:
+            boardDiff["added"][square] = toBoard.GetPiece(square)
+        else:
+            boardDiff["changed"][square] = (fromBoard.GetPiece(square), toBoard.GetPiece(square))
+    return boardDiff
+# END GetBoardDiff()
+
+# GetExpectedBoard: Apply the test's expected move to the request board.  The movedPieces leave
+# their squares and the expectedResponsePieces land on theirs (replacing anything captured there).
+# Returns (expectedBoard, errorString)
+def GetExpectedBoard(requestBoard, movedPieces, expectedResponsePieces):
+    expectedBoard = requestBoard.Copy()
+    for mPiece in movedPieces:
+        square = board.GetSquareIndex(mPiece.get("loc"))
+        if square < 0 or requestBoard.GetPiece(square) != mPiece.get("type"):
+            return (expectedBoard, "Process ERROR: Moved piece %s is not on the request boardState" % str(mPiece))
+        expectedBoard.RemovePiece(square)
+    for erPiece in expectedResponsePieces:
+        square = board.GetSquareIndex(erPiece.get("loc"))
+        if square < 0 or erPiece.get("type") not in board.pieceCodes:
+            return (expectedBoard, "Process ERROR: Expected response piece %s is not a valid piece" % str(erPiece))
+        expectedBoard.SetPiece(square, erPiece["type"])
+    return (expectedBoard, "")
+# END GetExpectedBoard()
+
+# DescribeBoardDiff: Spell out the differences between the board we expected and the one we got
+def DescribeBoardDiff(boardDiff):
+    differences = []
+    for square, pieceType in sorted(boardDiff["removed"].items()):
+        differences.append("missing %s on %s" % (pieceType, board.GetSquareLoc(square)))
+    for square, pieceType in sorted(boardDiff["added"].items()):
+        differences.append("unexpected %s on %s" % (pieceType, board.GetSquareLoc(square)))
+    for square, (expectedType, responseType) in sorted(boardDiff["changed"].items()):
+        differences.append("%s on %s instead of %s" % (responseType, board.GetSquareLoc(square), expectedType))
+    return "; ".join(differences)
+# END DescribeBoardDiff()
+
 # GetResponseAPI: Function to submit our apiRequest to the SFCS API and return what we get back
-def GetResponseAPI(apiRequest):
+# Posts through the shared apiTransport connection pool when one is supplied.
+# Raises a requests exception (e.g. a Timeout) if we never get a response.
+# The serialize, network & decode phase times go in the timings dict, if one is supplied.
+def GetResponseAPI(apiRequest, apiTransport=None, timings=None):
     responseApi = ""
-    json_str = json.dumps(apiRequest) 
+    serializeStart = time.perf_counter()
+    json_str = json.dumps(apiRequest)
     #printterm("DEBUG: json_str after json.dumps(apiRequest) is:")
     #printterm(json_str)
     data = json.loads(json_str)
     #printterm("\nDEBUG: 'data' after json.loads(json_str) that we're posting to API is:\n")
     #printterm(data)
-    responseApi = requests.post(apiurl, data, headers=apiheaders).json()
+    networkStart = time.perf_counter()
+    if apiTransport != None:
+        responseBody = apiTransport.PostRaw(data)
+    else:
+        responseBody = requests.post(apiurl, data, headers=apiheaders).content
+    decodeStart = time.perf_counter()
+    responseApi = json.loads(responseBody)
     #printterm("\nDEBUG: The returned responseApi is:\n")
     #printterm(responseApi)
+    if timings != None:
+        timings["serialize"] = networkStart - serializeStart
+        timings["network"] = decodeStart - networkStart
+        timings["decode"] = time.perf_counter() - decodeStart
     return responseApi
 #END def GetResponseAPI(apiRequestAPI)
 
+# GetTestResponseAPI: GetResponseAPI() for a prepared test - from the response cache if an identical
+# request has already been answered (or is being answered right now on another thread)
+def GetTestResponseAPI(testInfo, apiTransport=None, testOutput=None):
+    requestKey = None
+    if responseCache != None:
+        requestKey = responsecache.GetRequestKey(testInfo["testCase"].requestDict, serverTag)
+    if requestKey == None:
+        return GetResponseAPI(testInfo["apiRequest"], apiTransport, testInfo["timings"])
+    responseApi, isFromCache = responseCache.GetOrFetch(requestKey, testInfo["testCase"].requestDict.get("id"),
+                               lambda: GetResponseAPI(testInfo["apiRequest"], apiTransport, testInfo["timings"]))
+    if isFromCache:
+        printlog("SFCS API Response for %s is from the response cache - an identical request was already answered."\
+                 % testInfo["name"], testOutput)
+    return responseApi
+# END GetTestResponseAPI()
+
+# AssignMessageId: Give a prepared test's request its own JSON-RPC "id" so its response can be
+# matched back to it out of a batch.  Returns the request dict, or None if the request isn't a
+# valid JSON object (some expected error cases are deliberately malformed) and must be posted alone.
+def AssignMessageId(testInfo, messageId):
+    requestDict = testInfo["testCase"].requestDict # Already decoded by the test file parser
+    if not(isinstance(requestDict, dict)):
+        return None
+    requestDict = dict(requestDict, id=messageId) # A copy - the TestCase keeps the request as written
+    testInfo["messageId"] = messageId
+    return requestDict
+# END AssignMessageId()
+
+# GetBatchResponseAPI: Submit a list of request dicts to the SFCS API as one JSON-RPC 2.0 batch.
+# Returns the responses in a dict keyed by message id, or None if the server didn't answer with a batch.
+# The whole batch's serialize, network & decode phase times go in the timings dict, if one is supplied.
+def GetBatchResponseAPI(batchRequests, apiTransport=None, timings=None):
+    serializeStart = time.perf_counter()
+    data = json.dumps(batchRequests)
+    networkStart = time.perf_counter()
+    if apiTransport != None:
+        responseBody = apiTransport.PostRaw(data)
+    else:
+        responseBody = requests.post(apiurl, data, headers=apiheaders).content
+    decodeStart = time.perf_counter()
+    responseList = json.loads(responseBody)
+    if timings != None:
+        timings["serialize"] = networkStart - serializeStart
+        timings["network"] = decodeStart - networkStart
+        timings["decode"] = time.perf_counter() - decodeStart
+    if not(isinstance(responseList, list)):
+        return None
+    responsesById = {}
+    for responseApi in responseList:
+        if isinstance(responseApi, dict) and responseApi.get("id") != None:
+            responsesById[responseApi.get("id")] = responseApi
+    return responsesById
+# END GetBatchResponseAPI()
+
 # GetFinalTestResult(): Function to check our response from the SFCS API against what we were told to
 # expect from the test definition file.  
 # PROGRAMMING NOTE: We can't do a simple Diff against an expected response file since the order
@@ -233,7 +401,9 @@ def GetResponseAPI(apiRequest):
 # 3) "functionalTestFAIL": - We recieved an unexpected ERROR code or API response incorrect
 # 4) "expectedErrorCasePASS":  Test API response is the expected API error code
 # 5) "expectedErrorCaseFAIL":- Test API did not throw expected error code or unexpectedly sent a full API response
-def GetFinalTestResult(responseApi, expectResponseList, isExpectedErrorCase, receivedResponseError, requestBoard):
+# expectedMessageId is the JSON-RPC "id" we sent - always 1 except for tests submitted in a '--batch'
+def GetFinalTestResult(responseApi, expectResponseList, isExpectedErrorCase, receivedResponseError, requestBoard,\
+                       expectedMessageId=apiMessageid):
     testStatus = ""
     # Let's Deal with expected error cases first
     if isExpectedErrorCase and receivedResponseError:
@@ -281,13 +451,13 @@ def GetFinalTestResult(responseApi, expectResponseList, isExpectedErrorCase, rec
         #  Break the responseApi Dict apart
         #printterm(str(responseApi))
         #printterm("\n")
-        # Check the response message "id" value - should be 1
+        # Check the response message "id" value - should be the one we sent (1 unless batched)
         respIDVal = 0 
         respIDVal = (responseApi["id"])
         #printterm(str(respIDVal))
         #printterm("\n")   
-        if respIDVal != apiMessageid:
-            testStatus = ("functionalTestFAIL: response message ID value of %d is not %s" % (respIDVal, apiMessageid))
+        if respIDVal != expectedMessageId:
+            testStatus = ("functionalTestFAIL: response message ID value of %s is not %s" % (respIDVal, expectedMessageId))
             return testStatus 
 
         # make sure we have something in the 'result' dict...
@@ -329,6 +499,9 @@ def GetFinalTestResult(responseApi, expectResponseList, isExpectedErrorCase, rec
         # Get the movedPieces and expectedResponsePieces out of the expetResponseList so we can do comparisons of the response board
         movedPieces = expectResponseList[2]
         expectedResponsePieces = expectResponseList[3]
+        if movedPieces == [] or expectedResponsePieces == []:
+            testStatus = ("Process ERROR: The expectResponseList did not contain the required movedPieces & expectedResponsePieces values.")
+            return testStatus
 
         # Try to get the response boardState value so we can inspect it
         respBSList = resultValue.get("boardState") # Should be a list
@@ -336,62 +509,25 @@ def GetFinalTestResult(responseApi, expectResponseList, isExpectedErrorCase, rec
             testStatus = ("functionalTestFAIL: API response boardState is unexpectedly empty!")
             return testStatus
         #printterm("DEBUG: Response board is:\n%s\n" % str(respBSList))
-        # See if the response boardState has the expected number of Pieces
-        # The expected number of pieces is the number in the requestBoard - movedPieces + expectedResponsePieces
-        numRequestBoardPieces = GetNumBoardPieces(requestBoard)
-        numMovedPieces = utilities.CountItemsInList(movedPieces)
-        numNewPieces = utilities.CountItemsInList(expectedResponsePieces)
-        numExpectedPieces = (int(numRequestBoardPieces) - numMovedPieces + numNewPieces)
-        # Now get the number of pieces in our API response board
-        numResponsePieces = GetNumBoardPieces(respBSList)
-        if numResponsePieces != numExpectedPieces:
-            testStatus = ("functionalTestFAIL: API response boardState %s contains %d Pieces.  Expected %s\n" % (str(respBSList),numResponsePieces,numExpectedPieces))
-            return testStatus  
 
-        # boardState ListChecks.
-        # 1) Make sure the movedPieces moved.  The response boardState should *not* have them
-        if movedPieces == []:
-            testStatus = ("Process ERROR: The expectResponseList did not contain the required movedPieces value.")
+        # boardState checks.  Index both boards by square, work out the single diff between the
+        # request & response boards (pieces removed, added & changed), and compare it to the diff
+        # the expected move makes: movedPieces leave their squares, expectedResponsePieces arrive.
+        requestBoardObj, boardError = board.BoardFromState(requestBoard)
+        if requestBoard == [] or boardError != "":
+            testStatus = ("Process ERROR: GetFinalTestResult() did not get a usable requestBoard: %s" % boardError)
             return testStatus
-        # Comes back as a list w/ one 2-element piece object, in the form of a dict
-        for rpiece in movedPieces:
-            # Check that it moved
-            if rpiece in respBSList:
-                testStatus = ("functionalTestFAIL: API response boardState %s still contains the moved Piece %s." % (str(respBSList),rpiece))
-   
-        # 2) Make sure the expectedResponsePieces are in the response boardState
-        if expectedResponsePieces == []:
-            testStatus = ("Process ERROR: the expectResponseList did not contain the required expectedResponsePieces value.")
+        responseBoard, boardError = board.BoardFromState(respBSList)
+        if boardError != "":
+            testStatus = ("functionalTestFAIL: API response boardState %s is not a valid board: %s\n" % (str(respBSList), boardError))
             return testStatus
-        for erPiece in expectedResponsePieces:
-            if not(erPiece in respBSList):
-                testStatus = ("functionalTestFAIL: API response boardState %s does not contain the expected Pieces %s.\n" % (respBSList,erPieces))
-                return testStatus
-
-        # 3) Finally, iterate through the request boardState pieces.  If it's not the moved piece (piecesMoved),
-        #    Make sure the piece is still in the reponse boardState.
-        if requestBoard == None or requestBoard == []:
-            testStatus = ("Process ERROR: GetFinalTestResult() did not get the required requestBoard value.")
+        expectedBoard, boardError = GetExpectedBoard(requestBoardObj, movedPieces, expectedResponsePieces)
+        if boardError != "":
+            return boardError
+        if GetBoardDiff(requestBoardObj, responseBoard) != GetBoardDiff(requestBoardObj, expectedBoard):
+            testStatus = ("functionalTestFAIL: API response boardState %s does not match the expected move: %s\n"\
+                          % (str(respBSList), DescribeBoardDiff(GetBoardDiff(expectedBoard, responseBoard))))
             return testStatus
-        # We should have our requestBoard now
-        # iterate through the request boardState and make sure each piece in in the response boardState 
-        # Add the new expected pieces to the request board for comparison
-        for rPiece in expectedResponsePieces:
-            requestBoard.append(rPiece)
-        for piece in requestBoard:
-            if piece == {}:
-                testStatus = ("Process ERROR: Unable to get a piece object out of the requestBoard")
-                return testStatus
-            # A piece that moved should not be in the response boardState w/ its original loc
-            for mPiece in movedPieces:
-                if mPiece in respBSList:
-                    testStatus = ("functionalTestFAIL: API response board %s still has the original location of moved piece %s" % (str(respBSList),str(piece)))
-                    return testStatus
-            # Every piece in the expectedResponsePieces list should be in the response board
-            for rPiece in respBSList:
-                if rPiece not in respBSList:
-                    testStatus = ("functionalTestFAIL: API response board %s does not contain the expected Piece %s" % (str(respBSList),piece))
-                    return testStatus
     # If we get here, we should have passed all checks
     return "functionalTestPASS"
 # END def GetTestResult(responseApi)
@@ -403,83 +539,901 @@ def GetPercent(part, whole):
   percentStr = str(formatPercent) + " %"
   return percentStr
 
+# GetRunOptions: Hand-parse our command line into a runOptions dict.
+# Returns None (after printing why) if we should just exit.
+def GetRunOptions(argv):
+    runOptions = {"option" : "", "testListFileName" : "", "singleTestFileName" : "", "jobs" : 1,
+                  "asyncInFlight" : 0, "batchSize" : 0, "poolSize" : 0, "connectTimeout" : 5.0,
+                  "readTimeout" : 30.0, "retries" : 2, "prewarm" : False, "apiurl" : "",
+                  "noCache" : False, "cacheHash" : False, "loadRate" : 0.0, "loadRamp" : "", "loadDuration" : 60.0,
+                  "loadInterval" : 5.0, "loadRates" : [], "metricsFileName" : "",
+                  "responseCacheSize" : 0, "responseCacheFileName" : "", "serverVersion" : "",
+                  "changed" : False, "lastFailed" : False, "failedFirst" : False,
+                  "shard" : "", "shardByDuration" : False, "shardIndex" : 0, "numShards" : 0,
+                  "coordinator" : "", "worker" : "", "spawnWorkers" : 0, "address" : None,
+                  "select" : "", "Select" : None, "oracle" : False}
+    argIter = 1
+    while argIter < len(argv):
+        option = argv[argIter]
+        # Look for a command help request & post the usage message if found
+        if option in ('-h', '-H', '--help'):
+            printterm("Help requested: %s" % option)
+            printterm(usagemessage)
+            return None
+        if option in runFlagNames: # On/off options w/o a value
+            runOptions[runFlagNames[option]] = True
+            argIter += 1
+            continue
+        if option not in runOptionNames:
+            printterm("Unkown option %s supplied." % option)
+            printterm(usagemessage)
+            return None
+        if argIter + 1 >= len(argv):
+            printterm("No value supplied for option %s" % option)
+            printterm(usagemessage)
+            return None
+        optionName = runOptionNames[option]
+        optionValue = argv[argIter + 1]
+        argIter += 2
+        if option == '-l' or option == '-s': # List of tests (-l listpath) or single test request (-s testfilepath)
+            if runOptions["option"] != "":
+                printterm("Only one of '-l' or '-s' may be supplied.")
+                printterm(usagemessage)
+                return None
+            runOptions["option"] = option
+            runOptions[optionName] = optionValue
+            if option == '-l':
+                printterm("Test list file %s chosen.\nWill read and try to tun testcases in that file.\n" % optionValue)
+            else:
+                printterm("Single test definition file %s chosen.\nWill try to run just that test\n" % optionValue)
+        elif isinstance(runOptions[optionName], float): # Seconds
+            if not(utilities.RepresentsFloat(optionValue)) or float(optionValue) <= 0:
+                printterm("Invalid value '%s' for %s. Must be a number greater than 0." % (optionValue, option))
+                printterm(usagemessage)
+                return None
+            runOptions[optionName] = float(optionValue)
+        elif isinstance(runOptions[optionName], int): # Counts
+            minimum = 0 if optionName == "retries" else 1
+            if not(utilities.RepresentsInt(optionValue)) or int(optionValue) < minimum:
+                printterm("Invalid value '%s' for %s. Must be an integer of %d or more." % (optionValue, option, minimum))
+                printterm(usagemessage)
+                return None
+            runOptions[optionName] = int(optionValue)
+        else:
+            runOptions[optionName] = optionValue
+    if runOptions["jobs"] > 1 and runOptions["asyncInFlight"] > 0:
+        printterm("Choose either '--jobs' or '--async', not both.")
+        printterm(usagemessage)
+        return None
+    if runOptions["batchSize"] > 0 and runOptions["asyncInFlight"] > 0:
+        printterm("'--batch' runs on the serial or '--jobs' engines, not '--async'.")
+        printterm(usagemessage)
+        return None
+    # '--shard i/n': run only our share of the tests
+    if runOptions["shard"] != "":
+        shardSpec = sharding.ParseShard(runOptions["shard"])
+        if shardSpec == None:
+            printterm("Invalid value '%s' for --shard. Must be i/n with 1 <= i <= n, e.g. 2/4." % runOptions["shard"])
+            printterm(usagemessage)
+            return None
+        runOptions["shardIndex"], runOptions["numShards"] = shardSpec
+    elif runOptions["shardByDuration"]:
+        printterm("'--shard-by-duration' balances the shards of a '--shard i/n' run. Please supply one.")
+        printterm(usagemessage)
+        return None
+    # '--select EXPR': run only the tests whose metadata matches
+    if runOptions["select"] != "":
+        runOptions["Select"], errorString = testindex.CompileSelect(runOptions["select"])
+        if runOptions["Select"] == None:
+            printterm("Invalid '--select' expression '%s': %s" % (runOptions["select"], errorString))
+            printterm(usagemessage)
+            return None
+    # Distributed runs: a '--coordinator' hands out the tests, '--worker's run them on the '--jobs' engine
+    if runOptions["coordinator"] != "" or runOptions["worker"] != "":
+        if runOptions["coordinator"] != "" and runOptions["worker"] != "":
+            printterm("Choose either '--coordinator' or '--worker', not both.")
+            printterm(usagemessage)
+            return None
+        if runOptions["asyncInFlight"] > 0 or runOptions["batchSize"] > 0 or runOptions["loadRate"] > 0:
+            printterm("Workers run their tests on the '--jobs' engine - '--async', '--batch' and load test mode don't apply.")
+            printterm(usagemessage)
+            return None
+        addressSpec = runOptions["coordinator"] or runOptions["worker"]
+        runOptions["address"] = workqueue.ParseAddress(addressSpec)
+        if runOptions["address"] == None:
+            printterm("Invalid address '%s'. Must be host:port or unix:/path, e.g. 127.0.0.1:9100." % addressSpec)
+            printterm(usagemessage)
+            return None
+    if runOptions["worker"] != "" and (runOptions["option"] != "" or runOptions["shard"] != "" or runOptions["changed"]\
+                                       or runOptions["lastFailed"] or runOptions["failedFirst"] or runOptions["select"] != ""):
+        printterm("A '--worker' runs the tests its coordinator picks. Please give the test options to the coordinator.")
+        printterm(usagemessage)
+        return None
+    if runOptions["spawnWorkers"] > 0 and runOptions["coordinator"] == "":
+        printterm("'--spawn-workers' starts local workers for a '--coordinator'. Please supply one.")
+        printterm(usagemessage)
+        return None
+    # Load test mode: the send rate schedule is '--load-rate', then ramped through each '--load-ramp' rate
+    if runOptions["loadRamp"] != "" and runOptions["loadRate"] == 0.0:
+        printterm("'--load-ramp' ramps up (or down) from a '--load-rate'. Please supply one.")
+        printterm(usagemessage)
+        return None
+    if runOptions["loadRate"] > 0:
+        if runOptions["jobs"] > 1 or runOptions["batchSize"] > 0:
+            printterm("Load test mode runs on the asyncio engine - '--jobs' and '--batch' don't apply.")
+            printterm(usagemessage)
+            return None
+        if runOptions["oracle"]:
+            printterm("Load test mode doesn't check the responses - '--oracle' doesn't apply.")
+            printterm(usagemessage)
+            return None
+        runOptions["loadRates"] = [runOptions["loadRate"]]
+        for rampRate in runOptions["loadRamp"].split(",") if runOptions["loadRamp"] != "" else []:
+            if not(utilities.RepresentsFloat(rampRate)) or float(rampRate) <= 0:
+                printterm("Invalid rate '%s' in '--load-ramp'. Rates must be requests/second greater than 0." % rampRate)
+                printterm(usagemessage)
+                return None
+            runOptions["loadRates"].append(float(rampRate))
+    return runOptions
+# END GetRunOptions()
+
+# PrepareTest: Everything we do for a test before submitting its request to the SFCS API.
+# Returns a testInfo dict.  If the test definition file didn't give us what we need,
+# testInfo["outcome"] is already set to testExited and the test should go no further.
+def PrepareTest(fullPathTestFileName, testOutput=None):
+    testInfo = {"path" : fullPathTestFileName, "name" : "", "outcome" : "", "isExpectedErrorCase" : False,
+                "expectedErrorCode" : 0, "apiRequest" : "", "messageId" : apiMessageid, "startTime" : time.time(),
+                "testCase" : None, "timings" : {}} # timings: seconds spent in each phasetimes phase
+    # Get the file base name (including extension)
+    testFileName = os.path.basename(fullPathTestFileName)
+    # Get the testName w/o any path or file extensions on fail if we can't find it
+    testName = ""
+    testName = utilities.GetTestName(fullPathTestFileName)
+    if testName == "" or "ERROR" in testName:
+        printterm("DEBUG: Returned testname is %s" % testName, testOutput)
+        printall("Process ERROR: Unable to find test case name in file %s" % fullPathTestFileName, testOutput)
+        printall("Moving on to next testcase.\n", testOutput)
+        testInfo["outcome"] = testExited
+        return testInfo
+    testInfo["name"] = testName
+
+    printall("======================================================================", testOutput)
+    printall("****** Starting test case %s ******\n" % testName, testOutput)
+    # Read the whole test definition file in one go.  '.expfail' files only need the params for an expFail test
+    fileext = os.path.splitext(testFileName)[1] # returns 2-element tuple, (basename, .ext)
+    if fileext != expFailExt and fileext != expPassExt:
+        printall("Process ERROR: Unknown file extension '%s' on TestFileName. Only '%s' and '%s' allowed" % (fileext, expPassExt, expFailExt), testOutput)
+    parseStart = time.perf_counter()
+    if testCache != None:
+        testCase = testCache.GetTestCase(fullPathTestFileName)
+    else:
+        testCase = testcase.ParseTestFile(fullPathTestFileName)
+    testInfo["timings"]["parse"] = time.perf_counter() - parseStart
+    isExpectedErrorCase = testCase.isExpectedErrorCase # Flag to tell us if this is a funtional or expected error case
+    testInfo["isExpectedErrorCase"] = isExpectedErrorCase
+
+    # Give us the test name line
+    printall("Test: %s specified in test definition file %s\n" % (testName, testFileName), testOutput)
+    # Add the Test Description as well
+    printall("Test Description: %s" % testCase.description, testOutput)
+    # Every missing or malformed field in the file, all at once
+    if testCase.errors != []:
+        printall("Process ERROR: Test definition file %s has %d problem(s):" % (testFileName, len(testCase.errors)), testOutput)
+        for parseError in testCase.errors:
+            printall(parseError, testOutput)
+        printall("Marking as a Test Exit Error and move on to next testcase.\n", testOutput)
+        testInfo["outcome"] = testExited
+        return testInfo
+    testInfo["testCase"] = testCase
+    printall("***Beginning test run of %s***\n" % testName, testOutput)
+    # Choose whether to expect an error code based on our isExpectedErrorCase flag
+    if isExpectedErrorCase: # bool
+        printreport("This is an expected Error Case.", testOutput)
+        printreport("The Expected API Response Error Code value is: %d" % testCase.expectedErrorCode, testOutput)
+        testInfo["expectedErrorCode"] = testCase.expectedErrorCode
+    else: # Functional test, not an expected Error case...
+        printreport("This is a functional test expected to return a full API response.\n", testOutput)
+    # Run that puppy! Take the "request : " value from our test file and then
+    # submit it to the SolidFire Chess Service API.  The APU should returns a full JSON-RPC result
+    # if all that goes well, an ERROR otherwise
+    apiRequest = testCase.apiRequest
+    printall("We have an API Request for %s. Submit it to the SFCS API and save to log file.\n" % testName, testOutput)
+    # Write the API Request to just the log file
+    printlog("API Request for testcase %s:" % testName, testOutput)
+    printlog(apiRequest, testOutput)
+    testInfo["apiRequest"] = apiRequest
+    return testInfo
+# END PrepareTest()
+
+# FinishTest: Check the SFCS API response for a prepared test and report the result.
+# Returns the test outcome - testPassed, testFailed or testExited.
+def FinishTest(testInfo, responseApi, testOutput=None):
+    testName = testInfo["name"]
+    isExpectedErrorCase = testInfo["isExpectedErrorCase"]
+    expectedErrorCode = testInfo["expectedErrorCode"]
+    testCase = testInfo["testCase"]
+    receivedResponseError = False # Flag to tell us if we got one
+    testInfo["response"] = responseApi # Kept for the run record
+    # Check for no response or a process ERROR (as opposed to an API Error Code) from our request
+    if responseApi == "":
+        printall("Process ERROR: Test %s Failed to return a valid API response or ErrorCode." % testName, testOutput)
+        printall("SFCS API Response:", testOutput)
+        printall(responseApi, testOutput)
+        printall("Marking as a Test Exit Error and move on to next testcase.\n", testOutput)
+        return testExited
+
+    # We have a non-empty response from the SFCS API
+    # Write it to the log file, then see if it's what we expect
+    printreport("We have an API Response from the SFCS Server for test %s - Saving to log file.\n" % testName, testOutput)
+    # See if we got an error in our API response - can happen both for ExFail & functional
+    if responseApi.get('error'):
+        receivedResponseError = True
+        printall("Received an 'error' message in the SFCS API response:\n", testOutput)
+        printreport(str(responseApi), testOutput)
+    else:
+        printlog("SFCS API Response:", testOutput)
+    printlog(str(responseApi), testOutput)
+    printall("Checking our SFCS API response against the expected response params...", testOutput)
+    testResult = ""
+    requestBoard = GetRequestBoardState(testCase.requestDict)
+    expectResponseList = [] # List to hold all of our expected response elements
+    # If this is an expected error case, we should already have our expected error code.
+    # We need to pass that into the expectResponseList before we call GetFinalTestResult
+    if isExpectedErrorCase:
+        expectResponseList = [expectedErrorCode] # int: -32000, -32010, -32-2-, -32030
+
+    # If this is *not* an expected error case (aka a functonal test) and we didn't get an API error,
+    # Call "GetExpectedResponseValues:" to populate the expresDict with expected values.
+    if not(isExpectedErrorCase): # Bool
+        if not(receivedResponseError): # We got a full API response, gather our expected values
+            # What we want to look for in the response, already read from the testCase definition file
+            expectResponseList = [testCase.expectedGameState, testCase.expectedPlayerState, testCase.movedPieces,
+                                  testCase.expectedResponsePieces]
+            printterm("Finished collecting our expected API response values.\n", testOutput)
+            printterm(str(expectResponseList), testOutput)
+        else: # Functional test expected to pass received an 'error' back - go to GetFinalTestResult()
+            pass
+
+    # Call 'GetFinalTestResult:' to determine if we passed or failed.
+    # We have Five possible results from our API Response test:
+    # 1) The API request checker returns empty or with a Process ERROR
+    # 2) functional test PASS - Test that did not expect an error has a correct reponse
+    # 3) functional test FAIL - We recieved an unexpected ERROR code or response incorrect
+    # 4) expected error case PASS - testResult is the expected API error code
+    # 5) expected error case  FAIL - Test did not throw expected error code
+    verifyStart = time.perf_counter()
+    testResult = GetFinalTestResult(responseApi, expectResponseList, isExpectedErrorCase, receivedResponseError, requestBoard,\
+                                    testInfo["messageId"])
+    testInfo["timings"]["verify"] = time.perf_counter() - verifyStart
+    testInfo["testResult"] = testResult
+    if runOracle != None:
+        CheckWithOracle(testInfo, responseApi, testOutput)
+
+    #printterm("Evaluating our testResult for a final test return value.\n")
+    if "Process ERROR" in testResult:
+        printall("Process ERROR: 'GetTestResult' failed to return a valid check value for test %s" % testName, testOutput)
+        printall("GetTestResult Response:", testOutput)
+        printall(testResult, testOutput)
+        printall("Marking as a Test Exit Error and move on to next testcase.\n", testOutput)
+        return testExited
+    # A passing test only gives us a single word
+    if testResult == "functionalTestPASS":
+        printall("All API response params as expected.\n", testOutput)
+        printall("FUNCTIONAL TEST %s PASSED." % testName, testOutput)
+        printall("=============================================================================\n\n", testOutput)
+        return testPassed
+    # A FAILed test give us the result and a string about what failed
+    if "functionalTestFAIL" in testResult:
+        printall("Found unexpected results in the API response!\n", testOutput)
+        printall("FUNCTIONAL TEST %s FAILED." % testName, testOutput)
+        printall("Returned Failure Information:", testOutput)
+        printall(testResult, testOutput)
+        printall("=============================================================================\n\n", testOutput)
+        printall("Moving on to next test...\n", testOutput)
+        return testFailed
+    # A passing test only gives us a single word
+    if testResult == "expectedErrorCasePASS":
+        printall("Expected Error code returned.\n", testOutput)
+        printall("EXPECTED Error TEST %s PASSED.\n" % testName, testOutput)
+        printall("=============================================================================\n\n", testOutput)
+        return testPassed
+    # A FAILed test give us the result and a string about what failed
+    if "expectedErrorCaseFAIL" in testResult:
+        printall("Found unexpected results in the API response!", testOutput)
+        printall("EXPECTED Error TEST %s FAILED.\n" % testName, testOutput)
+        printall("Returned Failure Information:", testOutput)
+        printall(testResult, testOutput)
+        printall("=============================================================================\n\n", testOutput)
+        printall("Moving on to next test...\n", testOutput)
+        return testFailed
+    # Shouldn't get here, but count it so our summary numbers always add up
+    printall("Process ERROR: Unrecognized test result '%s' for test %s" % (testResult, testName), testOutput)
+    return testExited
+# END FinishTest()
+
+# CheckWithOracle: '--oracle' - check a test's response against the rules engine's verdict on its request.
+# A disagreement is reported in its own category and leaves the test's outcome alone.
+def CheckWithOracle(testInfo, responseApi, testOutput=None):
+    oracleStart = time.perf_counter()
+    oracleOutcome, oracleDetails = runOracle.CheckResponse(testInfo["testCase"].requestDict, responseApi)
+    testInfo["timings"]["oracle"] = time.perf_counter() - oracleStart
+    testInfo["oracle"] = oracleOutcome
+    testInfo["oracleResult"] = oracleDetails
+    if oracleOutcome == oracle.oracleDisagreed:
+        printall("ORACLE DISAGREEMENT: The rules engine disagrees with the SFCS response for test %s:" % testInfo["name"], testOutput)
+        printall(oracleDetails + "\n", testOutput)
+    elif oracleOutcome == oracle.oracleAgreed:
+        printreport("The rules engine oracle agrees with the SFCS response.", testOutput)
+    else:
+        printreport("The rules engine oracle did not check this response: %s" % oracleDetails, testOutput)
+# END CheckWithOracle()
+
+# ReportSubmitError: A test whose request never got a usable response (timeout, connection
+# refused after our retries, garbage instead of JSON) is an unexpected exit, not a hang or a crash.
+def ReportSubmitError(testInfo, submitError, testOutput=None):
+    testInfo["testResult"] = repr(submitError)
+    printall("Process ERROR: No valid SFCS API response for test %s: %s" % (testInfo["name"], repr(submitError)), testOutput)
+    printall("Marking as a Test Exit Error and move on to next testcase.\n", testOutput)
+    return testExited
+# END ReportSubmitError()
+
+# EndTest: Stamp a test's final outcome and finish time into its testInfo, and hand it back
+def EndTest(testInfo, outcome):
+    testInfo["outcome"] = outcome
+    testInfo["endTime"] = time.time()
+    return testInfo
+# END EndTest()
+
+# RunTest: Parse, submit and verify a single test definition file.
+# Returns the test's testInfo, with the outcome in testInfo["outcome"].
+def RunTest(fullPathTestFileName, apiTransport=None, testOutput=None):
+    testInfo = PrepareTest(fullPathTestFileName, testOutput)
+    if testInfo["outcome"] != "":
+        return EndTest(testInfo, testInfo["outcome"])
+    # Submit the API Request to the SFCS API call "GetResponseAPI:"
+    responseApi = ""
+    try:
+        responseApi = GetTestResponseAPI(testInfo, apiTransport, testOutput)
+    except (requests.exceptions.RequestException, ValueError) as submitError:
+        return EndTest(testInfo, ReportSubmitError(testInfo, submitError, testOutput))
+    return EndTest(testInfo, FinishTest(testInfo, responseApi, testOutput))
+# END RunTest()
+
+# RunBufferedTest: Serial & '--jobs' worker thread entry point.  Runs one test with all of its
+# output held in a private testOutput list, handed back with the testInfo for the main
+# thread to write out as one block.
+def RunBufferedTest(fullPathTestFileName, apiTransport):
+    testOutput = []
+    testInfo = RunTest(fullPathTestFileName, apiTransport, testOutput)
+    return (testInfo, testOutput)
+# END RunBufferedTest()
+
+# MapBounded: executor.map() for a stream of tests.  Submits Function(*args) for each args from argsSource,
+# keeping no more than maxPending calls ahead of the one we're waiting on, so the first tests run while
+# later ones are still being found.  Yields the results in argsSource order.
+def MapBounded(executor, Function, argsSource, maxPending):
+    pendingCalls = collections.deque()
+    try:
+        for args in argsSource:
+            pendingCalls.append(executor.submit(Function, *args))
+            if len(pendingCalls) >= maxPending:
+                yield pendingCalls.popleft().result()
+        while pendingCalls:
+            yield pendingCalls.popleft().result()
+    finally:
+        for pendingCall in pendingCalls:
+            pendingCall.cancel()
+# END MapBounded()
+
+# GetTestBatches: Generator of ('--batch' list of up to batchSize tests, its first message id) from a
+# stream of tests.  Message ids count up through the run, so every test gets a unique one.
+def GetTestBatches(testSource, batchSize):
+    testIter = iter(testSource)
+    firstMessageId = 1
+    while True:
+        testBatch = list(itertools.islice(testIter, batchSize))
+        if testBatch == []:
+            return
+        yield (testBatch, firstMessageId)
+        firstMessageId += len(testBatch)
+# END GetTestBatches()
+
+# RunTestBatch: '--batch' entry point.  Prepares a list of tests, gives each request a unique
+# message id starting at firstMessageId, posts them all as one JSON-RPC batch and then checks each
+# test against the response with its id.  Returns a list of (testInfo, testOutput), in testPathList order.
+def RunTestBatch(testPathList, firstMessageId, apiTransport):
+    batchTests = [] # (testInfo, testOutput, requestDict) for every test in the batch
+    batchRequests = []
+    batchKeys = {} # Response cache key : message id of the batch request asking for it
+    for batchIndex, fullPathTestFileName in enumerate(testPathList):
+        testOutput = []
+        testInfo = PrepareTest(fullPathTestFileName, testOutput)
+        requestDict = None
+        if testInfo["outcome"] == "":
+            requestDict = AssignMessageId(testInfo, firstMessageId + batchIndex)
+            if requestDict != None and responseCache != None:
+                testInfo["responseKey"] = responsecache.GetRequestKey(requestDict, serverTag)
+            if requestDict != None and testInfo.get("responseKey") != None:
+                testInfo["cachedResponse"] = responseCache.Get(testInfo["responseKey"], testInfo["messageId"])
+                if testInfo["cachedResponse"] == None and testInfo["responseKey"] in batchKeys:
+                    testInfo["sharedMessageId"] = batchKeys[testInfo["responseKey"]] # Same request earlier in this batch
+                elif testInfo["cachedResponse"] == None:
+                    batchKeys[testInfo["responseKey"]] = testInfo["messageId"]
+                    batchRequests.append(requestDict)
+            elif requestDict != None:
+                batchRequests.append(requestDict)
+        batchTests.append((testInfo, testOutput, requestDict))
+    responsesById = None
+    batchError = None # Set if the whole batch post failed - every test in it has exited
+    batchTimings = {}
+    if batchRequests != []:
+        try:
+            responsesById = GetBatchResponseAPI(batchRequests, apiTransport, batchTimings)
+        except (requests.exceptions.RequestException, ValueError) as submitError:
+            batchError = submitError
+        if responsesById == None and batchError == None:
+            printterm("SFCS server did not answer with a JSON-RPC batch - posting these %d requests one at a time."\
+                      % len(batchRequests))
+    batchResults = []
+    for testInfo, testOutput, requestDict in batchTests:
+        if testInfo["outcome"] != "":
+            batchResults.append((EndTest(testInfo, testInfo["outcome"]), testOutput))
+            continue
+        if testInfo.get("cachedResponse") != None:
+            printlog("SFCS API Response for %s is from the response cache - an identical request was already answered."\
+                     % testInfo["name"], testOutput)
+            batchResults.append((EndTest(testInfo, FinishTest(testInfo, testInfo["cachedResponse"], testOutput)), testOutput))
+            continue
+        if requestDict != None and batchError != None:
+            batchResults.append((EndTest(testInfo, ReportSubmitError(testInfo, batchError, testOutput)), testOutput))
+            continue
+        if requestDict == None or responsesById == None: # Post the original request on its own
+            testInfo["messageId"] = apiMessageid
+            try:
+                responseApi = GetTestResponseAPI(testInfo, apiTransport, testOutput)
+            except (requests.exceptions.RequestException, ValueError) as submitError:
+                batchResults.append((EndTest(testInfo, ReportSubmitError(testInfo, submitError, testOutput)), testOutput))
+                continue
+        else:
+            printlog("Submitted in a JSON-RPC batch as message id %d" % testInfo["messageId"], testOutput)
+            # Each test in the batch gets an even share of the batch's serialize, network & decode time
+            for phaseName, seconds in batchTimings.items():
+                testInfo["timings"][phaseName] = seconds / len(batchRequests)
+            if testInfo.get("sharedMessageId") != None: # Answered by the same request earlier in the batch
+                printlog("Sharing the response to identical batch request id %d" % testInfo["sharedMessageId"], testOutput)
+                responseApi = responsesById.get(testInfo["sharedMessageId"], "")
+                if responseApi != "":
+                    responseApi = dict(responseApi, id=testInfo["messageId"])
+            else:
+                responseApi = responsesById.get(testInfo["messageId"], "") # "" if the batch left it out
+                if testInfo.get("responseKey") != None:
+                    responseCache.AddFetched(testInfo["responseKey"], responseApi)
+        batchResults.append((EndTest(testInfo, FinishTest(testInfo, responseApi, testOutput)), testOutput))
+    return batchResults
+# END RunTestBatch()
+
+# RunTestAsync: '--async' coroutine for one test.  The blocking definition file reads run
+# on the event loop's default thread pool, the MakeMove request goes out through the shared
+# AsyncAPIClient, and the (CPU-only) response check runs inline.  Returns (testInfo, testOutput)
+async def RunTestAsync(fullPathTestFileName, apiClient):
+    testOutput = []
+    eventLoop = asyncio.get_running_loop()
+    testInfo = await eventLoop.run_in_executor(None, PrepareTest, fullPathTestFileName, testOutput)
+    if testInfo["outcome"] != "":
+        return (EndTest(testInfo, testInfo["outcome"]), testOutput)
+    timings = testInfo["timings"]
+    async def FetchResponse():
+        serializeStart = time.perf_counter()
+        requestBytes = apiClient.BuildRequest(testInfo["apiRequest"])
+        networkStart = time.perf_counter()
+        responseBody = await apiClient.PostRaw(requestBytes) # Includes any wait for one of the in-flight slots
+        decodeStart = time.perf_counter()
+        responseApi = json.loads(responseBody.decode("utf-8"))
+        timings["serialize"] = networkStart - serializeStart
+        timings["network"] = decodeStart - networkStart
+        timings["decode"] = time.perf_counter() - decodeStart
+        return responseApi
+    requestKey = None
+    if responseCache != None:
+        requestKey = responsecache.GetRequestKey(testInfo["testCase"].requestDict, serverTag)
+    try:
+        if requestKey == None:
+            responseApi = await FetchResponse()
+        else:
+            responseApi, isFromCache = await responseCache.GetOrFetchAsync(requestKey, testInfo["testCase"].requestDict.get("id"),
+                                                                           FetchResponse)
+            if isFromCache:
+                printlog("SFCS API Response for %s is from the response cache - an identical request was already answered."\
+                         % testInfo["name"], testOutput)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as submitError:
+        return (EndTest(testInfo, ReportSubmitError(testInfo, submitError, testOutput)), testOutput)
+    return (EndTest(testInfo, FinishTest(testInfo, responseApi, testOutput)), testOutput)
+# END RunTestAsync()
+
+# RunTestsAsync: The '--async' engine.  Keeps a bounded window of test coroutines going
+# and records each finished test in testList order, just like a serial run.
+async def RunTestsAsync(testList, maxInFlight, testCounts, runOptions):
+    apiClient = asyncclient.AsyncAPIClient(apiurl, apiheaders, maxInFlight, runOptions["connectTimeout"],
+                                           runOptions["readTimeout"], runOptions["retries"])
+    if runOptions["prewarm"]:
+        numConnected = await apiClient.PreConnect(runOptions["poolSize"] or maxInFlight)
+        printterm("Pre-connected %d connections to the SFCS server.\n" % numConnected)
+    pendingTests = collections.deque()
+    windowSize = maxInFlight * 2 # Keep the next batch of file reads going while requests are out
+    try:
+        for fullPathTestFileName in testList:
+            pendingTests.append(asyncio.ensure_future(RunTestAsync(fullPathTestFileName, apiClient)))
+            if len(pendingTests) >= windowSize:
+                testInfo, testOutput = await pendingTests.popleft()
+                RecordTestResult(testInfo, testOutput, testCounts)
+        while pendingTests:
+            testInfo, testOutput = await pendingTests.popleft()
+            RecordTestResult(testInfo, testOutput, testCounts)
+    finally:
+        for pendingTest in pendingTests:
+            pendingTest.cancel()
+        await apiClient.Close()
+# END RunTestsAsync()
+
+# GetLoadRequests: The '--load-rate' request corpus - the API request of every test in testList
+# that parses cleanly, in testList order.  Load mode replays these round & round.
+def GetLoadRequests(testList):
+    loadRequests = []
+    for fullPathTestFileName in testList:
+        if testCache != None:
+            testCase = testCache.GetTestCase(fullPathTestFileName)
+        else:
+            testCase = testcase.ParseTestFile(fullPathTestFileName)
+        if testCase.errors != []:
+            printall("Skipping test file %s in load mode: %s" % (fullPathTestFileName, testCase.errors[0]))
+            continue
+        loadRequests.append(testCase.apiRequest)
+    return loadRequests
+# END GetLoadRequests()
+
+# SendLoadRequest: One open-loop load request, due out at sendTime (event loop clock).
+# Latency is measured from sendTime, not from when we got it out, so any time it spent
+# waiting on us or on a connection counts against the server's latency.
+async def SendLoadRequest(apiClient, apiRequest, sendTime, loadState):
+    eventLoop = asyncio.get_running_loop()
+    sendLag = eventLoop.time() - sendTime
+    loadState["interval"].AddSent(sendLag)
+    loadState["total"].AddSent(sendLag)
+    try:
+        outcome = loadgen.GetResponseOutcome(await apiClient.Post(apiRequest))
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+    except (OSError, asyncio.IncompleteReadError):
+        outcome = "connection-error"
+    except ValueError:
+        outcome = "bad-response"
+    latency = eventLoop.time() - sendTime
+    loadState["interval"].AddDone(latency, outcome)
+    loadState["total"].AddDone(latency, outcome)
+# END SendLoadRequest()
+
+# ReportLoadInterval: Report the interval that ends endOffset seconds into the load run, and start the next one
+def ReportLoadInterval(loadState, endOffset):
+    intervalStats = loadState["interval"]
+    intervalSummary = intervalStats.GetSummary(endOffset - intervalStats.startOffset)
+    intervalSummary["targetRate"] = round(loadgen.GetRateAt(loadState["rates"], loadState["duration"],
+                                                            intervalStats.startOffset), 1)
+    intervalRecord = {"record" : "interval"}
+    intervalRecord.update(intervalSummary)
+    runWriter.Write([("all", loadgen.FormatSummary(intervalSummary))], intervalRecord)
+    loadState["interval"] = loadgen.LoadStats(endOffset)
+# END ReportLoadInterval()
+
+# ReportLoadIntervals: Coroutine that reports every intervalSeconds of the load run until it's cancelled
+async def ReportLoadIntervals(loadState, startTime, intervalSeconds):
+    eventLoop = asyncio.get_running_loop()
+    while True:
+        endOffset = loadState["interval"].startOffset + intervalSeconds
+        await asyncio.sleep(max(0.0, startTime + endOffset - eventLoop.time()))
+        ReportLoadInterval(loadState, endOffset)
+# END ReportLoadIntervals()
+
+# RunLoadAsync: The '--load-rate' engine.  Sends loadRequests round-robin, open-loop, on the
+# schedule the rates call for over durationSeconds, then waits for the stragglers.
+# Returns the whole run's loadgen summary dict.
+async def RunLoadAsync(loadRequests, rates, durationSeconds, intervalSeconds, maxInFlight, runOptions):
+    apiClient = asyncclient.AsyncAPIClient(apiurl, apiheaders, maxInFlight, runOptions["connectTimeout"],
+                                           runOptions["readTimeout"], runOptions["retries"])
+    if runOptions["prewarm"]:
+        numConnected = await apiClient.PreConnect(runOptions["poolSize"] or min(maxInFlight, 64))
+        printterm("Pre-connected %d connections to the SFCS server.\n" % numConnected)
+    eventLoop = asyncio.get_running_loop()
+    loadState = {"interval" : loadgen.LoadStats(), "total" : loadgen.LoadStats(), "rates" : rates,
+                 "duration" : durationSeconds}
+    pendingRequests = set()
+    startTime = eventLoop.time()
+    reporter = asyncio.ensure_future(ReportLoadIntervals(loadState, startTime, intervalSeconds))
+    try:
+        for requestIter, sendOffset in enumerate(loadgen.GetSendTimes(rates, durationSeconds)):
+            sendTime = startTime + sendOffset
+            delay = sendTime - eventLoop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # Fire & forget - never wait on earlier requests before sending the next one
+            pendingRequest = asyncio.ensure_future(SendLoadRequest(apiClient, loadRequests[requestIter % len(loadRequests)],
+                                                                   sendTime, loadState))
+            pendingRequests.add(pendingRequest)
+            pendingRequest.add_done_callback(pendingRequests.discard)
+        if pendingRequests:
+            await asyncio.gather(*pendingRequests)
+    finally:
+        reporter.cancel()
+        for pendingRequest in pendingRequests:
+            pendingRequest.cancel()
+        await apiClient.Close()
+    endOffset = eventLoop.time() - startTime
+    if loadState["interval"].numSent > 0 or loadState["interval"].latencies != []:
+        ReportLoadInterval(loadState, endOffset) # Whatever's left of the last interval, plus the stragglers
+    return loadState["total"].GetSummary(endOffset)
+# END RunLoadAsync()
+
+# RunLoadMode: '--load-rate' in place of a test run.  Reports every interval as it ends, then the
+# whole run, as a trailer & a summary record like a test run's.  Returns our exit code.
+def RunLoadMode(testList, runOptions):
+    loadRequests = GetLoadRequests(testList)
+    if loadRequests == []:
+        printreport("ERROR : None of the test definition files gave us a request to send.  Exiting.")
+        return 1
+    rates = runOptions["loadRates"]
+    durationSeconds = runOptions["loadDuration"]
+    maxInFlight = runOptions["asyncInFlight"] or loadMaxInFlight
+    printall("                **** Beginning SFCS API Load Test ****\n")
+    printall("Replaying %d test requests open-loop at %s requests/second for %.1f seconds, up to %d in flight."\
+             % (len(loadRequests), " -> ".join("%g" % rate for rate in rates), durationSeconds, maxInFlight))
+    printall("Latency is measured from each request's scheduled send time.\n")
+    totalSummary = asyncio.run(RunLoadAsync(loadRequests, rates, durationSeconds, runOptions["loadInterval"],
+                                            maxInFlight, runOptions))
+    if testCache != None:
+        printterm("Test definition cache: %d test files unchanged, %d parsed.\n" % (testCache.numHits, testCache.numParsed))
+        testCache.Close()
+    summaryMessage = "\n\n      **** LOAD TEST COMPLETED! LOAD SUMMARY ****\n%s\n" % loadgen.FormatSummary(totalSummary)
+    if totalSummary["maxSendLag"] > 0.1:
+        summaryMessage += "WARNING: Requests went out up to %.1f ms behind schedule - this machine couldn't keep up the rate.\n"\
+                          % (totalSummary["maxSendLag"] * 1000.0)
+    summaryRecord = {"record" : "summary", "mode" : "load", "date" : todaysDate, "time" : timeStart,
+                     "numRequests" : len(loadRequests), "rates" : rates, "duration" : durationSeconds,
+                     "reportFile" : testRunResultFileName, "logFile" : testAPILogFileName,
+                     "recordFile" : testRecordFileName, "indexFile" : testIndexFileName}
+    summaryRecord.update(totalSummary)
+    runWriter.Write([("all", summaryMessage)], summaryRecord)
+    with open(testSummaryFileName, "w") as summaryFile:
+        json.dump(summaryRecord, summaryFile, indent=2)
+    printterm("Full Results can be found in test report file %s" % testRunResultFileName)
+    printterm("Per-interval JSON records are in %s\n" % testRecordFileName)
+    printall("Exiting Run_SFCS_Tests!")
+    runWriter.Close()
+    return 0
+# END RunLoadMode()
+
+# GetTestRecord: The machine-readable JSONL run record for one finished test
+def GetTestRecord(testInfo):
+    request = testInfo["apiRequest"]
+    try:
+        request = json.loads(request) # Keep the raw string if it's one of our deliberately malformed requests
+    except ValueError:
+        pass
+    testRecord = {"record" : "test", "name" : testInfo["name"], "path" : testInfo["path"],
+                  "outcome" : testInfo["outcome"], "result" : testInfo.get("testResult", ""),
+                  "request" : request, "response" : testInfo.get("response", ""),
+                  "timings" : {"start" : testInfo["startTime"], "end" : testInfo["endTime"],
+                               "seconds" : round(testInfo["endTime"] - testInfo["startTime"], 6),
+                               "phases" : {phaseName : round(seconds, 6) for phaseName, seconds in testInfo["timings"].items()}}}
+    if testInfo.get("oracle") != None:
+        testRecord["oracle"] = {"outcome" : testInfo["oracle"], "details" : testInfo.get("oracleResult", "")}
+    return testRecord
+# END GetTestRecord()
+
+# RecordTestResult: Hand a finished test's output block and run record to the writer, and tally its outcome
+# (and remember it in the run history for '--changed', '--last-failed' & '--failed-first')
+def RecordTestResult(testInfo, testOutput, testCounts):
+    if runHistory != None:
+        runHistory.Record(testInfo["path"], testInfo["outcome"], testInfo["endTime"] - testInfo["startTime"])
+    if testInfo["timings"] != {}:
+        printreport(phasetimes.FormatTimings(testInfo["timings"]), testOutput)
+        runPhaseTimes.AddTimings(testInfo["timings"])
+    if runWriter != None:
+        runWriter.Write(testOutput, GetTestRecord(testInfo))
+    else:
+        FlushTestOutput(testOutput)
+    testCounts[testInfo["outcome"]] += 1
+    if testInfo.get("oracle") != None:
+        oracleCounts[testInfo["oracle"]] += 1
+# END RecordTestResult()
+
+# SelectTests: Pick & order the tests to run from the run history, for '--changed', '--last-failed'
+# and '--failed-first'.  '--changed' with '--last-failed' runs the tests that are either.
+# Returns the new testList.
+def SelectTests(testList, runOptions):
+    if runOptions["changed"] or runOptions["lastFailed"]:
+        selectedTests = []
+        for fullPathTestFileName in testList:
+            if runOptions["lastFailed"] and runHistory.GetLastOutcome(fullPathTestFileName) in (testFailed, testExited):
+                selectedTests.append(fullPathTestFileName)
+            elif runOptions["changed"] and runHistory.IsChanged(fullPathTestFileName):
+                selectedTests.append(fullPathTestFileName)
+        if selectedTests == [] and runOptions["lastFailed"] and not(runOptions["changed"]):
+            printall("No test failed or exited last time it ran - running all %d tests." % len(testList))
+        else:
+            printall("Running the %d of %d tests that are %s." % (len(selectedTests), len(testList),
+                     " or ".join((["new or changed since they last ran"] if runOptions["changed"] else []) +\
+                                 (["failed or exited last time they ran"] if runOptions["lastFailed"] else []))))
+            testList = selectedTests
+    if runOptions["failedFirst"]:
+        failedTests = [fullPathTestFileName for fullPathTestFileName in testList
+                       if runHistory.GetLastOutcome(fullPathTestFileName) in (testFailed, testExited)]
+        otherTests = [fullPathTestFileName for fullPathTestFileName in testList
+                      if runHistory.GetLastOutcome(fullPathTestFileName) not in (testFailed, testExited)]
+        printall("Running the %d tests that failed or exited last time first." % len(failedTests))
+        testList = failedTests + otherTests
+    return testList
+# END SelectTests()
+
+# GetWorkerResult: The parts of a finished test's testInfo a '--worker' sends back to its coordinator
+def GetWorkerResult(testInfo):
+    workerResult = {"name" : testInfo["name"], "outcome" : testInfo["outcome"], "testResult" : testInfo.get("testResult", ""),
+                    "apiRequest" : testInfo["apiRequest"], "response" : testInfo.get("response", ""),
+                    "startTime" : testInfo["startTime"], "endTime" : testInfo["endTime"], "timings" : testInfo["timings"]}
+    if testInfo.get("oracle") != None:
+        workerResult["oracle"] = testInfo["oracle"]
+        workerResult["oracleResult"] = testInfo["oracleResult"]
+    return workerResult
+# END GetWorkerResult()
+
+# RunWorkerMode: '--worker' - run the tests the coordinator hands us, '-j N' at a time, and send each
+# result & its output back to it.  We write no report or log files of our own.
+def RunWorkerMode(runOptions):
+    numJobs = runOptions["jobs"]
+    poolSize = runOptions["poolSize"] or numJobs
+    apiTransport = transport.APITransport(apiurl, apiheaders, poolSize, runOptions["connectTimeout"],
+                                          runOptions["readTimeout"], runOptions["retries"])
+    if runOptions["prewarm"]:
+        apiTransport.PreConnect(poolSize)
+    # The coordinator names tests by their path relative to where it started - find them in our own tree
+    def RunWorkerTest(testName):
+        testInfo, testOutput = RunBufferedTest(utilities.GetFullPath(rootTestDir, testName), apiTransport)
+        return (GetWorkerResult(testInfo), testOutput)
+    workerName = "%s:%d" % (socket.gethostname(), os.getpid())
+    printterm("Worker %s running tests for the coordinator at %s, %d at a time." % (workerName, runOptions["worker"], numJobs))
+    try:
+        numRun = workqueue.RunWorker(runOptions["address"], numJobs, workerName, RunWorkerTest)
+    except (OSError, ValueError) as workerError:
+        printterm("Process ERROR: Lost the coordinator at %s: %s" % (runOptions["worker"], repr(workerError)))
+        return 1
+    finally:
+        apiTransport.Close()
+    printterm("Worker %s ran %d tests. The coordinator has no more - exiting." % (workerName, numRun))
+    return 0
+# END RunWorkerMode()
+
+# SpawnWorkers: Start '--spawn-workers N' local workers for our coordinator, with our server & transport options.
+# Returns their subprocess.Popen's
+def SpawnWorkers(runOptions):
+    workerArgv = [sys.executable, os.path.abspath(__file__), "--worker", runOptions["coordinator"],
+                  "-j", str(runOptions["jobs"]), "--url", apiurl, "--connect-timeout", str(runOptions["connectTimeout"]),
+                  "--read-timeout", str(runOptions["readTimeout"]), "--retries", str(runOptions["retries"])]
+    if runOptions["poolSize"] > 0:
+        workerArgv += ["--pool-size", str(runOptions["poolSize"])]
+    for optionName in ("responseCacheSize", "responseCacheFileName", "serverVersion"):
+        if runOptions[optionName] not in (0, ""):
+            workerArgv += [option for option in runOptionNames if runOptionNames[option] == optionName] + [str(runOptions[optionName])]
+    workerArgv += [option for option in runFlagNames if runFlagNames[option] in ("prewarm", "noCache", "cacheHash", "oracle")
+                   and runOptions[runFlagNames[option]]]
+    # The workers' own screen chatter would only get in the way of ours - everything worth keeping comes back to us
+    return [subprocess.Popen(workerArgv, cwd=rootTestDir, stdout=subprocess.DEVNULL)
+            for workerIter in range(runOptions["spawnWorkers"])]
+# END SpawnWorkers()
+
+# RunCoordinator: '--coordinator' - hand the tests out to workers as they ask for them, and record their
+# results (in testList order, as they come back) just like a local run.  Returns how many workers helped.
+def RunCoordinator(testList, testCounts, runOptions):
+    testNames = [sharding.GetShardKey(fullPathTestFileName, rootTestDir) for fullPathTestFileName in testList]
+    def RecordWorkerResult(testIndex, workerResult, workerOutput):
+        testInfo = {"path" : testList[testIndex], "name" : "", "outcome" : testExited, "testResult" : "",
+                    "apiRequest" : "", "response" : "", "startTime" : 0.0, "endTime" : 0.0, "timings" : {}}
+        testInfo.update(workerResult)
+        RecordTestResult(testInfo, [tuple(line) for line in workerOutput], testCounts)
+    coordinator = workqueue.Coordinator(testNames, RecordWorkerResult, printterm)
+    workerProcesses = SpawnWorkers(runOptions)
+    printterm("Coordinating %d tests - waiting for workers on %s%s.\n" % (len(testNames), runOptions["coordinator"],
+              " (%d local workers starting)" % len(workerProcesses) if workerProcesses != [] else ""))
+    try:
+        asyncio.run(coordinator.Serve(runOptions["address"]))
+    finally:
+        for workerProcess in workerProcesses:
+            try:
+                workerProcess.wait(timeout=runOptions["readTimeout"])
+            except subprocess.TimeoutExpired:
+                workerProcess.kill()
+    return coordinator.numWorkers
+# END RunCoordinator()
+
 # End of function definitions
 
 #*****************************************************************************
 # main() main() main() main() main() main() main() main() main() main() main() 
 #*****************************************************************************
 def main():
+    # Get the optional test list file name or test file name (and number of jobs) from the command line.
+    # (Before anything is written, since a '--worker' writes no files of its own.)
+    runOptions = GetRunOptions(sys.argv)
+    if runOptions == None:
+        return 0
+    option = runOptions["option"]
+    testListFileName = runOptions["testListFileName"]
+    singleTestFileName = runOptions["singleTestFileName"]
+    numJobs = runOptions["jobs"]
+    asyncInFlight = runOptions["asyncInFlight"]
+    batchSize = runOptions["batchSize"]
+    fullPathTestFileName = ""
+    # Point at another SFCS server (e.g. a local MockSFCSServer) if asked to
+    global apiurl
+    if runOptions["apiurl"] != "":
+        apiurl = runOptions["apiurl"]
+    # Answer repeated requests from the response cache, if asked to
+    global responseCache, serverTag
+    if runOptions["responseCacheSize"] > 0 or runOptions["responseCacheFileName"] != "":
+        serverTag = "%s %s" % (apiurl, runOptions["serverVersion"])
+        responseCache = responsecache.ResponseCache(runOptions["responseCacheSize"] or defaultResponseCacheSize,
+                                                    runOptions["responseCacheFileName"] or None)
+        atexit.register(responseCache.Close)
+    # Re-use the test definitions we parsed on earlier runs, for any test file that hasn't changed
+    global testCache
+    if not(runOptions["noCache"]):
+        testCache = testcache.TestCache(testCacheFileName, runOptions["cacheHash"])
+        atexit.register(testCache.Close)
+    # Check every response against the rules engine, if asked to
+    global runOracle
+    if runOptions["oracle"]:
+        runOracle = oracle.Oracle(oracleCacheSize)
+    if runOptions["worker"] != "": # Run tests for a coordinator instead of a run of our own
+        return RunWorkerMode(runOptions)
+
+    # Start our single report & log file writer. Make sure whatever it's holding gets written out
+    # even if something bombs
+    global runWriter
+    runWriter = reportwriter.ReportWriter(testRunResultFileName, testAPILogFileName, testRecordFileName, testIndexFileName,
+                                          runPhaseTimes)
+    atexit.register(runWriter.Close)
     # Print something to the top of all files in case something bombs
     printall("\nExample SolidFire Chess Service API testing scripts & reports.")
     printall("Copyright 2016 - Dan Doran, Boulder, CO\n")
-    # Send this opening blather to just the screen.  We will prepend it to the
-    # top of the report & log files at the very end of the test.
+    # The opening blather goes at the top of every file now.  The summary goes at the end as a
+    # trailer (and in a summary sidecar file), so no file ever has to be rewritten.
     openingMessage = '''\n 
       **** Welcome to the SolidFire Chess Service API Testing System. ****\n
            Test Results will be written to 'Test_Results_<date>_<time>.report'.
-           All API requests and results will be logged to 'Test_API_<date>_<time>.log.'\n'''
-    printterm(openingMessage)
-    
-    # Get the optional test list file name or test file name from the command line.
-    arglen = 0
-    arglen = len(sys.argv)
-    testListFileName = ""
-    singleTestFileName = ""
-    fullPathTestFileName = ""
-    testFileName = ""
-    option = ""
-    if arglen >= 4:
-        printterm("wrong number of args found!")
-        printterm(usagemessage)
-        return 0
-    if arglen == 2: # Help request?
-        option = sys.argv[1]
-        # Look for a command help request & post the usage message if found
-        if "-h" in option or "-H" in option:
-            printterm("Help requested: %s" % option)
-            printterm(usagemessage)
-            return 0
-        else:
-            printterm("Unknown option or no testcase info supplied: %s" % option)
-            printterm(usagemessage)
-            return 0
-
-    if arglen == 3: # Possible list of tests (-l listpath) or single test request (-s testfilepath)
-        option = sys.argv[1]
-        testarg = sys.argv[2]
-        if option == '-l':
-            testListFileName = testarg
-            printterm("Test list file %s chosen.\nWill read and try to tun testcases in that file.\n" % testListFileName)     
-        elif option == '-s':
-            singleTestFileName = testarg
-            printterm("Single test definition file %s chosen.\nWill try to run just that test\n" % singleTestFileName)
-        else:
-            printterm("Unkown option %s supplied." % option)
-            printterm(usagemessage)
-            return 0
+           All API requests and results will be logged to 'Test_API_<date>_<time>.log.'
+           A JSON record of every test will be written to 'Test_Records_<date>_<time>.jsonl'.\n'''
+    printall(openingMessage)
+    printall("The test summary is at the end of this file, and in %s\n" % testSummaryFileName)
 
     # Write in some opening blather to both the test results file and the screen...
     printreport("This is a test facility that exercises the SFCS API 'MakeMove' method with a variety")
     printreport("of tests definition files expected to either PASS (correct params in result) or produce a")
     printreport("specified Error.\n")
     printall("Search for the string 'FAILED' (all upper case) to go directly to any failing test.\n")
+    if runOracle != None:
+        printall("Every SFCS response is also checked against our rules engine.  Search for 'ORACLE DISAGREEMENT'")
+        printall("to go directly to any response it disagrees with.\n")
 
     printall("Date of Test: %s" % todaysDate)
     printall("Time of Test: %s" % timeStart)
     
     # testList building begins...
-    testList = [] # A python list of testcase file names
+    # testList starts out as a generator of testcase file names, read as the tests run, and only
+    # becomes a python list if we have to see every test before running the first one.
+    testList = []
     # See if we have a supplied file containing testcase names
     if option == '-l':
         if testListFileName != "": # Test List File name supplied...
             if os.path.isfile(testListFileName):
-                with open(testListFileName, 'r') as testListFile:
-                    printall("\nReading in test file names to run from %s..." % testListFileName)
-                    for line in testListFile:
-                        line = line.rstrip() # clean up
-                        # expand to full path
-                        fullPathTestFileName = utilities.GetFullPath(rootTestDir, line)
-                        testList.append(fullPathTestFileName)
+                printall("\nReading in test file names to run from %s..." % testListFileName)
+                testList = utilities.IterTestListFile(testListFileName, rootTestDir)
             else:
                 printreport("Unable to find test list file '%s'. Please try again.  Exiting" % testListFileName)
                 return 1
@@ -499,226 +1453,128 @@ def main():
     else:
         # Supply the name of the Test Directories here:
         testDirs = [expPassTestDir, expFailTestDir]
-        testList = utilities.GetDefaultTests(testList, testDirs)
+        if testCache != None:
+            testList = utilities.IterTestFiles(testDirs, testCache.ListTestDir)
+        else:
+            testList = utilities.IterTestFiles(testDirs)
+    # Narrow the tests down to the ones whose indexed metadata matches '--select'
+    global metadataIndex
+    if runOptions["select"] != "":
+        metadataIndex = testindex.TestIndex(metadataIndexFileName, testCache)
+        atexit.register(metadataIndex.Close)
+        printall("\nSelecting the tests where %s." % runOptions["select"])
+        testList = metadataIndex.SelectTests(testList, runOptions["Select"])
+    # Sharding, picking tests from the history, handing them out to workers & load test mode all need the whole list
+    isStreamed = not(runOptions["numShards"] > 0 or runOptions["changed"] or runOptions["lastFailed"] or\
+                     runOptions["failedFirst"] or runOptions["coordinator"] != "" or runOptions["loadRate"] > 0)
+    if not(isStreamed):
+        testList = list(testList)
+    # Remember how every test goes, and narrow down or re-order the run by how they went last time
+    global runHistory
+    if runOptions["loadRate"] == 0.0:
+        runHistory = runhistory.RunHistory(runHistoryFileName)
+        atexit.register(runHistory.Close)
+    # Our share of the tests for '--shard i/n' - before picking from the history, so every machine splits the same list
+    if runOptions["numShards"] > 0:
+        GetSeconds = None
+        if runOptions["shardByDuration"] and runHistory != None:
+            GetSeconds = runHistory.GetLastSeconds
+        numDiscovered = len(testList)
+        testList = sharding.ShardTests(testList, runOptions["shardIndex"], runOptions["numShards"], rootTestDir, GetSeconds)
+        printall("Shard %d of %d: running %d of the %d tests%s." % (runOptions["shardIndex"], runOptions["numShards"],
+                 len(testList), numDiscovered, " (balanced by recorded durations)" if GetSeconds != None else ""))
+    if runHistory != None:
+        testList = SelectTests(testList, runOptions)
+        if testList == [] and (runOptions["changed"] or runOptions["lastFailed"]):
+            printall("Nothing to run.  Exiting Run_SFCS_Tests!")
+            runWriter.Close()
+            return 0
     # Make sure we found some tests...
-    numTests = len(testList)
+    if isStreamed:
+        testList = iter(testList) # (A '-s' test is a one-item list)
+        firstTest = next(testList, None)
+        if firstTest != None:
+            testList = itertools.chain([firstTest], testList)
+        numTests = 0 if firstTest == None else 1 # At least - we count them as they run
+    else:
+        numTests = len(testList)
     if numTests == 0:
         # Print to screen and test report file...
-        printreport("ERROR : No test definition files found in the test dirs or supplied.  Exiting.")
+        if runOptions["select"] != "":
+            printreport("ERROR : No test definition files match '--select %s'.  Exiting." % runOptions["select"])
+        else:
+            printreport("ERROR : No test definition files found in the test dirs or supplied.  Exiting.")
         sys.exit(1)
+    elif isStreamed: # Tests will start as they're found - each one's path is in its own report block
+        printall("\nRunning the test files as they are found...\n")
     else: # Found some tests
-        printall("\nFound %d test files to run:" % numTests)
+        foundTestsOutput = [("all", "\nFound %d test files to run:" % numTests)]
         for testFile in testList:
-            printall("%s" % testFile)
-        printall("\n")
+            foundTestsOutput.append(("all", "%s" % testFile))
+        foundTestsOutput.append(("all", "\n"))
+        FlushTestOutput(foundTestsOutput)
+    if runOptions["loadRate"] > 0: # Load test mode instead of a test run
+        return RunLoadMode(testList, runOptions)
 
     # We've got our populated fileList. 
     # Metrics for Report Summary
-    numPassingTests = 0
-    numFailingTests = 0
-    numTestsExited = 0
+    testCounts = {testPassed : 0, testFailed : 0, testExited : 0}
+    # One connection pool shared by every test (and every worker thread)
+    poolSize = runOptions["poolSize"] or numJobs
+    apiTransport = transport.APITransport(apiurl, apiheaders, poolSize, runOptions["connectTimeout"],
+                                          runOptions["readTimeout"], runOptions["retries"])
+    numWorkers = 0 # Workers that ran tests for us, if we're a '--coordinator'
+    if runOptions["prewarm"] and asyncInFlight == 0 and runOptions["coordinator"] == "":
+        numConnected = apiTransport.PreConnect(poolSize)
+        printterm("Pre-connected %d of %d pooled connections to the SFCS server.\n" % (numConnected, poolSize))
 
     #============================================
     # START TEST(S) HERE.  RUN ONE TEST AT A TIME
+    # (or numJobs at a time on a worker pool)
     #============================================
     printall("                **** Beginning SFCS API Tests ****\n")
 
-    for fullPathTestFileName in testList:
-        # Get the file base name (including extension)
-        testFileName = os.path.basename(fullPathTestFileName)
-        #print("DEBUG: fullPathTestFileName is %s" % fullPathTestFileName)
-        #print("DEBUG: testFileName in %s is %s" % (testListFileName, testFileName))
-        # Get the testName w/o any path or file extensions on fail if we can't find it
-        testName = ""
-        testName = utilities.GetTestName(fullPathTestFileName)
-        if testName == "" or "ERROR" in testName:
-            printterm("DEBUG: Returned testname is %s" % testName)
-            printall("Process ERROR: Unable to find test case name in file %s" % fullPathTestFileName)
-            printall("Moving on to next testcase.\n")
-            numTestsExited += 1
-            continue      
-        
-        printall("======================================================================")
-        printall("****** Starting test case %s ******\n" % testName)
-        # Check the completeness of our test definition file
-        # Switch on the file extension - if '.expfail', only check for the request params needed for an expFail test
-        isExpectedErrorCase = False # Flag to tell us if this is a funtional or expected error case
-        receivedResponseError = False # Flag to tell us if we got one
-        fileext = os.path.splitext(testFileName)[1] # returns 2-element tuple, (basename, .ext)
-        if fileext == expFailExt:
-            testParams = expFailTestParams # Defined Constant Tuples
-            isExpectedErrorCase = True
-        elif fileext == expPassExt:
-            testParams = expPassTestParams   # Defined Constant Tuples
-            isExpectedErrorCase = False
-        else:
-            printall("Process ERROR: Unknown file extension '%s' on TestFileName. Only '%s' and '%s' allowed" % (fileext, expPassExt, expFailExt))
-        # Call "CheckTestFile" to see if or test definition file is complete.
-        #checkMessage =  CheckTestFile(fullPathTestFileName, testParams)
-        #if checkMessage == "" or "GOOD FILE" not in checkMessage:
-        #    printall("Process ERROR - incomplete test case definition file '%s' - Exiting." % fullPathTestFileName)
-        #    printall(checkMessage)
-        #    numTestsExited += 1
-        #    sys.exit(1)
-        #else:
-        #    printall("Test case definition file passed completeness check.\n") 
-
-        # Give us the test name line
-        printall("Test: %s specified in test definition file %s\n" % (testName, testFileName))
-        # Add the Test Description as well
-        testDescription = ""
-        testDescription = utilities.GetFileValue(fullPathTestFileName, "Description")
-        printall("Test Description: %s" % testDescription)
-        printall("***Beginning test run of %s***\n" % testName)
-        # Choose whether to expect an error code based on our isExpectedErrorCase flag
-        if isExpectedErrorCase: # bool
-            printreport("This is an expected Error Case.")
-            # Since this is an expected Error Case, we should have an expected errorCode
-            expectedErrorCode = GetExpectedErrorCode(fullPathTestFileName)
-            # Make sure we got a value back...
-            if expectedErrorCode == 0:
-                printall("Process ERROR - Problems retrieving our expected error code - Exiting")   
-                printall("\n")
-                numTestsExited += 1
-                continue
-            printreport("The Expected API Response Error Code value is: %d" % expectedErrorCode)
-        else: # Functional test, not an expected Error case...
-            printreport("This is a functional test expected to return a full API response.\n")
-        # Run that puppy! Fine the "request : " value in our test files and then
-        # submit it to the SolidFire Chess Service API.  The APU should returns a full JSON-RPC result
-        # if all that goes well, an ERROR otherwise
-        printterm("Get the API Request from the '%s' test definition file...\n" % testName)
-        apiRequest = ""
-        apiRequest = utilities.GetFileValue(fullPathTestFileName, "request")
-        # We should always get an API request back, either good ones or error case ones
-        # We have three possible responses for creating our API request:
-        # 1) apiRequst empty - Fail as a Process ERROR 
-        # 2) apiRequest returns a process ERROR - Fail as a process ERROR
-        # 3) full apiRequest returned - continue with the test
-        if apiRequest == "":
-            printall("Process ERROR: Unexpected empty API request returned for testcase %s" % testName)
-            printall("Marking as a Test Exit Error and move on to next testcase.\n")
-            numTestsExited += 1
-            # Continue on to the next test case...
-            continue
-        if "Process ERROR" in apiRequest:
-            printall("Unexpected 'Process ERROR' returned for test case %s API request:" % testName)
-            printall(apiRequest)
-            # Continue on to the next test case...
-            printall("Continuing on to next test case\n")
-            numTestsExited += 1
-            continue
-        printall("We have an API Request for %s. Submit it to the SFCS API and save to log file.\n" % testName)
-        # Write the API Request to just the log file
-        printlog("API Request for testcase %s:" % testName)
-        printlog(apiRequest)
-
-        # Submit the API Request to the SFCS API call "GetResponseAPI:"
-        responseApi = ""
-        responseApi = GetResponseAPI(apiRequest)
-        # Check for no response or a process ERROR (as opposed to an API Error Code) from our request
-        if responseApi == "":
-            printall("Process ERROR: Test % Failed to return a valid API response or ErrorCode." % testName)
-            printall("SFCS API Response:")
-            printall(responseApi)
-            printall("Marking as a Test Exit Error and move on to next testcase.\n")
-            numTestsExited += 1
-            continue
-
-        # We have a non-empty response from the SFCS API
-        # Write it to the log file, then see if it's what we expect
-        printreport("We have an API Response from the SFCS Server for test %s - Saving to log file.\n" % testName)
-        # See if we got an error in our API response - can happen both for ExFail & functional
-        if responseApi.get('error'):
-            receivedResponseError = True
-            printall("Received an 'error' message in the SFCS API response:\n")
-            printreport(str(responseApi))
-        else:
-            printlog("SFCS API Response:")
-        printlog(str(responseApi))
-        printall("Checking our SFCS API response against the expected response params...")
-        testResult = ""
-        requestBoard = GetRequestBoardState(apiRequest)
-        expectResponseList = [] # List to hold all of our expected response elements
-        # If this is an expected error case, we should already have our expected error code.
-        # We need to pass that into the expectResponseList before we call GetFinalTestResult
-        if isExpectedErrorCase:
-            expectResponseList = [expectedErrorCode] # int: -32000, -32010, -32-2-, -32030
-
-        # If this is *not* an expected error case (aka a functonal test) and we didn't get an API error,
-        # Call "GetExpectedResponseValues:" to populate the expresDict with expected values.
-        if not(isExpectedErrorCase): # Bool
-            if not(receivedResponseError): # We got a full API response, gather our expected values
-                # Gather up what we want to look for in the response from the testCase definition file
-                expectedGameState = GetExpectedGameState(fullPathTestFileName)
-                expectedPlayerState = GetExpectedPlayerState(fullPathTestFileName)
-                expectedPiecesMoved = GetMovedPieces(fullPathTestFileName)
-                expectedResponsePieces = GetExpectedResponsePieces(fullPathTestFileName)
-                # That should cover it.  Put it all into the expectReslonseList
-                expectResponseList = [expectedGameState, expectedPlayerState, expectedPiecesMoved, expectedResponsePieces]
-                #printterm("DEBUG: GetExpectedResponseValues returned expectResponseList %s" % str(expectResponseList))
-                expectResponseListNumItems = utilities.CountItemsInList(expectResponseList)
-                if expectResponseListNumItems != 4:
-                    printall("ERROR - Problems retrieving our expected response params,  Expected 4, got %s - Exiting" % expectResponseListNumItems)   
-                    printall(str(expectResponseList))
-                    numTestsExited += 1
-                    sys.exit(1)
-                printterm("Finished collecting our expected API response values.\n")
-                printterm(str(expectResponseList))
-            else: # Functional test expected to pass received an 'error' back - go to GetFinalTestResult()
-                pass
-
-        # Call 'GetFinalTestResult:' to determine if we passed or failed.
-        # We have Five possible results from our API Response test:
-        # 1) The API request checker returns empty or with a Process ERROR
-        # 2) functional test PASS - Test that did not expect an error has a correct reponse
-        # 3) functional test FAIL - We recieved an unexpected ERROR code or response incorrect
-        # 4) expected error case PASS - testResult is the expected API error code
-        # 5) expected error case  FAIL - Test did not throw expected error code
-        testResult = GetFinalTestResult(responseApi, expectResponseList, isExpectedErrorCase, receivedResponseError, requestBoard)
-
-        #printterm("Evaluating our testResult for a final test return value.\n")
-        if testResult == "Process ERROR" in testResult:
-            printall("Process ERROR: 'GetTestResult' failed to return a valid check value for test %s" % testName)
-            printall("GetTestResult Response:")
-            printall(testResult)
-            printall("Marking as a Test Exit Error and move on to next testcase.\n")
-            numTestsExited += 1
-            continue
-        # A passing test only gives us a single word
-        if testResult == "functionalTestPASS":
-            printall("All API response params as expected.\n")
-            printall("FUNCTIONAL TEST %s PASSED." % testName)
-            printall("=============================================================================\n\n")
-            numPassingTests += 1
-            continue
-        # A FAILed test give us the result and a string about what failed
-        if "functionalTestFAIL" in testResult:
-            printall("Found unexpected results in the API response!\n")
-            printall("FUNCTIONAL TEST %s FAILED." % testName)
-            printall("Returned Failure Information:")
-            printall(testResult)
-            printall("=============================================================================\n\n")
-            printall("Moving on to next test...\n")
-            numFailingTests += 1
-            continue
-        # A passing test only gives us a single word
-        if testResult == "expectedErrorCasePASS":
-            printall("Expected Error code returned.\n")
-            printall("EXPECTED Error TEST %s PASSED.\n" % testName)
-            printall("=============================================================================\n\n")
-            numPassingTests += 1
-            continue
-        # A FAILed test give us the result and a string about what failed
-        if "expectedErrorCaseFAIL" in testResult:
-            printall("Found unexpected results in the API response!")
-            printall("EXPECTED Error TEST %s FAILED.\n" % testName)
-            printall("Returned Failure Information:")
-            printall(testResult)
-            printall("=============================================================================\n\n")
-            printall("Moving on to next test...\n")
-            numFailingTests += 1
-            continue
+    if runOptions["coordinator"] != "":
+        numWorkers = RunCoordinator(testList, testCounts, runOptions)
+    elif batchSize > 0:
+        printterm("Posting tests in JSON-RPC batches of %d requests.\n" % batchSize)
+        batchArgs = ((testBatch, firstMessageId, apiTransport) for testBatch, firstMessageId in GetTestBatches(testList, batchSize))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=numJobs) as executor:
+            for batchResults in MapBounded(executor, RunTestBatch, batchArgs, numJobs * 2):
+                for testInfo, testOutput in batchResults:
+                    RecordTestResult(testInfo, testOutput, testCounts)
+    elif asyncInFlight > 0:
+        printterm("Running tests on the asyncio engine with up to %d requests in flight.\n" % asyncInFlight)
+        asyncio.run(RunTestsAsync(testList, asyncInFlight, testCounts, runOptions))
+    elif numJobs == 1:
+        for fullPathTestFileName in testList:
+            testInfo, testOutput = RunBufferedTest(fullPathTestFileName, apiTransport)
+            RecordTestResult(testInfo, testOutput, testCounts)
+    else:
+        printterm("Running tests on %d worker threads.\n" % numJobs)
+        # Results come back in testList order, so the report reads just like a serial run
+        with concurrent.futures.ThreadPoolExecutor(max_workers=numJobs) as executor:
+            testArgs = ((fullPathTestFileName, apiTransport) for fullPathTestFileName in testList)
+            for testInfo, testOutput in MapBounded(executor, RunBufferedTest, testArgs, numJobs * 4):
+                RecordTestResult(testInfo, testOutput, testCounts)
+    apiTransport.Close()
+    numTests = sum(testCounts.values()) # Every test we ran, now that a streamed run has found them all
+    if testCache != None:
+        printterm("Test definition cache: %d test files unchanged, %d parsed.\n" % (testCache.numHits, testCache.numParsed))
+        testCache.Close()
+    if metadataIndex != None:
+        printterm("Test index: %d test files unchanged, %d indexed.\n" % (metadataIndex.numUnchanged, metadataIndex.numIndexed))
+        metadataIndex.Close()
+    if responseCache != None:
+        printall("Response cache: %d requests sent to the SFCS server, %d answered from memory, %d from the cache file.\n"\
+                 % (responseCache.numFetched, responseCache.numMemoryHits, responseCache.numDiskHits))
+        responseCache.Close()
+    if runOracle != None and runOptions["coordinator"] == "": # Otherwise the workers did the checking
+        printterm("Rules engine oracle: %d requests worked out, %d verdicts remembered.\n" % (runOracle.numComputed, runOracle.numRemembered))
+    runHistory.Close()
+    numPassingTests = testCounts[testPassed]
+    numFailingTests = testCounts[testFailed]
+    numTestsExited = testCounts[testExited]
         
     # Create a test summary for the screen, report & log files
     # Get our pass & fail percentages
@@ -733,19 +1589,44 @@ def main():
     % (numTests, numPassingTests, numTests, percentPass,\
        numFailingTests, numTests, percentFail,\
        numTestsExited, numTests, percentExited))
-    printterm(summaryMessage) # For the benefit of interactive users
+    if runOptions["shard"] != "":
+        summaryMessage += "           (Shard %s of the tests - combine the shards' results with MergeReports.py)\n" % runOptions["shard"]
+    numOracleChecked = oracleCounts[oracle.oracleAgreed] + oracleCounts[oracle.oracleDisagreed]
+    if runOptions["oracle"] or sum(oracleCounts.values()) > 0:
+        summaryMessage += "\n           %d of %d Responses checked by the rules engine oracle DISAGREED - %s\n\
+           (%d responses not checked - their requests aren't well-formed MakeMove calls)\n"\
+                          % (oracleCounts[oracle.oracleDisagreed], numOracleChecked,
+                             GetPercent(oracleCounts[oracle.oracleDisagreed], numOracleChecked) if numOracleChecked > 0 else "n/a",
+                             oracleCounts[oracle.oracleUnchecked])
+    if runOptions["coordinator"] != "":
+        summaryMessage += "           (Run by %d worker(s) for the coordinator on %s)\n" % (numWorkers, runOptions["coordinator"])
+    # Where the time went - wait for the writer to finish the last tests first so their write times are in
+    runWriter.Drain()
+    summaryMessage += "\n" + "\n".join(runPhaseTimes.FormatReport()) + "\n"
 
-    # *Finally, Now that everything else has been written to the output files, 
-    # insert the opening message & summary at the top of the report & APAI log files
-    fullMessage = openingMessage + summaryMessage
-    utilities.PrependFile(testRunResultFileName, fullMessage)
-    utilities.PrependFile(testAPILogFileName, fullMessage)
+    # Finish the report & log files with the summary as a trailer, and the JSONL run
+    # record with a summary record.
+    summaryRecord = {"record" : "summary", "date" : todaysDate, "time" : timeStart, "numTests" : numTests,
+                     "passed" : numPassingTests, "failed" : numFailingTests, "exited" : numTestsExited,
+                     "reportFile" : testRunResultFileName, "logFile" : testAPILogFileName,
+                     "recordFile" : testRecordFileName, "indexFile" : testIndexFileName,
+                     "phases" : runPhaseTimes.GetSummary(), "shard" : runOptions["shard"], "workers" : numWorkers}
+    if runOptions["oracle"] or sum(oracleCounts.values()) > 0:
+        summaryRecord["oracle"] = dict(oracleCounts)
+    runWriter.Write([("all", summaryMessage)], summaryRecord)
+    with open(testSummaryFileName, "w") as summaryFile:
+        json.dump(summaryRecord, summaryFile, indent=2)
+    if runOptions["metricsFileName"] != "":
+        runPhaseTimes.WriteOpenMetrics(runOptions["metricsFileName"], testCounts)
+        printterm("Phase time histograms written to OpenMetrics file %s" % runOptions["metricsFileName"])
 
     # Looks like our work is done here....
     printall("Thank You for using our amazing API testing facility!!!\n")
     printterm("Full Results can be found in test report file %s" % testRunResultFileName)
-    printterm("and API log file %s\n" % testAPILogFileName)
+    printterm("and API log file %s" % testAPILogFileName)
+    printterm("Per-test JSON records are in %s (index %s)\n" % (testRecordFileName, testIndexFileName))
     printall("Exiting Run_SFCS_Tests!")
+    runWriter.Close()
     return 0
 
 # This is the standard boilerplate that calls the main() function.
@@ -0,0 +1,153 @@
+'''
+      'asyncclient' module - a small asyncio HTTP/1.1 client for posting JSON-RPC
+      requests to the SFCS API without a thread per request.
+      Used by the Run_SFCI_Tests '--async' mode.  Needs python 3.7 or better.
+
+      Only what the SFCS 'MakeMove' method needs is supported: POST with a JSON
+      body over plain or TLS connections, keep-alive connection re-use, and
+      Content-Length, chunked or read-to-close response bodies.  Connect & read
+      timeouts and connection retries behave like transport.APITransport.
+'''
+# Modules we'll need...
+import asyncio
+import json
+import ssl
+import urllib.parse
+
+# Seconds to wait before the first retry of a failed connection.  Doubles for each retry after that.
+retryBackoff = 0.5
+
+# AsyncAPIClient: Posts JSON-RPC requests to one API url.  A semaphore caps how many
+# requests are in flight at once; idle keep-alive connections are parked for re-use.
+class AsyncAPIClient:
+    def __init__(self, apiurl, apiheaders, maxInFlight, connectTimeout=5.0, readTimeout=30.0, maxRetries=2):
+        urlParts = urllib.parse.urlsplit(apiurl)
+        self.host = urlParts.hostname
+        self.useTLS = (urlParts.scheme == "https")
+        self.port = urlParts.port
+        if self.port == None:
+            self.port = 443 if self.useTLS else 80
+        self.path = urlParts.path or "/"
+        if urlParts.query:
+            self.path += "?" + urlParts.query
+        self.apiheaders = apiheaders
+        self.maxInFlight = maxInFlight
+        self.connectTimeout = connectTimeout
+        self.readTimeout = readTimeout
+        self.maxRetries = maxRetries
+        self.semaphore = asyncio.Semaphore(maxInFlight)
+        self.idleConnections = [] # (reader, writer) tuples ready for re-use
+
+    # Hand back an idle keep-alive connection, or open a new one.
+    # Returns (reader, writer, isReused)
+    async def GetConnection(self):
+        while self.idleConnections:
+            reader, writer = self.idleConnections.pop()
+            if not(writer.is_closing()) and not(reader.at_eof()):
+                return (reader, writer, True)
+            writer.close()
+        reader, writer = await self.OpenConnection()
+        return (reader, writer, False)
+
+    # Open a new connection, retrying connection errors (and connect timeouts) with backoff
+    async def OpenConnection(self):
+        sslContext = ssl.create_default_context() if self.useTLS else None
+        attempt = 0
+        while True:
+            try:
+                return await asyncio.wait_for(asyncio.open_connection(self.host, self.port, ssl=sslContext),
+                                              self.connectTimeout)
+            except (OSError, asyncio.TimeoutError):
+                if attempt >= self.maxRetries:
+                    raise
+                await asyncio.sleep(retryBackoff * (2 ** attempt))
+                attempt += 1
+
+    # Open numConnections connections ahead of the first test and park them for re-use.
+    # Returns how many we managed to open.
+    async def PreConnect(self, numConnections):
+        numConnected = 0
+        for connIter in range(min(numConnections, self.maxInFlight)):
+            try:
+                self.idleConnections.append(await self.OpenConnection())
+                numConnected += 1
+            except (OSError, asyncio.TimeoutError):
+                break
+        return numConnected
+
+    # Build the raw bytes of an HTTP/1.1 POST for our request body string
+    def BuildRequest(self, data):
+        body = data.encode("utf-8")
+        headerLines = ["POST %s HTTP/1.1" % self.path,
+                       "Host: %s:%d" % (self.host, self.port),
+                       "Content-Length: %d" % len(body),
+                       "Connection: keep-alive"]
+        for key, value in self.apiheaders.items():
+            headerLines.append("%s: %s" % (key, value))
+        return ("\r\n".join(headerLines) + "\r\n\r\n").encode("latin-1") + body
+
+    # Read one HTTP response off the connection.  Returns (statusCode, headers, body)
+    async def ReadResponse(self, reader):
+        statusLine = await reader.readline()
+        if statusLine == b"":
+            raise ConnectionResetError("SFCS server closed the connection without a response")
+        statusCode = int(statusLine.split(None, 2)[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, value = line.decode("latin-1").split(":", 1)
+            headers[key.strip().lower()] = value.strip()
+        if "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                chunkSize = int((await reader.readline()).split(b";", 1)[0], 16)
+                if chunkSize == 0:
+                    await reader.readline() # Trailing blank line
+                    break
+                chunks.append(await reader.readexactly(chunkSize))
+                await reader.readline() # CRLF after each chunk
+            body = b"".join(chunks)
+        else: # No length given - the body runs until the server closes the connection
+            body = await reader.read()
+            headers["connection"] = "close"
+        return (statusCode, headers, body)
+
+    # Post one JSON-RPC request string and return the decoded JSON response.
+    async def Post(self, data):
+        return json.loads((await self.PostRaw(self.BuildRequest(data))).decode("utf-8"))
+
+    # Post the raw bytes of a request built by BuildRequest() and return the raw response body.
+    # A keep-alive connection the server has quietly dropped is retried once on a fresh one.
+    # A read timeout raises asyncio.TimeoutError back to the caller.
+    async def PostRaw(self, requestBytes):
+        async with self.semaphore:
+            while True:
+                reader, writer, isReused = await self.GetConnection()
+                try:
+                    writer.write(requestBytes)
+                    await writer.drain()
+                    statusCode, headers, body = await asyncio.wait_for(self.ReadResponse(reader), self.readTimeout)
+                except asyncio.TimeoutError:
+                    writer.close()
+                    raise
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if isReused:
+                        continue # Stale connection - try again on a new one
+                    raise
+                if headers.get("connection", "").lower() == "close":
+                    writer.close()
+                else:
+                    self.idleConnections.append((reader, writer))
+                return body
+
+    # Close every parked connection at the end of the run
+    async def Close(self):
+        while self.idleConnections:
+            reader, writer = self.idleConnections.pop()
+            writer.close()
+# END class AsyncAPIClient
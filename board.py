@@ -0,0 +1,142 @@
+'''
+      'board' module - a compact 64-square chess board shared by RequestGen, utilities
+      and Run_SFCI_Tests.
+      A Board keeps one byte per square in a 64-byte bytearray (a1=0, h1=7, a8=56, h8=63),
+      so looking up, placing or removing a piece is a single index instead of a scan of
+      a list of {"type", "loc"} piece dicts.  Per-piece-type bitboards are worked out
+      on request for code that wants to test many squares at once.
+
+      The SFCS API (and our test files & Test_Boards repository) hand boards around as
+      boardState lists of {"type": "R", "loc": "a1"} pieces.  BoardFromState() and
+      Board.ToState() convert between the two.  Expected error tests need boards that
+      break the rules of chess *and* of the format - two pieces on one square, locs off the
+      board, unknown piece types - so any piece that can't go on a square is kept as is
+      in the Board's extraPieces list and handed back by ToState().
+'''
+# Byte value stored on a square for each piece type.  0 is an empty square.
+pieceTypes = "PRNBQKprnbqk"
+pieceCodes = {pieceType : pieceCode for pieceCode, pieceType in enumerate(pieceTypes, 1)}
+boardColumns = "abcdefgh"
+boardRows = "12345678"
+
+squareIndexes = {column + row : rankIndex * 8 + fileIndex
+                 for rankIndex, row in enumerate(boardRows) for fileIndex, column in enumerate(boardColumns)}
+
+# Square index (0-63, a1=0, h1=7, a8=56) of a board loc like 'e4', or -1 if it isn't a real square
+def GetSquareIndex(loc):
+    if not(isinstance(loc, str)):
+        return -1
+    return squareIndexes.get(loc, -1)
+
+# Board loc ('e4') of a square index
+def GetSquareLoc(square):
+    return boardColumns[square % 8] + boardRows[square // 8]
+
+class Board:
+    __slots__ = ("squares", "extraPieces", "bitboards")
+
+    def __init__(self, squares=None):
+        self.squares = bytearray(64) if squares == None else bytearray(squares)
+        self.extraPieces = [] # Piece dicts that can't go on a square of their own (invalid boards only)
+        self.bitboards = None # {pieceType : 64-bit int}, built by GetBitboards() and dropped on any change
+
+    # Piece type on a square index, or None if it's empty
+    def GetPiece(self, square):
+        pieceCode = self.squares[square]
+        if pieceCode == 0:
+            return None
+        return pieceTypes[pieceCode - 1]
+
+    # Piece object ({"type", "loc"}) on a board loc like 'e4', or None if it's empty (or not a square)
+    def GetPieceObj(self, loc):
+        square = GetSquareIndex(loc)
+        if square < 0 or self.squares[square] == 0:
+            return None
+        return {"type" : pieceTypes[self.squares[square] - 1], "loc" : loc}
+
+    def SetPiece(self, square, pieceType):
+        self.squares[square] = pieceCodes[pieceType]
+        self.bitboards = None
+
+    def RemovePiece(self, square):
+        self.squares[square] = 0
+        self.bitboards = None
+
+    # Put a piece object on the board.  Returns "" if it went on its square, otherwise why it
+    # didn't (it's then kept in extraPieces, so the board still says exactly what it was given)
+    def AddPieceObj(self, piece):
+        square = GetSquareIndex(piece.get("loc")) if isinstance(piece, dict) else -1
+        if not(isinstance(piece, dict)):
+            problem = "%s is not a piece object" % repr(piece)
+        elif piece.get("type") not in pieceCodes:
+            problem = "piece %s is not a known piece type" % repr(piece)
+        elif square < 0:
+            problem = "piece %s is not on a valid square" % repr(piece)
+        elif self.squares[square] != 0:
+            problem = "two pieces on square %s" % piece.get("loc")
+        else:
+            self.squares[square] = pieceCodes[piece["type"]]
+            self.bitboards = None
+            return ""
+        self.extraPieces.append(piece)
+        self.bitboards = None
+        return problem
+
+    # Take a piece object off the board.  Returns True if it was there.
+    def RemovePieceObj(self, piece):
+        if piece in self.extraPieces:
+            self.extraPieces.remove(piece)
+            return True
+        square = GetSquareIndex(piece.get("loc"))
+        if square < 0 or self.GetPiece(square) != piece.get("type"):
+            return False
+        self.RemovePiece(square)
+        return True
+
+    # (square, pieceType) for every piece on a square, a1 first
+    def GetPieces(self):
+        return [(square, pieceTypes[pieceCode - 1]) for square, pieceCode in enumerate(self.squares) if pieceCode != 0]
+
+    def NumPieces(self):
+        return 64 - self.squares.count(0) + len(self.extraPieces)
+
+    def Copy(self):
+        boardCopy = Board(self.squares)
+        boardCopy.extraPieces = list(self.extraPieces)
+        return boardCopy
+
+    # One 64-bit int per piece type with bit n set if that piece is on square n
+    def GetBitboards(self):
+        if self.bitboards == None:
+            self.bitboards = {pieceType : 0 for pieceType in pieceTypes}
+            for square, pieceCode in enumerate(self.squares):
+                if pieceCode != 0:
+                    self.bitboards[pieceTypes[pieceCode - 1]] |= (1 << square)
+        return self.bitboards
+
+    # The API's boardState form: a list of {"type", "loc"} piece objects, ready for json.dumps()
+    def ToState(self):
+        boardState = [{"type" : pieceType, "loc" : GetSquareLoc(square)} for square, pieceType in self.GetPieces()]
+        return boardState + self.extraPieces
+# END class Board
+
+# BoardFromState: Build a Board from an API boardState list in one pass.
+# Returns (board, errorString) - errorString is "" for a well-formed board, otherwise it
+# says what's wrong with the first piece that couldn't go on a square of its own.
+def BoardFromState(boardState):
+    board = Board()
+    if not(isinstance(boardState, list)):
+        return (board, "boardState is not a list of pieces")
+    errorString = ""
+    for piece in boardState:
+        problem = board.AddPieceObj(piece)
+        if problem != "" and errorString == "":
+            errorString = problem
+    return (board, errorString)
+# END BoardFromState()
+
+# The standard starting position - white to move
+startBoardState = [{"type" : pieceType, "loc" : column + row}
+                   for pieceTypes, row in (("RNBQKBNR", "1"), ("PPPPPPPP", "2"), ("pppppppp", "7"), ("rnbqkbnr", "8"))
+                   for pieceType, column in zip(pieceTypes, boardColumns)]
+startBoard = BoardFromState(startBoardState)[0]
@@ -0,0 +1,430 @@
+'''
+      'chessengine' module - a small chess rules engine on bitboards, so RequestGen can work out
+      what a test should expect and Run_SFCI_Tests can check SFCS answers against it.
+
+      MakeMove() takes a MakeMove request's boardState, move & playerState and says what SFCS
+      should answer: the board after the move, the gameState it leaves the other player in
+      ("", check, checkmate or stalemate) and their playerState - or the error the request
+      should get instead.  Like SFCS, we call a dead draw (the kings alone, or with a single
+      bishop or knight between them) a stalemate too.  The errors are:
+          -32000 board   the boardState isn't a chess position: a malformed piece, two pieces on
+                         a square, not exactly one king a side, more than 8 pawns or 16 pieces a
+                         side, a pawn on the first or last row, or the player who isn't moving
+                         is in check
+          -32010 player  playerState isn't 'w' or 'b'
+          -32020 move    the move can't be read, no piece of the player's can make it, more than
+                         one can, it leaves the player's own king in check, or it's black's move
+                         on the starting board
+
+      Moves are in our test notation (see RequestGen.GetMove()): piece letters upper case for
+      both colors, an optional start column and/or row ('Rfxf3', 'Kee2', 'Nf3'), 'x' for a
+      capture, '=Q' for a promotion ('g8=Q', 'fxg8=Q' or 'g8x=Q'), '(ep)' for en passant, and
+      '0-0' / '0-0-0' for castling.  A trailing '+' or '#' is just a comment - the gameState
+      comes from the board, not the move.  A request carries no history, so castling is allowed
+      whenever the king and rook are on their starting squares, and en passant whenever the
+      pawn being taken could just have moved two squares (both squares behind it are empty).
+
+      A position is a list of 12 64-bit ints, one per piece type in board.pieceTypes order, with
+      bit n set for a piece on square n (a1=0, h8=63).  Knight & king moves are table lookups,
+      and sliding pieces stop at the first blocker along each ray.
+'''
+# Modules we'll need...
+import re
+import functools
+import board # Local Module
+
+boardErrorCode = -32000
+playerErrorCode = -32010
+moveErrorCode = -32020
+playerColors = ("w", "b") # Color index 0 is white, 1 black
+
+# Piece indexes within one color's six bitboards - board.pieceTypes is "PRNBQKprnbqk"
+pawnIndex, rookIndex, knightIndex, bishopIndex, queenIndex, kingIndex = range(6)
+pieceLetterIndexes = {"P" : pawnIndex, "R" : rookIndex, "N" : knightIndex, "B" : bishopIndex,
+                      "Q" : queenIndex, "K" : kingIndex}
+pieceNames = ("pawn", "rook", "knight", "bishop", "queen", "king")
+promotionIndexes = (queenIndex, rookIndex, bishopIndex, knightIndex)
+
+# Move kinds.  A move is a tuple (fromSquare, toSquare, piece, promotion, kind) - piece &
+# promotion are indexes into the position (promotion is -1 if there isn't one)
+normalMove, enPassantMove, castlingMove = range(3)
+
+moveRegex = re.compile(r"(?P<piece>[KQRBNP])?(?P<fromColumn>[a-h])?(?P<fromRow>[1-8])?(?P<capture>x)?"
+                       r"(?P<to>[a-h][1-8])(?P<promotionCapture>x)?(?:=(?P<promotion>[QRBNqrbn]))?"
+                       r"(?P<enPassant>\(ep\))?[+#]?")
+castlingRegex = re.compile(r"[0O]-[0O](?P<queenside>-[0O])?[+#]?")
+
+# Attack tables - built once at import
+def GetStepAttacks(steps):
+    attacks = []
+    for square in range(64):
+        column, row = square % 8, square // 8
+        bits = 0
+        for columnStep, rowStep in steps:
+            if 0 <= column + columnStep < 8 and 0 <= row + rowStep < 8:
+                bits |= 1 << ((row + rowStep) * 8 + column + columnStep)
+        attacks.append(bits)
+    return attacks
+
+# Every square from each square to the edge of the board in one direction
+def GetRays(columnStep, rowStep):
+    rays = []
+    for square in range(64):
+        column, row = square % 8 + columnStep, square // 8 + rowStep
+        bits = 0
+        while 0 <= column < 8 and 0 <= row < 8:
+            bits |= 1 << (row * 8 + column)
+            column += columnStep
+            row += rowStep
+        rays.append(bits)
+    return rays
+
+knightAttacks = GetStepAttacks(((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)))
+kingAttacks = GetStepAttacks(((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)))
+pawnAttacks = (GetStepAttacks(((-1, 1), (1, 1))), GetStepAttacks(((-1, -1), (1, -1)))) # White's, black's
+# Rays that run up the square numbers meet their first blocker at its lowest bit, rays running down at its highest
+rookRaysUp = (GetRays(0, 1), GetRays(1, 0))
+rookRaysDown = (GetRays(0, -1), GetRays(-1, 0))
+bishopRaysUp = (GetRays(1, 1), GetRays(-1, 1))
+bishopRaysDown = (GetRays(1, -1), GetRays(-1, -1))
+backRows = 0xFF | (0xFF << 56)
+
+# The squares of the set bits, lowest first
+def IterSquares(bits):
+    while bits:
+        lowBit = bits & -bits
+        yield lowBit.bit_length() - 1
+        bits ^= lowBit
+
+def GetSlidingAttacks(square, occupied, raysUp, raysDown):
+    attacks = 0
+    for rays in raysUp:
+        ray = rays[square]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+    for rays in raysDown:
+        ray = rays[square]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+# Squares a rook, knight, bishop, queen or king (index within its color) on square attacks
+def GetPieceAttacks(pieceIndex, square, occupied):
+    if pieceIndex == knightIndex:
+        return knightAttacks[square]
+    if pieceIndex == kingIndex:
+        return kingAttacks[square]
+    attacks = 0
+    if pieceIndex != bishopIndex:
+        attacks |= GetSlidingAttacks(square, occupied, rookRaysUp, rookRaysDown)
+    if pieceIndex != rookIndex:
+        attacks |= GetSlidingAttacks(square, occupied, bishopRaysUp, bishopRaysDown)
+    return attacks
+
+def GetPosition(testBoard):
+    bitboards = testBoard.GetBitboards()
+    return [bitboards[pieceType] for pieceType in board.pieceTypes]
+
+def GetColorPieces(position, color):
+    side = color * 6
+    return position[side] | position[side + 1] | position[side + 2] | position[side + 3] | position[side + 4] | position[side + 5]
+
+def GetKingSquare(position, color):
+    return position[color * 6 + kingIndex].bit_length() - 1
+
+# Is square attacked by any of byColor's pieces?
+def IsSquareAttacked(position, square, byColor, occupied):
+    side = byColor * 6
+    if knightAttacks[square] & position[side + knightIndex] or kingAttacks[square] & position[side + kingIndex]:
+        return True
+    if pawnAttacks[1 - byColor][square] & position[side + pawnIndex]: # The squares a byColor pawn would take it from
+        return True
+    straightPieces = position[side + rookIndex] | position[side + queenIndex]
+    if straightPieces and GetSlidingAttacks(square, occupied, rookRaysUp, rookRaysDown) & straightPieces:
+        return True
+    diagonalPieces = position[side + bishopIndex] | position[side + queenIndex]
+    return bool(diagonalPieces and GetSlidingAttacks(square, occupied, bishopRaysUp, bishopRaysDown) & diagonalPieces)
+
+def IsInCheck(position, color):
+    occupied = GetColorPieces(position, 0) | GetColorPieces(position, 1)
+    return IsSquareAttacked(position, GetKingSquare(position, color), 1 - color, occupied)
+
+# The position after a move - the position passed in isn't changed
+def ApplyMove(position, move):
+    fromSquare, toSquare, piece, promotion, kind = move
+    newPosition = list(position)
+    toBit = 1 << toSquare
+    if kind == enPassantMove: # The pawn taken is beside us, not on toSquare
+        capturedBit = 1 << (toSquare - 8 if piece < 6 else toSquare + 8)
+    else:
+        capturedBit = toBit
+    enemySide = 6 if piece < 6 else 0
+    for enemyPiece in range(enemySide, enemySide + 6):
+        if newPosition[enemyPiece] & capturedBit:
+            newPosition[enemyPiece] ^= capturedBit
+            break
+    newPosition[piece] ^= 1 << fromSquare
+    newPosition[promotion if promotion >= 0 else piece] |= toBit
+    if kind == castlingMove:
+        rookPiece = piece - kingIndex + rookIndex
+        if toSquare > fromSquare: # Kingside - h rook to the f column
+            newPosition[rookPiece] ^= (1 << (fromSquare + 3)) | (1 << (fromSquare + 1))
+        else: # Queenside - a rook to the d column
+            newPosition[rookPiece] ^= (1 << (fromSquare - 4)) | (1 << (fromSquare - 1))
+    return newPosition
+
+# The same move on a board.Board - returns a new Board
+def ApplyMoveToBoard(testBoard, move):
+    fromSquare, toSquare, piece, promotion, kind = move
+    resultBoard = testBoard.Copy()
+    if kind == enPassantMove:
+        resultBoard.RemovePiece(toSquare - 8 if piece < 6 else toSquare + 8)
+    elif kind == castlingMove:
+        rookFrom, rookTo = (fromSquare + 3, fromSquare + 1) if toSquare > fromSquare else (fromSquare - 4, fromSquare - 1)
+        resultBoard.RemovePiece(rookFrom)
+        resultBoard.SetPiece(rookTo, board.pieceTypes[piece - kingIndex + rookIndex])
+    resultBoard.RemovePiece(fromSquare)
+    resultBoard.SetPiece(toSquare, board.pieceTypes[promotion if promotion >= 0 else piece])
+    return resultBoard
+
+# A castling move for color, or None and why not.  castlingSide is 'k' or 'q'.
+def GetCastlingMove(position, color, castlingSide, occupied):
+    side = color * 6
+    homeRow = 0 if color == 0 else 56
+    kingSquare = homeRow + 4
+    rookSquare = homeRow + 7 if castlingSide == "k" else homeRow
+    if not(position[side + kingIndex] >> kingSquare & 1):
+        return (None, "the king isn't on %s to castle" % board.GetSquareLoc(kingSquare))
+    if not(position[side + rookIndex] >> rookSquare & 1):
+        return (None, "there's no rook on %s to castle with" % board.GetSquareLoc(rookSquare))
+    betweenSquares = (5, 6) if castlingSide == "k" else (1, 2, 3)
+    if any(occupied >> (homeRow + square) & 1 for square in betweenSquares):
+        return (None, "there are pieces between the king and the rook")
+    kingSquares = (4, 5, 6) if castlingSide == "k" else (4, 3, 2) # Can't castle out of, through or into check
+    if any(IsSquareAttacked(position, homeRow + square, 1 - color, occupied) for square in kingSquares):
+        return (None, "the king can't castle out of, through or into check")
+    return ((kingSquare, homeRow + (6 if castlingSide == "k" else 2), side + kingIndex, -1, castlingMove), "")
+
+# Every move color's pieces could make, before checking whether it leaves their own king in check
+def GetPseudoMoves(position, color):
+    side = color * 6
+    ownPieces = GetColorPieces(position, color)
+    enemyPieces = GetColorPieces(position, 1 - color)
+    occupied = ownPieces | enemyPieces
+    forward = 8 if color == 0 else -8
+    startRow, enPassantRow, lastRow = (1, 4, 7) if color == 0 else (6, 3, 0)
+    enemyPawns = position[(1 - color) * 6 + pawnIndex]
+    for fromSquare in IterSquares(position[side + pawnIndex]):
+        targets = pawnAttacks[color][fromSquare] & enemyPieces
+        toSquare = fromSquare + forward
+        if not(occupied >> toSquare & 1):
+            targets |= 1 << toSquare
+            if fromSquare // 8 == startRow and not(occupied >> (toSquare + forward) & 1):
+                targets |= 1 << (toSquare + forward)
+        for toSquare in IterSquares(targets):
+            if toSquare // 8 == lastRow:
+                for promotionIndex in promotionIndexes:
+                    yield (fromSquare, toSquare, side + pawnIndex, side + promotionIndex, normalMove)
+            else:
+                yield (fromSquare, toSquare, side + pawnIndex, -1, normalMove)
+        if fromSquare // 8 == enPassantRow:
+            for toSquare in IterSquares(pawnAttacks[color][fromSquare] & ~occupied):
+                # The pawn beside us could just have come from two squares behind toSquare
+                if enemyPawns >> (toSquare - forward) & 1 and not(occupied >> (toSquare + forward) & 1):
+                    yield (fromSquare, toSquare, side + pawnIndex, -1, enPassantMove)
+    for pieceIndex in (knightIndex, bishopIndex, rookIndex, queenIndex, kingIndex):
+        for fromSquare in IterSquares(position[side + pieceIndex]):
+            for toSquare in IterSquares(GetPieceAttacks(pieceIndex, fromSquare, occupied) & ~ownPieces):
+                yield (fromSquare, toSquare, side + pieceIndex, -1, normalMove)
+    for castlingSide in ("k", "q"):
+        move = GetCastlingMove(position, color, castlingSide, occupied)[0]
+        if move != None:
+            yield move
+
+def IsLegalMove(position, color, move):
+    return not(IsInCheck(ApplyMove(position, move), color))
+
+def HasLegalMove(position, color):
+    return any(IsLegalMove(position, color, move) for move in GetPseudoMoves(position, color))
+
+# Neither side can ever mate - the kings alone, or with one bishop or knight
+def IsDeadDraw(position):
+    otherPieces = GetColorPieces(position, 0) | GetColorPieces(position, 1)
+    otherPieces ^= position[kingIndex] | position[6 + kingIndex]
+    minorPieces = position[knightIndex] | position[bishopIndex] | position[6 + knightIndex] | position[6 + bishopIndex]
+    return otherPieces & (otherPieces - 1) == 0 and otherPieces & ~minorPieces == 0
+
+# gameState for color, about to move in position: "", check, checkmate or stalemate
+def GetGameState(position, color):
+    if IsDeadDraw(position):
+        return "stalemate"
+    inCheck = IsInCheck(position, color)
+    if HasLegalMove(position, color):
+        return "check" if inCheck else ""
+    return "checkmate" if inCheck else "stalemate"
+
+# GetBoardError: Why testBoard isn't a chess position, or "" if it is one.  Doesn't look at
+# whose move it is - MakeMove() also checks that the player who isn't moving isn't in check.
+def GetBoardError(testBoard):
+    if testBoard.extraPieces != []:
+        return "piece %s can't go on a square of its own" % repr(testBoard.extraPieces[0])
+    squares = testBoard.squares
+    for color, colorName in enumerate(("white", "black")):
+        side = color * 6
+        numKings = squares.count(side + kingIndex + 1)
+        if numKings != 1:
+            return "%s has %d kings" % (colorName, numKings)
+        numPawns = squares.count(side + pawnIndex + 1)
+        if numPawns > 8:
+            return "%s has %d pawns" % (colorName, numPawns)
+        numPieces = sum(squares.count(side + pieceIndex + 1) for pieceIndex in range(6))
+        if numPieces > 16:
+            return "%s has %d pieces" % (colorName, numPieces)
+    bitboards = testBoard.GetBitboards()
+    if (bitboards["P"] | bitboards["p"]) & backRows:
+        return "a pawn is on the first or last row"
+    return ""
+# END GetBoardError()
+
+# ParseMove: Read a move in our test notation.  Returns (pieceIndex, fromColumn, fromRow, isCapture,
+# toSquare, promotionIndex, isEnPassant, castlingSide) - pieceIndex & promotionIndex within a color,
+# -1 for anything not given - or None if it isn't a move we can read.
+@functools.lru_cache(maxsize=4096)
+def ParseMove(move):
+    castlingMatch = castlingRegex.fullmatch(move)
+    if castlingMatch != None:
+        return (kingIndex, -1, -1, False, -1, -1, False, "q" if castlingMatch.group("queenside") else "k")
+    moveMatch = moveRegex.fullmatch(move)
+    if moveMatch == None:
+        return None
+    pieceIndex = pieceLetterIndexes[moveMatch.group("piece") or "P"]
+    fromColumn = board.boardColumns.find(moveMatch.group("fromColumn") or "-")
+    fromRow = board.boardRows.find(moveMatch.group("fromRow") or "-")
+    isCapture = bool(moveMatch.group("capture") or moveMatch.group("promotionCapture"))
+    promotion = moveMatch.group("promotion")
+    promotionIndex = pieceLetterIndexes[promotion.upper()] if promotion else -1
+    isEnPassant = bool(moveMatch.group("enPassant"))
+    if pieceIndex != pawnIndex and (promotion or isEnPassant or moveMatch.group("promotionCapture")):
+        return None
+    return (pieceIndex, fromColumn, fromRow, isCapture or isEnPassant, board.GetSquareIndex(moveMatch.group("to")),
+            promotionIndex, isEnPassant, "")
+# END ParseMove()
+
+# FindMove: The one legal move for color that a parsed move describes.  Returns (move, errorString)
+def FindMove(position, color, parsedMove):
+    pieceIndex, fromColumn, fromRow, isCapture, toSquare, promotionIndex, isEnPassant, castlingSide = parsedMove
+    side = color * 6
+    occupied = GetColorPieces(position, 0) | GetColorPieces(position, 1)
+    if castlingSide != "":
+        move, errorString = GetCastlingMove(position, color, castlingSide, occupied)
+        if move != None and not(IsLegalMove(position, color, move)):
+            return (None, "castling leaves the king in check")
+        return (move, errorString)
+    toLoc = board.GetSquareLoc(toSquare)
+    pieceName = pieceNames[pieceIndex]
+    if GetColorPieces(position, color) >> toSquare & 1:
+        return (None, "%s is taken by one of the player's own pieces" % toLoc)
+    if pieceIndex == pawnIndex:
+        if fromColumn < 0 and not(isCapture): # A plain pawn move stays in its column
+            fromColumn = toSquare % 8
+        # One move for each promotion - keep the queen's (or the one asked for) to stand for them all
+        promotionPiece = side + (promotionIndex if promotionIndex >= 0 else queenIndex)
+        candidates = [move for move in GetPseudoMoves(position, color)
+                      if move[2] == side + pawnIndex and move[1] == toSquare and move[3] in (-1, promotionPiece)]
+    else:
+        fromSquares = GetPieceAttacks(pieceIndex, toSquare, occupied) & position[side + pieceIndex] # Attacks are symmetric
+        candidates = [(fromSquare, toSquare, side + pieceIndex, -1, normalMove) for fromSquare in IterSquares(fromSquares)]
+    candidates = [move for move in candidates if (fromColumn < 0 or move[0] % 8 == fromColumn) and (fromRow < 0 or move[0] // 8 == fromRow)]
+    if candidates == []:
+        return (None, "no %s of the player's can move to %s" % (pieceName, toLoc))
+    isCaptureMove = bool(GetColorPieces(position, 1 - color) >> toSquare & 1) or candidates[0][4] == enPassantMove
+    if isCapture and not(isCaptureMove):
+        return (None, "there's nothing to capture on %s" % toLoc)
+    if isCaptureMove and not(isCapture):
+        return (None, "the move to %s is a capture with no 'x'" % toLoc)
+    if isEnPassant and candidates[0][4] != enPassantMove:
+        return (None, "the move to %s isn't an en passant capture" % toLoc)
+    if pieceIndex == pawnIndex:
+        isPromotion = candidates[0][3] >= 0
+        if isPromotion and promotionIndex < 0:
+            return (None, "a pawn moving to %s has to be promoted" % toLoc)
+        if promotionIndex >= 0 and not(isPromotion):
+            return (None, "a pawn moving to %s can't be promoted" % toLoc)
+    legalMoves = [move for move in candidates if IsLegalMove(position, color, move)]
+    if legalMoves == []:
+        return (None, "the move to %s leaves the player's king in check" % toLoc)
+    if len(legalMoves) > 1:
+        return (None, "the move is ambiguous - %d %ss can move to %s" % (len(legalMoves), pieceName, toLoc))
+    return (legalMoves[0], "")
+# END FindMove()
+
+# PlayMove: Play a move on a board.Board.  Returns (resultBoard, gameState, errorCode, errorString) -
+# errorCode is 0 for a legal move, otherwise resultBoard is None and errorString says why.
+def PlayMove(testBoard, move, playerState):
+    boardError = GetBoardError(testBoard)
+    if boardError != "":
+        return (None, "", boardErrorCode, boardError)
+    if playerState not in playerColors:
+        return (None, "", playerErrorCode, "playerState %s is not 'w' or 'b'" % repr(playerState))
+    color = playerColors.index(playerState)
+    position = GetPosition(testBoard)
+    if IsInCheck(position, 1 - color):
+        return (None, "", boardErrorCode, "the player who isn't moving is in check")
+    parsedMove = ParseMove(move) if isinstance(move, str) else None
+    if parsedMove == None:
+        return (None, "", moveErrorCode, "move %s isn't one we can read" % repr(move))
+    if color == 1 and testBoard.squares == board.startBoard.squares:
+        return (None, "", moveErrorCode, "white moves first on the starting board")
+    foundMove, errorString = FindMove(position, color, parsedMove)
+    if foundMove == None:
+        return (None, "", moveErrorCode, errorString)
+    gameState = GetGameState(ApplyMove(position, foundMove), 1 - color)
+    return (ApplyMoveToBoard(testBoard, foundMove), gameState, 0, "")
+# END PlayMove()
+
+# MakeMove: What SFCS should answer a MakeMove request.  Returns (result, errorCode, errorString) - result
+# is the response 'result' dict (boardState, gameState & playerState) for a legal move, otherwise None.
+def MakeMove(boardState, move, playerState):
+    testBoard, boardError = board.BoardFromState(boardState)
+    if boardError != "":
+        return (None, boardErrorCode, boardError)
+    resultBoard, gameState, errorCode, errorString = PlayMove(testBoard, move, playerState)
+    if errorCode != 0:
+        return (None, errorCode, errorString)
+    result = {"boardState" : resultBoard.ToState(), "gameState" : gameState,
+              "playerState" : playerColors[1 - playerColors.index(playerState)]}
+    return (result, 0, "")
+# END MakeMove()
+
+# GetLegalMoves: Every legal move for playerState on testBoard, as dicts of
+#   from, to     start & destination locs ('e1' & 'g1' for the king when castling)
+#   piece        the moving piece's type ('P', 'n', ...)    captured   the captured piece's type, or ""
+#   promotion    the piece type a pawn becomes, or ""       enpassant  True for an en passant capture
+#   castling     'k' or 'q' for castling, or ""             gameState  the other player's gameState after it
+# An empty list if the board isn't a chess position (see GetBoardError()).
+def GetLegalMoves(testBoard, playerState):
+    if GetBoardError(testBoard) != "" or playerState not in playerColors:
+        return []
+    color = playerColors.index(playerState)
+    position = GetPosition(testBoard)
+    if IsInCheck(position, 1 - color):
+        return []
+    legalMoves = []
+    for move in GetPseudoMoves(position, color):
+        newPosition = ApplyMove(position, move)
+        if IsInCheck(newPosition, color):
+            continue
+        fromSquare, toSquare, piece, promotion, kind = move
+        capturedSquare = toSquare if kind != enPassantMove else (toSquare - 8 if color == 0 else toSquare + 8)
+        legalMoves.append({"from" : board.GetSquareLoc(fromSquare), "to" : board.GetSquareLoc(toSquare),
+                           "piece" : board.pieceTypes[piece], "captured" : testBoard.GetPiece(capturedSquare) or "",
+                           "promotion" : board.pieceTypes[promotion] if promotion >= 0 else "",
+                           "enpassant" : kind == enPassantMove,
+                           "castling" : ("k" if toSquare > fromSquare else "q") if kind == castlingMove else "",
+                           "gameState" : GetGameState(newPosition, 1 - color)})
+    return legalMoves
+# END GetLegalMoves()
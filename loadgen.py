@@ -0,0 +1,89 @@
+'''
+      'loadgen' module - the schedule & statistics side of the Run_SFCI_Tests load test mode.
+      Requests are sent open-loop: each one goes out at its scheduled time, however long the
+      earlier ones are taking, and its latency is measured from that scheduled time - so a
+      server that falls behind shows up as growing latency instead of quietly slowing the
+      load down.
+
+      The send rate follows a schedule: a list of requests/second rates spread evenly over
+      the run, with the rate ramped linearly between them.  One rate holds it steady.
+'''
+# Modules we'll need...
+import math
+
+# GetRateAt: Requests/second the schedule calls for, offsetSeconds into a run of durationSeconds
+def GetRateAt(rates, durationSeconds, offsetSeconds):
+    if len(rates) == 1 or offsetSeconds >= durationSeconds:
+        return rates[-1]
+    position = offsetSeconds / durationSeconds * (len(rates) - 1)
+    rateIter = int(position)
+    return rates[rateIter] + (rates[rateIter + 1] - rates[rateIter]) * (position - rateIter)
+# END GetRateAt()
+
+# GetSendTimes: Generate the offset (in seconds from the start of the run) of every request
+# the schedule calls for, in order
+def GetSendTimes(rates, durationSeconds):
+    offsetSeconds = 0.0
+    while offsetSeconds < durationSeconds:
+        yield offsetSeconds
+        offsetSeconds += 1.0 / GetRateAt(rates, durationSeconds, offsetSeconds)
+# END GetSendTimes()
+
+# GetResponseOutcome: How a load test response is tallied - "ok" for a result, the error code for an error
+def GetResponseOutcome(responseApi):
+    if not(isinstance(responseApi, dict)):
+        return "bad-response"
+    if responseApi.get("error") != None:
+        if isinstance(responseApi["error"], dict) and responseApi["error"].get("code") != None:
+            return str(responseApi["error"]["code"])
+        return "error"
+    if responseApi.get("result") != None:
+        return "ok"
+    return "bad-response"
+# END GetResponseOutcome()
+
+# GetPercentile: Nearest-rank percentile of an already sorted list
+def GetPercentile(sortedValues, percent):
+    if sortedValues == []:
+        return 0.0
+    rank = int(math.ceil(percent / 100.0 * len(sortedValues)))
+    return sortedValues[max(rank, 1) - 1]
+# END GetPercentile()
+
+# LoadStats: Latencies & outcomes of the requests finished in one reporting interval (or a whole run)
+class LoadStats:
+    def __init__(self, startOffset=0.0):
+        self.startOffset = startOffset # Seconds into the run this interval starts
+        self.numSent = 0
+        self.latencies = []
+        self.outcomeCounts = {}
+        self.maxSendLag = 0.0 # How far behind schedule our own sends got - if big, the load generator can't keep up
+
+    def AddSent(self, sendLag):
+        self.numSent += 1
+        self.maxSendLag = max(self.maxSendLag, sendLag)
+
+    def AddDone(self, latency, outcome):
+        self.latencies.append(latency)
+        self.outcomeCounts[outcome] = self.outcomeCounts.get(outcome, 0) + 1
+
+    # A summary dict for the report & run record, covering intervalSeconds of run time
+    def GetSummary(self, intervalSeconds):
+        sortedLatencies = sorted(self.latencies)
+        numDone = len(sortedLatencies)
+        return {"start" : round(self.startOffset, 3), "seconds" : round(intervalSeconds, 3),
+                "sent" : self.numSent, "done" : numDone,
+                "throughput" : round(numDone / intervalSeconds, 1) if intervalSeconds > 0 else 0.0,
+                "p50" : GetPercentile(sortedLatencies, 50), "p90" : GetPercentile(sortedLatencies, 90),
+                "p99" : GetPercentile(sortedLatencies, 99), "max" : sortedLatencies[-1] if numDone > 0 else 0.0,
+                "outcomes" : dict(self.outcomeCounts), "maxSendLag" : round(self.maxSendLag, 6)}
+# END class LoadStats
+
+# FormatSummary: One report line for a LoadStats summary
+def FormatSummary(summary):
+    outcomes = "  ".join("%s:%d" % (outcome, count) for outcome, count in sorted(summary["outcomes"].items()))
+    return ("%7.1fs +%4.1fs  sent %6d  done %6d  %8.1f/s  p50 %7.1fms  p90 %7.1fms  p99 %7.1fms  max %7.1fms  %s"\
+            % (summary["start"], summary["seconds"], summary["sent"], summary["done"], summary["throughput"],
+               summary["p50"] * 1000.0, summary["p90"] * 1000.0, summary["p99"] * 1000.0, summary["max"] * 1000.0,
+               outcomes))
+# END FormatSummary()
@@ -0,0 +1,151 @@
+'''
+      'oracle' module - a differential check of SFCS answers for Run_SFCI_Tests '--oracle'.
+      Alongside each test's hand-written expectations, every MakeMove response is checked
+      against what our own rules engine (chessengine) says the request should get: the
+      boardState after the move, the gameState and playerState, or the error class (-32000
+      board, -32010 player, -32020 move) instead.  A response the engine disagrees with is
+      reported in its own ORACLE category - it doesn't change the test's PASSED or FAILED.
+
+      Requests that aren't well-formed MakeMove calls (some expected error tests send garbage
+      on purpose) are left unchecked - how SFCS answers those is a JSON-RPC question, not a
+      chess one.
+
+      The engine's verdict is a pure function of the request, so verdicts are kept in an
+      in-memory LRU keyed by the request's sorted (type, loc) pieces, move & playerState - a
+      plain tuple, much cheaper to build than the response cache's sha1 key.  A run that sends
+      the same board & move many times only works each one out once, and checking a response
+      against a remembered verdict is a single compare of two 64-byte boards.
+'''
+# Modules we'll need...
+import threading
+import collections
+import board # Local Module
+import chessengine # Local Module
+
+# How each response compared with the engine
+oracleAgreed = "agreed"
+oracleDisagreed = "disagreed"
+oracleUnchecked = "unchecked"
+oracleOutcomes = (oracleAgreed, oracleDisagreed, oracleUnchecked)
+errorClassNames = {chessengine.boardErrorCode : "board", chessengine.playerErrorCode : "player",
+                   chessengine.moveErrorCode : "move"}
+
+# GetErrorClass: An error code with its class name, e.g. '-32020 (move)'
+def GetErrorClass(errorCode):
+    return "%s (%s)" % (errorCode, errorClassNames.get(errorCode, "unknown"))
+# END GetErrorClass()
+
+# DescribeSquares: Spell out the squares where the response board isn't the one the engine expected
+def DescribeSquares(expectedBoard, responseBoard):
+    differences = []
+    for square, (expectedCode, responseCode) in enumerate(zip(expectedBoard.squares, responseBoard.squares)):
+        if expectedCode != responseCode:
+            differences.append("%s has %s instead of %s" % (board.GetSquareLoc(square), responseBoard.GetPiece(square) or "nothing",
+                                                             expectedBoard.GetPiece(square) or "nothing"))
+    return "; ".join(differences)
+# END DescribeSquares()
+
+# GetRequestParams: The params of a decoded request, or None if it isn't a well-formed MakeMove call
+def GetRequestParams(requestDict):
+    if not(isinstance(requestDict, dict)) or requestDict.get("method") != "MakeMove":
+        return None
+    params = requestDict.get("params")
+    if not(isinstance(params, dict)) or not(isinstance(params.get("boardState"), list)):
+        return None
+    return params
+# END GetRequestParams()
+
+# GetVerdictKey: The verdict cache key of a MakeMove request's params, or None if they can't make one
+# (pieces that aren't dicts, a move that's a list...) - those requests are worked out every time.
+def GetVerdictKey(params):
+    try:
+        verdictKey = (tuple(sorted((piece.get("type"), piece.get("loc")) for piece in params["boardState"])),
+                      params.get("move"), params.get("playerState"))
+        hash(verdictKey)
+    except (AttributeError, TypeError):
+        return None
+    return verdictKey
+# END GetVerdictKey()
+
+class Oracle:
+    def __init__(self, maxEntries):
+        self.maxEntries = maxEntries
+        # verdictKey : (resultBoard, gameState, playerState, errorCode, errorString), least recently used first
+        self.verdicts = collections.OrderedDict()
+        self.lock = threading.Lock() # Checks run on the '--jobs' worker threads
+        self.numComputed = 0
+        self.numRemembered = 0
+
+    # The engine's verdict on a decoded request, or None if it isn't a MakeMove call we can judge
+    def GetVerdict(self, requestDict):
+        params = GetRequestParams(requestDict)
+        if params == None:
+            return None
+        verdictKey = GetVerdictKey(params)
+        if verdictKey != None:
+            with self.lock:
+                verdict = self.verdicts.get(verdictKey)
+                if verdict != None:
+                    self.verdicts.move_to_end(verdictKey)
+                    self.numRemembered += 1
+                    return verdict
+        # Work it out outside the lock - two threads racing on the same request just both do
+        testBoard, boardError = board.BoardFromState(params["boardState"])
+        if boardError != "":
+            verdict = (None, "", "", chessengine.boardErrorCode, boardError)
+        else:
+            resultBoard, gameState, errorCode, errorString = chessengine.PlayMove(testBoard, params.get("move"),
+                                                                                 params.get("playerState"))
+            playerState = ""
+            if errorCode == 0:
+                playerState = chessengine.playerColors[1 - chessengine.playerColors.index(params["playerState"])]
+            verdict = (resultBoard, gameState, playerState, errorCode, errorString)
+        with self.lock:
+            self.numComputed += 1
+            if verdictKey == None:
+                return verdict
+            self.verdicts[verdictKey] = verdict
+            while len(self.verdicts) > self.maxEntries:
+                self.verdicts.popitem(last=False)
+        return verdict
+
+    # Check one response against the engine's verdict on its request.
+    # Returns (oracleOutcome, details) - details says what the engine expected when they disagree.
+    def CheckResponse(self, requestDict, responseApi):
+        verdict = self.GetVerdict(requestDict)
+        if verdict == None:
+            return (oracleUnchecked, "not a well-formed MakeMove request")
+        if not(isinstance(responseApi, dict)):
+            return (oracleUnchecked, "no JSON-RPC response")
+        resultBoard, gameState, playerState, errorCode, errorString = verdict
+        responseError = responseApi.get("error")
+        if responseError:
+            responseErrorCode = responseError.get("code") if isinstance(responseError, dict) else None
+            if errorCode == 0:
+                return (oracleDisagreed, "SFCS answered error %s, but the move is legal (gameState '%s', playerState %s)"\
+                        % (GetErrorClass(responseErrorCode), gameState, playerState))
+            if responseErrorCode != errorCode:
+                return (oracleDisagreed, "SFCS answered error %s, but the request should get error %s: %s"\
+                        % (GetErrorClass(responseErrorCode), GetErrorClass(errorCode), errorString))
+            return (oracleAgreed, "")
+        resultValue = responseApi.get("result")
+        if errorCode != 0:
+            return (oracleDisagreed, "SFCS answered a result, but the request should get error %s: %s"\
+                    % (GetErrorClass(errorCode), errorString))
+        if not(isinstance(resultValue, dict)):
+            return (oracleDisagreed, "SFCS answered neither a result nor an error")
+        disagreements = []
+        responseGameState = resultValue.get("gameState") or ""
+        if responseGameState != gameState:
+            disagreements.append("gameState '%s' instead of '%s'" % (responseGameState, gameState))
+        if resultValue.get("playerState") != playerState:
+            disagreements.append("playerState %s instead of %s" % (resultValue.get("playerState"), playerState))
+        responseBoard, boardError = board.BoardFromState(resultValue.get("boardState"))
+        if boardError != "":
+            disagreements.append("boardState is not a valid board: %s" % boardError)
+        elif responseBoard.squares != resultBoard.squares:
+            disagreements.append("boardState: %s" % DescribeSquares(resultBoard, responseBoard))
+        if disagreements != []:
+            return (oracleDisagreed, "SFCS answered %s" % ", ".join(disagreements))
+        return (oracleAgreed, "")
+# END class Oracle
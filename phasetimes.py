@@ -0,0 +1,118 @@
+'''
+      'phasetimes' module - per-phase wall time histograms for Run_SFCI_Tests.
+      Each test's time is split into the phases below, so a slow run shows whether the
+      time went to the SFCS server (network) or to us (everything else):
+          parse     - reading & decoding the test definition file (or its cached TestCase)
+          serialize - building the request body we post
+          network   - posting the request and reading the response off the wire
+          decode    - decoding the JSON response
+          verify    - GetFinalTestResult checking the response against the expectations
+          oracle    - checking the response against the rules engine ('--oracle' runs only)
+          write     - the report writer thread writing the test's output block & run record
+
+      Every phase is kept as a histogram over fixed buckets, and the lot can be written
+      out as an OpenMetrics text file for a metrics system to pick up.
+'''
+# Modules we'll need...
+import bisect
+import threading
+
+phaseNames = ("parse", "serialize", "network", "decode", "verify", "oracle", "write")
+# Histogram bucket upper bounds, in seconds.  Anything slower lands in the +Inf bucket.
+bucketBounds = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+metricPrefix = "sfci"
+
+# PhaseHistogram: Count, sum, max & bucket counts of one phase's times
+class PhaseHistogram:
+    def __init__(self):
+        self.bucketCounts = [0] * (len(bucketBounds) + 1) # Not cumulative - the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def Add(self, seconds):
+        self.bucketCounts[bisect.bisect_left(bucketBounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+# END class PhaseHistogram
+
+# PhaseTimes: A PhaseHistogram for every phase.  Times come in from the main thread and
+# the report writer thread, so adds are locked.
+class PhaseTimes:
+    def __init__(self):
+        self.histograms = {phaseName : PhaseHistogram() for phaseName in phaseNames}
+        self.lock = threading.Lock()
+
+    def Add(self, phaseName, seconds):
+        with self.lock:
+            self.histograms[phaseName].Add(seconds)
+
+    # Add every phase in one test's {phaseName : seconds} timings dict
+    def AddTimings(self, timings):
+        with self.lock:
+            for phaseName, seconds in timings.items():
+                self.histograms[phaseName].Add(seconds)
+
+    # Count, total, mean & max of every phase, for the run summary record
+    def GetSummary(self):
+        phaseSummary = {}
+        with self.lock:
+            for phaseName in phaseNames:
+                histogram = self.histograms[phaseName]
+                phaseSummary[phaseName] = {"count" : histogram.count, "seconds" : round(histogram.sum, 6),
+                                           "mean" : round(histogram.sum / histogram.count, 6) if histogram.count > 0 else 0.0,
+                                           "max" : round(histogram.max, 6)}
+        return phaseSummary
+
+    # Report lines: a totals table, then how many tests landed in each histogram bucket
+    def FormatReport(self):
+        phaseSummary = self.GetSummary()
+        allSeconds = sum(phaseSummary[phaseName]["seconds"] for phaseName in phaseNames)
+        reportLines = ["Time spent in each phase of the tests (the network phase is the SFCS server's share):",
+                       "  %-10s %7s %11s %6s %10s %10s" % ("phase", "tests", "total s", "share", "mean ms", "max ms")]
+        for phaseName in phaseNames:
+            summary = phaseSummary[phaseName]
+            share = 100.0 * summary["seconds"] / allSeconds if allSeconds > 0 else 0.0
+            reportLines.append("  %-10s %7d %11.3f %5.1f%% %10.3f %10.3f" % (phaseName, summary["count"], summary["seconds"],
+                               share, summary["mean"] * 1000.0, summary["max"] * 1000.0))
+        bucketLabels = ["<=%gms" % (bound * 1000.0) for bound in bucketBounds] + [">%gms" % (bucketBounds[-1] * 1000.0)]
+        reportLines.append("\nTests per phase time bucket:")
+        reportLines.append("  %-10s %s" % ("phase", " ".join("%9s" % label for label in bucketLabels)))
+        with self.lock:
+            for phaseName in phaseNames:
+                reportLines.append("  %-10s %s" % (phaseName, " ".join("%9d" % bucketCount
+                                                   for bucketCount in self.histograms[phaseName].bucketCounts)))
+        return reportLines
+
+    # Write every histogram, plus the test outcome counts, as an OpenMetrics text file
+    def WriteOpenMetrics(self, metricsFileName, testCounts):
+        metricName = "%s_test_phase_seconds" % metricPrefix
+        metricLines = ["# TYPE %s histogram" % metricName,
+                       "# UNIT %s seconds" % metricName,
+                       "# HELP %s Wall time of each phase of each test." % metricName]
+        with self.lock:
+            for phaseName in phaseNames:
+                histogram = self.histograms[phaseName]
+                cumulativeCount = 0
+                for bound, bucketCount in zip(bucketBounds + (float("inf"),), histogram.bucketCounts):
+                    cumulativeCount += bucketCount
+                    boundLabel = "+Inf" if bound == float("inf") else repr(bound)
+                    metricLines.append('%s_bucket{phase="%s",le="%s"} %d' % (metricName, phaseName, boundLabel, cumulativeCount))
+                metricLines.append('%s_sum{phase="%s"} %r' % (metricName, phaseName, histogram.sum))
+                metricLines.append('%s_count{phase="%s"} %d' % (metricName, phaseName, histogram.count))
+        metricName = "%s_tests" % metricPrefix
+        metricLines.append("# TYPE %s counter" % metricName)
+        metricLines.append("# HELP %s Tests run, by outcome." % metricName)
+        for outcome, count in sorted(testCounts.items()):
+            metricLines.append('%s_total{outcome="%s"} %d' % (metricName, outcome, count))
+        metricLines.append("# EOF")
+        with open(metricsFileName, "w") as metricsFile:
+            metricsFile.write("\n".join(metricLines) + "\n")
+# END class PhaseTimes
+
+# FormatTimings: One report line of a single test's phase timings, in milliseconds
+def FormatTimings(timings):
+    return "Phase timings (ms): %s" % "  ".join("%s %.3f" % (phaseName, timings[phaseName] * 1000.0)
+                                                 for phaseName in phaseNames if phaseName in timings)
+# END FormatTimings()
@@ -0,0 +1,122 @@
+'''
+      'reportwriter' module - the single writer for Run_SFCI_Tests output.
+      One ReportWriter owns the test .report and API .log file handles for the whole run.
+      Blocks of output are handed to it on a queue and written out by a dedicated writer
+      thread, so each test's block stays together no matter how many tests run at once,
+      and the files are written in large buffered chunks instead of being opened and
+      closed for every line.
+
+      It can also keep a machine-readable run record: one JSON line per test (JSONL)
+      plus a small tab-separated index of each record's byte offset & length, so a tool
+      can seek straight to any test's record:
+          <offset>\t<length>\t<outcome>\t<testName>
+
+      Given a phasetimes.PhaseTimes, it adds the time taken to write each test's block
+      & record to the "write" phase.
+'''
+# Modules we'll need...
+import sys
+import time
+import json
+import queue
+import threading
+
+fileBufferSize = 1024 * 1024 # Bytes of output held before the OS sees a write
+maxQueuedBlocks = 1024       # Writers block (rather than eat memory) if we fall this far behind
+
+class ReportWriter:
+    def __init__(self, reportFileName, logFileName, recordFileName=None, indexFileName=None, phaseTimes=None):
+        self.phaseTimes = phaseTimes
+        self.reportFile = open(reportFileName, "a", buffering=fileBufferSize)
+        self.logFile = open(logFileName, "a", buffering=fileBufferSize)
+        self.recordFile = None
+        self.indexFile = None
+        if recordFileName != None:
+            self.recordFile = open(recordFileName, "ab", buffering=fileBufferSize)
+            self.recordOffset = self.recordFile.tell() # Byte offset the next record starts at
+            self.indexFile = open(indexFileName, "a", buffering=fileBufferSize)
+        self.outputQueue = queue.Queue(maxsize=maxQueuedBlocks)
+        self.writeError = None
+        self.isClosed = False
+        self.writerThread = threading.Thread(target=self.WriteLoop, name="ReportWriter", daemon=True)
+        self.writerThread.start()
+
+    # Queue up a block of output - a list of (destination, data) tuples where destination
+    # is "term", "report", "log" or "all" - to be written out in one piece, along with an
+    # optional run record dict (its "name" and "outcome" entries go in the index)
+    def Write(self, outputBlock, runRecord=None):
+        if self.writeError != None:
+            raise self.writeError
+        self.outputQueue.put((outputBlock, runRecord))
+
+    # Append one run record line to the JSONL file, and its location to the index
+    def WriteRecord(self, runRecord):
+        recordLine = (json.dumps(runRecord) + "\n").encode("utf-8")
+        self.recordFile.write(recordLine)
+        self.indexFile.write("%d\t%d\t%s\t%s\n" % (self.recordOffset, len(recordLine),
+                                                   runRecord.get("outcome", runRecord.get("record")),
+                                                   runRecord.get("name", "")))
+        self.recordOffset += len(recordLine)
+
+    # Writer thread: join each block up per destination and write it with one call per file.
+    # Files & screen are flushed whenever we catch up, so output still shows up promptly.
+    def WriteLoop(self):
+        while True:
+            queuedItem = self.outputQueue.get()
+            if queuedItem == None: # Close() was called
+                break
+            outputBlock, runRecord = queuedItem
+            writeStart = time.perf_counter()
+            try:
+                termText = []
+                reportText = []
+                logText = []
+                for destination, data in outputBlock:
+                    line = "%s\n" % data
+                    termText.append(line)
+                    if destination == "report" or destination == "all":
+                        reportText.append(line)
+                    if destination == "log" or destination == "all":
+                        logText.append(line)
+                sys.stdout.write("".join(termText))
+                if reportText != []:
+                    self.reportFile.write("".join(reportText))
+                if logText != []:
+                    self.logFile.write("".join(logText))
+                if runRecord != None and self.recordFile != None:
+                    self.WriteRecord(runRecord)
+                if self.phaseTimes != None and runRecord != None and runRecord.get("record") == "test":
+                    self.phaseTimes.Add("write", time.perf_counter() - writeStart)
+                if self.outputQueue.empty():
+                    sys.stdout.flush()
+                    self.reportFile.flush()
+                    self.logFile.flush()
+                    if self.recordFile != None:
+                        self.recordFile.flush()
+                        self.indexFile.flush()
+            except Exception as writeError:
+                self.writeError = writeError
+                # Keep draining so nobody blocks forever on a full queue
+            finally:
+                self.outputQueue.task_done()
+        sys.stdout.flush()
+
+    # Wait until everything queued so far has been written
+    def Drain(self):
+        self.outputQueue.join()
+
+    # Write out everything still queued and close all our files.  Safe to call more than once.
+    def Close(self):
+        if self.isClosed:
+            return
+        self.isClosed = True
+        self.outputQueue.put(None)
+        self.writerThread.join()
+        self.reportFile.close()
+        self.logFile.close()
+        if self.recordFile != None:
+            self.recordFile.close()
+            self.indexFile.close()
+        if self.writeError != None:
+            raise self.writeError
+# END class ReportWriter
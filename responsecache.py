@@ -0,0 +1,182 @@
+'''
+      'responsecache' module - memoized SFCS API responses for Run_SFCI_Tests.
+      A MakeMove response is a pure function of its request, and the Test_Boards
+      repository means many tests send the very same board & move, so each distinct
+      request only needs to go to the server once.
+
+      Requests are keyed by a sha1 of their canonical form - the boardState pieces in
+      sorted order, the move and the playerState - plus a server tag (the API url and an
+      optional server version), so responses from one server build are never handed out
+      for another.  Requests that aren't well-formed MakeMove calls (some expected error
+      tests send garbage on purpose) are never cached.
+
+      Responses are kept in an in-memory LRU capped at maxEntries, with an optional
+      sqlite file behind it that carries them across runs.  New entries are written to
+      the file in one transaction when the cache is closed.  Concurrent identical requests
+      (from '--jobs' threads or '--async' coroutines) wait for the first one's response
+      instead of all going to the server.
+'''
+# Modules we'll need...
+import os
+import json
+import hashlib
+import sqlite3
+import asyncio
+import threading
+import collections
+
+cacheFormatVersion = 1 # Bump whenever the key or the stored response changes - old cache files are then ignored
+
+# GetRequestKey: The cache key of a decoded request, or None if it shouldn't be cached
+def GetRequestKey(requestDict, serverTag):
+    if not(isinstance(requestDict, dict)) or requestDict.get("method") != "MakeMove":
+        return None
+    params = requestDict.get("params")
+    if not(isinstance(params, dict)) or not(isinstance(params.get("boardState"), list)):
+        return None
+    try:
+        pieces = sorted(json.dumps(piece, sort_keys=True) for piece in params["boardState"])
+        canonicalRequest = json.dumps([serverTag, requestDict.get("jsonrpc"), pieces, params.get("move"),
+                                       params.get("playerState")], sort_keys=True)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha1(canonicalRequest.encode("utf-8")).hexdigest()
+# END GetRequestKey()
+
+# IsCacheable: Only a complete JSON-RPC answer - a result or an error code - is worth keeping
+def IsCacheable(responseApi):
+    if not(isinstance(responseApi, dict)):
+        return False
+    if isinstance(responseApi.get("error"), dict):
+        return responseApi["error"].get("code") != None
+    return isinstance(responseApi.get("result"), dict)
+# END IsCacheable()
+
+class ResponseCache:
+    def __init__(self, maxEntries, cacheFileName=None):
+        self.maxEntries = maxEntries
+        self.entries = collections.OrderedDict() # requestKey : JSON response text (w/o "id"), least recently used first
+        self.lock = threading.Lock()
+        self.inFlight = {}      # requestKey : threading.Event for requests a '--jobs' thread is fetching now
+        self.inFlightAsync = {} # requestKey : asyncio.Event for requests an '--async' coroutine is fetching now
+        self.pendingRows = []   # (requestKey, response text) rows to write to the cache file
+        self.numMemoryHits = 0
+        self.numDiskHits = 0
+        self.numFetched = 0
+        self.connection = None
+        if cacheFileName != None:
+            try:
+                self.connection = self.OpenCache(cacheFileName)
+            except sqlite3.Error:
+                # Unusable cache file - start over with a fresh one
+                os.remove(cacheFileName)
+                self.connection = self.OpenCache(cacheFileName)
+
+    # Open (or create) the cache file, dropping what's in it if it was written by an older version of us
+    def OpenCache(self, cacheFileName):
+        connection = sqlite3.connect(cacheFileName, check_same_thread=False)
+        if connection.execute("PRAGMA user_version").fetchone()[0] != cacheFormatVersion:
+            connection.execute("DROP TABLE IF EXISTS responses")
+            connection.execute("PRAGMA user_version = %d" % cacheFormatVersion)
+        connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT)")
+        connection.commit()
+        return connection
+
+    # Remember a response in memory, evicting the least recently used one if we're full.  Call with the lock held.
+    def Remember(self, requestKey, responseText):
+        self.entries[requestKey] = responseText
+        self.entries.move_to_end(requestKey)
+        while len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+
+    # The cached response for a request key with its "id" set to requestId, or None on a miss
+    def Get(self, requestKey, requestId):
+        with self.lock:
+            responseText = self.entries.get(requestKey)
+            if responseText != None:
+                self.entries.move_to_end(requestKey)
+                self.numMemoryHits += 1
+            elif self.connection != None:
+                cachedRow = self.connection.execute("SELECT response FROM responses WHERE key = ?", (requestKey,)).fetchone()
+                if cachedRow != None:
+                    responseText = cachedRow[0]
+                    self.Remember(requestKey, responseText)
+                    self.numDiskHits += 1
+        if responseText == None:
+            return None
+        responseApi = json.loads(responseText) # A fresh copy every time - callers may keep or change it
+        responseApi["id"] = requestId
+        return responseApi
+
+    # Keep a response the server gave us, if it's a complete answer
+    def Put(self, requestKey, responseApi):
+        if not(IsCacheable(responseApi)):
+            return
+        responseText = json.dumps({key : value for key, value in responseApi.items() if key != "id"})
+        with self.lock:
+            self.Remember(requestKey, responseText)
+            if self.connection != None:
+                self.pendingRows.append((requestKey, responseText))
+
+    # Keep a response we just had to get from the server, and count it
+    def AddFetched(self, requestKey, responseApi):
+        with self.lock:
+            self.numFetched += 1
+        self.Put(requestKey, responseApi)
+
+    # Get a response from the cache, or by calling Fetch() - once, however many threads ask for
+    # the same request at the same time.  Returns (responseApi, isFromCache).
+    # Anything Fetch() raises goes back to the caller that called it.
+    def GetOrFetch(self, requestKey, requestId, Fetch):
+        while True:
+            responseApi = self.Get(requestKey, requestId)
+            if responseApi != None:
+                return (responseApi, True)
+            with self.lock:
+                fetchDone = self.inFlight.get(requestKey)
+                if fetchDone == None:
+                    fetchDone = threading.Event()
+                    self.inFlight[requestKey] = fetchDone
+                    break
+            fetchDone.wait() # Someone else is fetching it - look again once they're done
+        try:
+            responseApi = Fetch()
+            self.AddFetched(requestKey, responseApi)
+        finally:
+            with self.lock:
+                del self.inFlight[requestKey]
+            fetchDone.set()
+        return (responseApi, False)
+
+    # GetOrFetch() for '--async' coroutines - Fetch is a coroutine function
+    async def GetOrFetchAsync(self, requestKey, requestId, Fetch):
+        while True:
+            responseApi = self.Get(requestKey, requestId)
+            if responseApi != None:
+                return (responseApi, True)
+            fetchDone = self.inFlightAsync.get(requestKey)
+            if fetchDone == None:
+                fetchDone = asyncio.Event()
+                self.inFlightAsync[requestKey] = fetchDone
+                break
+            await fetchDone.wait()
+        try:
+            responseApi = await Fetch()
+            self.AddFetched(requestKey, responseApi)
+        finally:
+            del self.inFlightAsync[requestKey]
+            fetchDone.set()
+        return (responseApi, False)
+
+    # Write this run's new responses to the cache file and close it.  Safe to call more than once.
+    def Close(self):
+        with self.lock:
+            if self.connection == None:
+                return
+            if self.pendingRows != []:
+                self.connection.executemany("INSERT OR REPLACE INTO responses VALUES (?, ?)", self.pendingRows)
+                self.connection.commit()
+            self.connection.close()
+            self.connection = None
+            self.pendingRows = []
+# END class ResponseCache
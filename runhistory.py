@@ -0,0 +1,101 @@
+'''
+      'runhistory' module - what happened to every test definition file the last time
+      Run_SFCI_Tests ran it: a sha1 of the file's contents, the test's outcome and how long
+      it took.  The '--changed', '--last-failed' and '--failed-first' options pick and order
+      the next run's tests from it.
+
+      The history is a single sqlite3 file, read in full when it's opened and updated in
+      one transaction when it's closed.  A file whose mtime & size match its history entry
+      is taken to be unchanged, so only new or touched files have to be read and hashed.
+'''
+# Modules we'll need...
+import os
+import time
+import hashlib
+import sqlite3
+
+historyFormatVersion = 1 # Bump whenever the table layout changes - older history is then dropped
+
+class RunHistory:
+    def __init__(self, historyFileName):
+        try:
+            self.connection = self.OpenHistory(historyFileName)
+        except sqlite3.Error:
+            # Unusable history file - start over with a fresh one
+            os.remove(historyFileName)
+            self.connection = self.OpenHistory(historyFileName)
+        # path : [mtime_ns, size, hash, outcome, seconds, lastRun] for every test we've ever run
+        self.entries = {}
+        for row in self.connection.execute("SELECT path, mtime, size, hash, outcome, seconds, lastRun FROM tests"):
+            self.entries[row[0]] = list(row[1:])
+        self.fileStates = {}    # path : (mtime_ns, size, hash) of the file as it is now, worked out once per run
+        self.updatedPaths = set()
+
+    # Open (or create) the history file, dropping it if it was written by an older version of us
+    def OpenHistory(self, historyFileName):
+        connection = sqlite3.connect(historyFileName)
+        if connection.execute("PRAGMA user_version").fetchone()[0] != historyFormatVersion:
+            connection.execute("DROP TABLE IF EXISTS tests")
+            connection.execute("PRAGMA user_version = %d" % historyFormatVersion)
+        connection.execute("CREATE TABLE IF NOT EXISTS tests (path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, "
+                           "hash TEXT, outcome TEXT, seconds REAL, lastRun REAL)")
+        connection.commit()
+        return connection
+
+    # (mtime_ns, size, sha1) of a test file as it is now - the sha1 is only worked out if the
+    # mtime or size differ from its history entry.  None if the file can't be read.
+    def GetFileState(self, fullPathTestFileName):
+        fullPathTestFileName = os.path.normpath(fullPathTestFileName.rstrip())
+        if fullPathTestFileName in self.fileStates:
+            return self.fileStates[fullPathTestFileName]
+        fileState = None
+        try:
+            fileStat = os.stat(fullPathTestFileName)
+            entry = self.entries.get(fullPathTestFileName)
+            if entry != None and entry[0] == fileStat.st_mtime_ns and entry[1] == fileStat.st_size:
+                fileState = (fileStat.st_mtime_ns, fileStat.st_size, entry[2])
+            else:
+                with open(fullPathTestFileName, 'rb') as testFile:
+                    fileState = (fileStat.st_mtime_ns, fileStat.st_size, hashlib.sha1(testFile.read()).hexdigest())
+        except OSError:
+            pass
+        self.fileStates[fullPathTestFileName] = fileState
+        return fileState
+
+    # Is this test file new, or has its content changed since we last ran it?
+    def IsChanged(self, fullPathTestFileName):
+        entry = self.entries.get(os.path.normpath(fullPathTestFileName.rstrip()))
+        fileState = self.GetFileState(fullPathTestFileName)
+        return entry == None or fileState == None or fileState[2] != entry[2]
+
+    # The test's outcome the last time we ran it, or "" if we never have
+    def GetLastOutcome(self, fullPathTestFileName):
+        entry = self.entries.get(os.path.normpath(fullPathTestFileName.rstrip()))
+        return entry[3] if entry != None else ""
+
+    # How many seconds the test took the last time we ran it, or None if we never have
+    def GetLastSeconds(self, fullPathTestFileName):
+        entry = self.entries.get(os.path.normpath(fullPathTestFileName.rstrip()))
+        return entry[4] if entry != None else None
+
+    # Remember how a test just went
+    def Record(self, fullPathTestFileName, outcome, seconds):
+        fileState = self.GetFileState(fullPathTestFileName)
+        if fileState == None:
+            return # Nothing to compare with next time
+        fullPathTestFileName = os.path.normpath(fullPathTestFileName.rstrip())
+        self.entries[fullPathTestFileName] = [fileState[0], fileState[1], fileState[2], outcome, seconds, time.time()]
+        self.updatedPaths.add(fullPathTestFileName)
+
+    # Write this run's outcomes to the history file and close it.  Safe to call more than once.
+    def Close(self):
+        if self.connection == None:
+            return
+        if self.updatedPaths:
+            self.connection.executemany("INSERT OR REPLACE INTO tests VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                        [[path] + self.entries[path] for path in self.updatedPaths])
+            self.connection.commit()
+        self.connection.close()
+        self.connection = None
+        self.updatedPaths = set()
+# END class RunHistory
@@ -0,0 +1,74 @@
+'''
+      'sharding' module - splits a Run_SFCI_Tests test list into n shards so a run can be
+      spread across machines with '--shard i/n', and every machine agrees on which tests
+      are its own without talking to the others.
+
+      Tests are identified by their path relative to the directory the runner starts in
+      (e.g. 'expPassTestDir/b_castling_kingside.passtest'), so the split doesn't depend
+      on where each machine keeps its checkout.  By default a test's shard comes from a
+      sha1 of that relative path - stable across runs, machines and python versions, and
+      a test added or removed never moves any other test.
+
+      Shards can instead be balanced by recorded test durations: the longest tests are
+      dealt out first, each to the shard with the least total time so far.  That split
+      is only the same on every machine if they all have the same run history.
+'''
+# Modules we'll need...
+import os
+import hashlib
+
+# ParseShard: Turn an 'i/n' shard spec into (i, n), with 1 <= i <= n.  Returns None if it isn't one.
+def ParseShard(shardSpec):
+    shardIndex, slash, numShards = shardSpec.partition("/")
+    if slash == "" or not(shardIndex.isdigit()) or not(numShards.isdigit()):
+        return None
+    shardIndex = int(shardIndex)
+    numShards = int(numShards)
+    if numShards < 1 or shardIndex < 1 or shardIndex > numShards:
+        return None
+    return (shardIndex, numShards)
+# END ParseShard()
+
+# GetShardKey: The machine-independent name of a test - its path relative to rootDir, with '/' separators
+def GetShardKey(fullPathTestFileName, rootDir):
+    relativePath = os.path.relpath(os.path.normpath(fullPathTestFileName.rstrip()), rootDir)
+    return relativePath.replace(os.sep, "/")
+# END GetShardKey()
+
+# GetHashShard: Which of numShards shards (1 to numShards) a test belongs in, by a stable hash of its shard key
+def GetHashShard(shardKey, numShards):
+    return int(hashlib.sha1(shardKey.encode("utf-8")).hexdigest(), 16) % numShards + 1
+# END GetHashShard()
+
+# GetDurationShards: Deal the tests out to numShards shards by duration, longest first, each to the
+# shard with the least total time so far (lowest shard number on a tie).  GetSeconds(path) gives a
+# test's recorded duration, or None - tests without one count as the median recorded duration.
+# Returns {path : shard number}
+def GetDurationShards(testList, numShards, rootDir, GetSeconds):
+    recordedSeconds = {}
+    for fullPathTestFileName in testList:
+        seconds = GetSeconds(fullPathTestFileName)
+        if seconds != None:
+            recordedSeconds[fullPathTestFileName] = seconds
+    knownSeconds = sorted(recordedSeconds.values())
+    defaultSeconds = knownSeconds[len(knownSeconds) // 2] if knownSeconds != [] else 1.0
+    # Sort on the shard key as well, so equal durations are dealt out the same way everywhere
+    dealOrder = sorted(set(testList), key=lambda path: (-recordedSeconds.get(path, defaultSeconds), GetShardKey(path, rootDir)))
+    shardSeconds = [0.0] * numShards
+    testShards = {}
+    for fullPathTestFileName in dealOrder:
+        shardIter = shardSeconds.index(min(shardSeconds))
+        testShards[fullPathTestFileName] = shardIter + 1
+        shardSeconds[shardIter] += recordedSeconds.get(fullPathTestFileName, defaultSeconds)
+    return testShards
+# END GetDurationShards()
+
+# ShardTests: The tests in testList that belong in shard shardIndex of numShards, in testList order.
+# Balanced by duration if a GetSeconds function is supplied, otherwise by hash.
+def ShardTests(testList, shardIndex, numShards, rootDir, GetSeconds=None):
+    if GetSeconds != None:
+        testShards = GetDurationShards(testList, numShards, rootDir, GetSeconds)
+        return [fullPathTestFileName for fullPathTestFileName in testList if testShards[fullPathTestFileName] == shardIndex]
+    return [fullPathTestFileName for fullPathTestFileName in testList
+            if GetHashShard(GetShardKey(fullPathTestFileName, rootDir), numShards) == shardIndex]
+# END ShardTests()
@@ -0,0 +1,128 @@
+'''
+      'testcache' module - an on-disk cache of parsed test definition files for Run_SFCI_Tests,
+      so a run only re-parses the test files that are new or have changed since the last run.
+
+      The cache is a single sqlite3 file holding each parsed testcase.TestCase (pickled),
+      keyed by file path and revalidated against the file's mtime & size - plus, optionally,
+      a sha1 of its contents for file systems whose timestamps can't be trusted.
+      Test directory listings (file & subdirectory names) are cached too, keyed by the
+      directory's own mtime, which changes whenever an entry is added, removed or renamed
+      in it.  Each subdirectory has its own listing.
+
+      Entries are looked up one at a time, so startup doesn't depend on the size of the
+      cache, and new entries are written in one transaction when the cache is closed.
+'''
+# Modules we'll need...
+import os
+import json
+import pickle
+import hashlib
+import sqlite3
+import threading
+import testcase # Local Module
+import utilities # Local Module
+
+cacheFormatVersion = 2 # Bump whenever TestCase or the table layout changes - old caches are then ignored
+
+class TestCache:
+    def __init__(self, cacheFileName, useHash=False):
+        self.useHash = useHash
+        self.lock = threading.Lock() # Tests are prepared on worker & executor threads
+        self.pendingTests = []       # (path, mtime_ns, size, hash, pickled TestCase) rows to write
+        self.pendingDirs = []        # (dirPath, mtime_ns, json [file names, subdirectory names]) rows to write
+        self.numHits = 0
+        self.numParsed = 0
+        try:
+            self.connection = self.OpenCache(cacheFileName)
+        except sqlite3.Error:
+            # Unusable cache file - start over with a fresh one
+            os.remove(cacheFileName)
+            self.connection = self.OpenCache(cacheFileName)
+
+    # Open (or create) the cache database, dropping it if it was written by an older version of us
+    def OpenCache(self, cacheFileName):
+        connection = sqlite3.connect(cacheFileName, check_same_thread=False)
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != cacheFormatVersion:
+            connection.execute("DROP TABLE IF EXISTS tests")
+            connection.execute("DROP TABLE IF EXISTS dirs")
+            connection.execute("PRAGMA user_version = %d" % cacheFormatVersion)
+        connection.execute("CREATE TABLE IF NOT EXISTS tests (path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, "
+                           "hash TEXT, testcase BLOB)")
+        connection.execute("CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime INTEGER, files TEXT)")
+        connection.commit()
+        return connection
+
+    # Get the TestCase for one test definition file - from the cache if the file hasn't changed,
+    # otherwise by parsing it (and queueing the result up for the cache)
+    def GetTestCase(self, fullPathTestFileName):
+        fullPathTestFileName = fullPathTestFileName.rstrip()
+        try:
+            fileStat = os.stat(fullPathTestFileName)
+        except OSError:
+            return testcase.ParseTestFile(fullPathTestFileName) # Let the parser report it
+        with self.lock:
+            cachedRow = self.connection.execute("SELECT mtime, size, hash, testcase FROM tests WHERE path = ?",
+                                                (fullPathTestFileName,)).fetchone()
+        fileHash = None
+        testText = None
+        if cachedRow != None and cachedRow[1] == fileStat.st_size:
+            if not(self.useHash) and cachedRow[0] == fileStat.st_mtime_ns:
+                return self.CacheHit(cachedRow[3])
+            if self.useHash and cachedRow[2] != None:
+                testText, fileHash = self.ReadTestFile(fullPathTestFileName)
+                if fileHash == cachedRow[2]:
+                    return self.CacheHit(cachedRow[3])
+        if testText == None:
+            testText, fileHash = self.ReadTestFile(fullPathTestFileName)
+            if testText == None: # Gone or unreadable since we stat'ed it
+                return testcase.ParseTestFile(fullPathTestFileName)
+        testCase = testcase.ParseTestText(fullPathTestFileName, testText)
+        with self.lock:
+            self.numParsed += 1
+            self.pendingTests.append((fullPathTestFileName, fileStat.st_mtime_ns, fileStat.st_size,
+                                      fileHash if self.useHash else None, pickle.dumps(testCase)))
+        return testCase
+
+    def CacheHit(self, pickledTestCase):
+        with self.lock:
+            self.numHits += 1
+        return pickle.loads(pickledTestCase)
+
+    # Read a test file's text and its sha1.  Returns (None, None) if we can't read it.
+    def ReadTestFile(self, fullPathTestFileName):
+        try:
+            with open(fullPathTestFileName, 'rb') as testFile:
+                testBytes = testFile.read()
+            return (testBytes.decode("utf-8"), hashlib.sha1(testBytes).hexdigest())
+        except (OSError, UnicodeDecodeError):
+            return (None, None)
+
+    # utilities.ListTestDir() for a test directory, re-reading it only if the directory has changed.
+    # Returns (file names, subdirectory names), each sorted.
+    def ListTestDir(self, testDir):
+        dirMtime = os.stat(testDir).st_mtime_ns
+        with self.lock:
+            cachedRow = self.connection.execute("SELECT mtime, files FROM dirs WHERE path = ?", (testDir,)).fetchone()
+        if cachedRow != None and cachedRow[0] == dirMtime:
+            fileNames, dirNames = json.loads(cachedRow[1])
+        else:
+            fileNames, dirNames = utilities.ListTestDir(testDir)
+            with self.lock:
+                self.pendingDirs.append((testDir, dirMtime, json.dumps([fileNames, dirNames])))
+        return (fileNames, dirNames)
+
+    # Write everything we parsed this run into the cache and close it.  Safe to call more than once.
+    def Close(self):
+        with self.lock:
+            if self.connection == None:
+                return
+            if self.pendingTests != [] or self.pendingDirs != []:
+                self.connection.executemany("INSERT OR REPLACE INTO tests VALUES (?, ?, ?, ?, ?)", self.pendingTests)
+                self.connection.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)", self.pendingDirs)
+                self.connection.commit()
+            self.connection.close()
+            self.connection = None
+            self.pendingTests = []
+            self.pendingDirs = []
+# END class TestCache
@@ -0,0 +1,151 @@
+'''
+      'testcase' module - reads a .passtest or .expfail test definition file in a single
+      pass into a compact TestCase record for Run_SFCI_Tests.
+      Every field is decoded with json or ast.literal_eval (never eval), and every
+      missing or malformed field is collected into TestCase.errors, so a broken
+      definition file is reported all at once instead of one field per run.
+
+      Test definition file lines look like:
+          testName : w_rook_start_move          (or just the bare test name)
+          Description : <free text>
+          request : <JSON-RPC request, posted to the SFCS API as is>
+          errorCode : {'code': -32020}                          (.expfail only)
+          "gameState": ""                                       (.passtest only)
+          "playerState": "w"                                    (.passtest only)
+          movedPieces : [{'type': 'R', 'loc': 'h1'}]            (.passtest only)
+          expectedResponsePieces : [{'type': 'R', 'loc': 'h5'}] (.passtest only)
+'''
+# Modules we'll need...
+import os
+import ast
+import json
+
+expPassExt = ".passtest"
+expFailExt = ".expfail"
+
+# The line keys we read, and the TestCase slot each one fills
+testFileKeys = {"Description" : "description",
+                "request" : "apiRequest",
+                "errorCode" : "expectedErrorCode",
+                '"gameState"' : "expectedGameState",
+                '"playerState"' : "expectedPlayerState",
+                "movedPieces" : "movedPieces",
+                "expectedResponsePieces" : "expectedResponsePieces"}
+# Which keys each kind of test has to have
+expPassTestKeys = ("Description", "request", '"gameState"', '"playerState"', "movedPieces", "expectedResponsePieces")
+expFailTestKeys = ("Description", "request", "errorCode")
+
+# TestCase: Everything one test definition file tells us, already decoded
+class TestCase:
+    __slots__ = ("path", "name", "isExpectedErrorCase", "description", "apiRequest", "requestDict",
+                 "expectedErrorCode", "expectedGameState", "expectedPlayerState", "movedPieces",
+                 "expectedResponsePieces", "errors")
+
+    def __init__(self, path, name, isExpectedErrorCase):
+        self.path = path
+        self.name = name
+        self.isExpectedErrorCase = isExpectedErrorCase
+        self.description = ""
+        self.apiRequest = ""      # The raw request string - posted exactly as written in the file
+        self.requestDict = None   # The same request decoded, or None if it isn't valid JSON
+        self.expectedErrorCode = 0
+        self.expectedGameState = ""
+        self.expectedPlayerState = ""
+        self.movedPieces = []
+        self.expectedResponsePieces = []
+        self.errors = []          # One "Process ERROR" string per missing or malformed field
+# END class TestCase
+
+# DecodeLiteral: Decode a python literal (the piece lists & errorCode dict are written as python reprs).
+# Returns (value, errorString)
+def DecodeLiteral(valueStr):
+    try:
+        return (ast.literal_eval(valueStr), "")
+    except (ValueError, SyntaxError, MemoryError, RecursionError) as decodeError:
+        return (None, "not a valid python literal (%s)" % decodeError)
+
+# DecodePieceList: A non-empty list of {'type': ..., 'loc': ...} piece dicts.  Returns (pieceList, errorString)
+def DecodePieceList(valueStr):
+    pieceList, errorString = DecodeLiteral(valueStr)
+    if errorString != "":
+        return (None, errorString)
+    if not(isinstance(pieceList, list)) or pieceList == []:
+        return (None, "must be a non-empty list of pieces")
+    for piece in pieceList:
+        if not(isinstance(piece, dict)) or not(isinstance(piece.get("type"), str)) or not(isinstance(piece.get("loc"), str)):
+            return (None, "%s is not a {'type': ..., 'loc': ...} piece" % repr(piece))
+    return (pieceList, "")
+
+# DecodeField: Turn one raw line value into what its TestCase slot holds.  Returns (value, errorString)
+def DecodeField(testCase, key, valueStr):
+    if key == "Description":
+        return (valueStr, "")
+    if key == "request":
+        if valueStr == "":
+            return (None, "empty API request")
+        try:
+            testCase.requestDict = json.loads(valueStr)
+        except ValueError:
+            # Expected error tests may send a broken request on purpose - functional tests can't
+            if not(testCase.isExpectedErrorCase):
+                return (None, "API request is not valid JSON")
+        return (valueStr, "")
+    if key == "errorCode":
+        errorDict, errorString = DecodeLiteral(valueStr)
+        if errorString != "":
+            return (None, errorString)
+        if not(isinstance(errorDict, dict)) or not(isinstance(errorDict.get("code"), int)) or errorDict.get("code") == 0:
+            return (None, "must be a dict with a non-zero integer 'code'")
+        return (errorDict["code"], "")
+    if key == '"gameState"' or key == '"playerState"':
+        try:
+            value = json.loads(valueStr)
+        except ValueError:
+            return (None, "not a quoted string")
+        if not(isinstance(value, str)):
+            return (None, "not a quoted string")
+        return (value, "")
+    return DecodePieceList(valueStr) # movedPieces or expectedResponsePieces
+
+# ParseTestText: Parse the text of a test definition file in one pass.  fullPathTestFileName gives
+# us the test name (the file name w/o extension) and the kind of test (the file extension).
+# Returns a TestCase - check its errors list before using it.
+def ParseTestText(fullPathTestFileName, testText):
+    testFileName = os.path.basename(fullPathTestFileName)
+    testName = testFileName.split(".")[0] # Same as utilities.GetTestName()
+    fileext = os.path.splitext(testFileName)[1]
+    testCase = TestCase(fullPathTestFileName, testName, fileext == expFailExt)
+    requiredKeys = expFailTestKeys if testCase.isExpectedErrorCase else expPassTestKeys
+    foundKeys = []
+    for line in testText.splitlines():
+        if line.startswith("#"): # Skip Comment Lines
+            continue
+        key, colon, valueStr = line.partition(":")
+        key = key.strip()
+        # First entry for a key wins, and we only want the keys this kind of test uses
+        if colon == "" or key not in requiredKeys or key in foundKeys:
+            continue
+        foundKeys.append(key)
+        value, errorString = DecodeField(testCase, key, valueStr.strip())
+        if errorString != "":
+            testCase.errors.append("Process ERROR: Malformed '%s' entry in file %s: %s" % (key, fullPathTestFileName, errorString))
+        else:
+            setattr(testCase, testFileKeys[key], value)
+    for key in requiredKeys:
+        if key not in foundKeys:
+            testCase.errors.append("Process ERROR: No '%s' entry in file %s" % (key, fullPathTestFileName))
+    return testCase
+# END ParseTestText()
+
+# ParseTestFile: Read & parse one test definition file.  Returns a TestCase - check its errors list.
+def ParseTestFile(fullPathTestFileName):
+    fullPathTestFileName = fullPathTestFileName.rstrip()
+    try:
+        with open(fullPathTestFileName, 'r') as testFile:
+            testText = testFile.read()
+    except (OSError, UnicodeDecodeError) as readError:
+        testCase = TestCase(fullPathTestFileName, "", False)
+        testCase.errors.append("Process ERROR: Unable to read test file %s: %s" % (fullPathTestFileName, readError))
+        return testCase
+    return ParseTestText(fullPathTestFileName, testText)
+# END ParseTestFile()
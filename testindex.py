@@ -0,0 +1,232 @@
+'''
+      'testindex' module - a metadata index of the test definition corpus, so Run_SFCI_Tests
+      can pick the tests to run with a '--select' expression instead of a hand-written '-l'
+      list file.
+
+      For each test the index holds:
+          name       the test name                      type     passtest or expfail
+          code       expected errorCode (0 for passtest)
+          piece      moving piece type, upper case (P R N B Q K - castling is K)
+          color      the player moving (w or b)         move     the move as written
+          capture, castling, enpassant, promotion, check, checkmate   what kind of move it is
+          state      expected gameState ("", check, checkmate, stalemate)
+          board      board category - start (the standard starting position), midgame,
+                     endgame (12 pieces or fewer) or invalid (breaks the rules of chess)
+          pieces     number of pieces on the request board
+
+      A '--select' expression is a python-style condition on those fields - and, or, not,
+      ==, !=, <, <=, >, >=, in & not in - e.g.
+          piece==Q and code==-32020
+          capture and color==b and board in (midgame, endgame)
+      A bare word compared with a field is taken as a string.  Expressions are checked with
+      ast and evaluated by us, never by eval().
+
+      The index is a single sqlite3 file, read in full when it's opened.  A test file whose
+      mtime & size match its entry isn't opened at all - only new or changed files are parsed,
+      and their entries are written in one transaction when the index is closed.
+'''
+# Modules we'll need...
+import os
+import ast
+import json
+import sqlite3
+import operator
+import board # Local Module
+import testcase # Local Module
+import chessengine # Local Module
+
+indexFormatVersion = 1 # Bump whenever the metadata changes - older indexes are then rebuilt
+
+# The fields a '--select' expression can use
+selectFields = ("name", "type", "code", "piece", "color", "move", "capture", "castling", "enpassant",
+                "promotion", "check", "checkmate", "state", "board", "pieces")
+endgamePieces = 12 # Boards with this many pieces or fewer are endgame boards
+
+# GetMoveMetadata: What kind of move a MakeMove 'move' string is - e.g. 'Rfxf3', 'exd6(ep)', 'g8=Q', '0-0-0', 'Rgg8#'
+def GetMoveMetadata(move):
+    moveMetadata = {"piece" : "", "move" : "", "capture" : False, "castling" : False, "enpassant" : False,
+                    "promotion" : False, "check" : False, "checkmate" : False}
+    if not(isinstance(move, str)) or move == "":
+        return moveMetadata
+    moveMetadata["move"] = move
+    plainMove = move.replace("(ep)", "").rstrip("+#")
+    if plainMove.replace("O", "0") in ("0-0", "0-0-0"):
+        moveMetadata["castling"] = True
+        moveMetadata["piece"] = "K"
+    else:
+        moveMetadata["piece"] = move[0] if move[0] in "RNBQK" else "P"
+    moveMetadata["enpassant"] = "(ep)" in move
+    moveMetadata["capture"] = "x" in plainMove or moveMetadata["enpassant"]
+    moveMetadata["promotion"] = "=" in plainMove
+    moveMetadata["checkmate"] = move.endswith("#")
+    moveMetadata["check"] = move.endswith("+") or moveMetadata["checkmate"]
+    return moveMetadata
+# END GetMoveMetadata()
+
+# GetBoardCategory: start, midgame, endgame or invalid for a request boardState
+def GetBoardCategory(boardState):
+    requestBoard, errorString = board.BoardFromState(boardState)
+    if errorString != "" or chessengine.GetBoardError(requestBoard) != "":
+        return "invalid"
+    if requestBoard.squares == board.startBoard.squares:
+        return "start"
+    return "endgame" if requestBoard.NumPieces() <= endgamePieces else "midgame"
+# END GetBoardCategory()
+
+# GetTestMetadata: The index entry for a parsed testcase.TestCase
+def GetTestMetadata(testCase):
+    metadata = {"name" : testCase.name, "type" : "expfail" if testCase.isExpectedErrorCase else "passtest",
+                "code" : testCase.expectedErrorCode if testCase.isExpectedErrorCase else 0,
+                "color" : "", "state" : "" if testCase.isExpectedErrorCase else testCase.expectedGameState,
+                "board" : "invalid", "pieces" : 0}
+    params = testCase.requestDict.get("params") if isinstance(testCase.requestDict, dict) else None
+    if not(isinstance(params, dict)):
+        params = {}
+    metadata.update(GetMoveMetadata(params.get("move")))
+    if params.get("playerState") in ("w", "b"):
+        metadata["color"] = params["playerState"]
+    if isinstance(params.get("boardState"), list):
+        metadata["board"] = GetBoardCategory(params["boardState"])
+        metadata["pieces"] = len(params["boardState"])
+    if metadata["state"] in ("check", "checkmate"): # The expected response says so, even if the move doesn't
+        metadata["check"] = True
+        metadata["checkmate"] = metadata["checkmate"] or metadata["state"] == "checkmate"
+    return metadata
+# END GetTestMetadata()
+
+# The comparisons a '--select' expression may use
+compareOperators = {ast.Eq : operator.eq, ast.NotEq : operator.ne, ast.Lt : operator.lt, ast.LtE : operator.le,
+                    ast.Gt : operator.gt, ast.GtE : operator.ge,
+                    ast.In : lambda value, values: value in values, ast.NotIn : lambda value, values: value not in values}
+
+# CompileSelect: Turn a '--select' expression into a function of a test's metadata that says whether
+# to run it.  Returns (function, errorString) - function is None if the expression isn't one we take.
+def CompileSelect(selectText):
+    try:
+        expressionTree = ast.parse(selectText.strip(), mode="eval")
+    except SyntaxError as syntaxError:
+        return (None, "not a valid expression (%s)" % syntaxError.msg)
+    try:
+        return (CompileNode(expressionTree.body, False), "")
+    except ValueError as compileError:
+        return (None, str(compileError))
+# END CompileSelect()
+
+# CompileNode: One node of a '--select' expression as a function of a test's metadata.  isOperand is
+# True for the values being compared, where a bare word that isn't a field stands for itself.
+# Raises ValueError for anything we don't allow.
+def CompileNode(node, isOperand):
+    if isinstance(node, ast.BoolOp):
+        parts = [CompileNode(value, False) for value in node.values]
+        if isinstance(node.op, ast.And):
+            return lambda metadata: all(part(metadata) for part in parts)
+        return lambda metadata: any(part(metadata) for part in parts)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        inner = CompileNode(node.operand, False)
+        return lambda metadata: not(inner(metadata))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)) and isOperand and\
+       isinstance(node.operand, ast.Constant) and isinstance(node.operand.value, (int, float)):
+        number = -node.operand.value if isinstance(node.op, ast.USub) else node.operand.value
+        return lambda metadata: number
+    if isinstance(node, ast.Compare):
+        operands = [node.left] + node.comparators
+        if not(any(isinstance(operand, ast.Name) and operand.id in selectFields for operand in operands)):
+            raise ValueError("'%s' doesn't compare any test field" % ast.unparse(node))
+        values = [CompileNode(operand, True) for operand in operands]
+        compares = []
+        for compareOp in node.ops:
+            if type(compareOp) not in compareOperators:
+                raise ValueError("'%s' comparisons aren't allowed" % type(compareOp).__name__)
+            compares.append(compareOperators[type(compareOp)])
+        def Compare(metadata):
+            operandValues = [value(metadata) for value in values]
+            try:
+                return all(compare(operandValues[compareIter], operandValues[compareIter + 1])
+                           for compareIter, compare in enumerate(compares))
+            except TypeError: # e.g. code < 'Q' - no test matches that
+                return False
+        return Compare
+    if isinstance(node, ast.Name):
+        if node.id in selectFields:
+            fieldName = node.id
+            return lambda metadata: metadata.get(fieldName)
+        if isOperand:
+            word = node.id
+            return lambda metadata: word
+        raise ValueError("unknown test field '%s' - fields are %s" % (node.id, ", ".join(selectFields)))
+    if isinstance(node, ast.Constant) and isinstance(node.value, (str, int, float, bool)):
+        constant = node.value
+        return lambda metadata: constant
+    if isinstance(node, (ast.Tuple, ast.List, ast.Set)) and isOperand:
+        items = [CompileNode(item, True) for item in node.elts]
+        return lambda metadata: tuple(item(metadata) for item in items)
+    raise ValueError("'%s' isn't allowed in a select expression" % ast.unparse(node))
+# END CompileNode()
+
+class TestIndex:
+    def __init__(self, indexFileName, testCache=None):
+        self.testCache = testCache # Parse changed files through the test definition cache, if there is one
+        try:
+            self.connection = self.OpenIndex(indexFileName)
+        except sqlite3.Error:
+            # Unusable index file - start over with a fresh one
+            os.remove(indexFileName)
+            self.connection = self.OpenIndex(indexFileName)
+        # path : [mtime_ns, size, metadata] for every test we've indexed
+        self.entries = {}
+        for row in self.connection.execute("SELECT path, mtime, size, metadata FROM tests"):
+            self.entries[row[0]] = [row[1], row[2], json.loads(row[3])]
+        self.pendingRows = [] # (path, mtime_ns, size, metadata JSON) rows to write
+        self.numUnchanged = 0
+        self.numIndexed = 0
+
+    # Open (or create) the index file, dropping it if it was written by an older version of us
+    def OpenIndex(self, indexFileName):
+        connection = sqlite3.connect(indexFileName)
+        if connection.execute("PRAGMA user_version").fetchone()[0] != indexFormatVersion:
+            connection.execute("DROP TABLE IF EXISTS tests")
+            connection.execute("PRAGMA user_version = %d" % indexFormatVersion)
+        connection.execute("CREATE TABLE IF NOT EXISTS tests (path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, metadata TEXT)")
+        connection.commit()
+        return connection
+
+    # A test file's metadata - from the index if the file's mtime & size haven't changed, otherwise
+    # by parsing it (and updating the index).  None if the file isn't there.
+    def GetMetadata(self, fullPathTestFileName):
+        fullPathTestFileName = os.path.normpath(fullPathTestFileName.rstrip())
+        try:
+            fileStat = os.stat(fullPathTestFileName)
+        except OSError:
+            return None
+        entry = self.entries.get(fullPathTestFileName)
+        if entry != None and entry[0] == fileStat.st_mtime_ns and entry[1] == fileStat.st_size:
+            self.numUnchanged += 1
+            return entry[2]
+        if self.testCache != None:
+            testCase = self.testCache.GetTestCase(fullPathTestFileName)
+        else:
+            testCase = testcase.ParseTestFile(fullPathTestFileName)
+        metadata = GetTestMetadata(testCase)
+        self.entries[fullPathTestFileName] = [fileStat.st_mtime_ns, fileStat.st_size, metadata]
+        self.pendingRows.append((fullPathTestFileName, fileStat.st_mtime_ns, fileStat.st_size, json.dumps(metadata)))
+        self.numIndexed += 1
+        return metadata
+
+    # Generator of the tests in testSource whose metadata Select() says to run, in testSource order
+    def SelectTests(self, testSource, Select):
+        for fullPathTestFileName in testSource:
+            metadata = self.GetMetadata(fullPathTestFileName)
+            if metadata != None and Select(metadata):
+                yield fullPathTestFileName
+
+    # Write the new & changed entries to the index file and close it.  Safe to call more than once.
+    def Close(self):
+        if self.connection == None:
+            return
+        if self.pendingRows != []:
+            self.connection.executemany("INSERT OR REPLACE INTO tests VALUES (?, ?, ?, ?)", self.pendingRows)
+            self.connection.commit()
+        self.connection.close()
+        self.connection = None
+        self.pendingRows = []
+# END class TestIndex
@@ -0,0 +1,73 @@
+'''
+      'transport' module - the HTTP transport Run_SFCI_Tests uses to post requests to the SFCS API.
+      One APITransport holds a persistent pool of keep-alive connections shared by every
+      test (and every worker thread) in a run, with connect/read timeouts so a hung server
+      call can't stall the run, and a bounded retry with backoff for connection errors.
+'''
+# Modules we'll need...
+import time
+import json
+import requests  # Used for posting to SFCS API
+import requests.adapters
+
+# Seconds to wait before the first retry of a failed connection.  Doubles for each retry after that.
+retryBackoff = 0.5
+
+class APITransport:
+    def __init__(self, apiurl, apiheaders, poolSize=1, connectTimeout=5.0, readTimeout=30.0, maxRetries=2):
+        self.apiurl = apiurl
+        self.apiheaders = apiheaders
+        self.poolSize = poolSize
+        self.timeout = (connectTimeout, readTimeout) # requests takes a (connect, read) tuple
+        self.maxRetries = maxRetries
+        self.session = requests.Session()
+        self.adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=poolSize)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+    # Post one request body string and return the decoded JSON response.
+    def Post(self, data):
+        return json.loads(self.PostRaw(data))
+
+    # Post one request body string and return the raw response body bytes, undecoded.
+    # Only connection errors (which includes a connect timeout - nothing reached the server)
+    # are retried.  A read timeout raises straight back to the caller.
+    def PostRaw(self, data):
+        attempt = 0
+        while True:
+            try:
+                return self.session.post(self.apiurl, data, headers=self.apiheaders, timeout=self.timeout).content
+            except requests.exceptions.ConnectionError:
+                if attempt >= self.maxRetries:
+                    raise
+                time.sleep(retryBackoff * (2 ** attempt))
+                attempt += 1
+
+    # Open numConnections connections to the SFCS server ahead of the first test and park them
+    # in the pool.  Returns how many we managed to open - a failure here just means the
+    # tests open their own connections as usual.
+    def PreConnect(self, numConnections):
+        numConnected = 0
+        try:
+            preparedRequest = requests.Request("POST", self.apiurl).prepare()
+            if hasattr(self.adapter, "get_connection_with_tls_context"): # requests 2.32 or newer
+                connectionPool = self.adapter.get_connection_with_tls_context(preparedRequest, True)
+            else:
+                connectionPool = self.adapter.get_connection(self.apiurl)
+            # Take every connection slot first so each connect() opens a different socket
+            connections = [connectionPool._get_conn() for connIter in range(min(numConnections, self.poolSize))]
+            for connection in connections:
+                try:
+                    connection.timeout = self.timeout[0]
+                    connection.connect()
+                    numConnected += 1
+                except OSError:
+                    connection.close()
+                connectionPool._put_conn(connection)
+        except Exception:
+            pass
+        return numConnected
+
+    def Close(self):
+        self.session.close()
+# END class APITransport
@@ -5,6 +5,9 @@
 '''
 # Modules we'll need...
 import os
+import tempfile
+
+testFileExts = (".passtest", ".expfail") # Test definition files - Expected-PASS & Expected-FAIL
 
 # Write our summary to the *top* of the report or log files
 def PrependFile(outFileName, message):
@@ -13,6 +16,19 @@ def PrependFile(outFileName, message):
         outFile.seek(0) # Take me to the top...
         outFile.write(message + contents)
 
+# WriteFileAtomic: Write a whole text file so nobody ever sees half of it - the contents go to a temp
+# file in the same directory, which then replaces the target in one step
+def WriteFileAtomic(outFileName, contents):
+    outDir = os.path.dirname(os.path.abspath(outFileName))
+    tempFd, tempFileName = tempfile.mkstemp(dir=outDir, prefix="." + os.path.basename(outFileName) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(tempFd, "w") as tempFile:
+            tempFile.write(contents)
+        os.replace(tempFileName, outFileName)
+    except BaseException:
+        os.remove(tempFileName)
+        raise
+
 # return the total number items in a supplied list (e.g., pieces on a board)
 def CountItemsInList(lst):
     numPieces = 0
@@ -28,6 +44,14 @@ def RepresentsInt(s):
     except ValueError:
         return False
 
+# See if the string represents a valid float
+def RepresentsFloat(s):
+    try:
+        float(s)
+        return True
+    except ValueError:
+        return False
+
 # build a new piece object
 def MakePieceObj(pieceType, pieceLoc):
     pieceObj = {}
@@ -91,18 +115,53 @@ def GetFullPath(rootTestDir, testFileName):
     fullPath = os.path.join(rootTestDir, testFileName)
     return fullPath
 
+# ListTestDir: The names of the files and of the subdirectories in one test directory, each sorted.
+# One scandir() pass - the entry types come with the listing, so no file is stat'ed.
+def ListTestDir(testDir):
+    fileNames = []
+    dirNames = []
+    with os.scandir(testDir) as dirEntries:
+        for dirEntry in dirEntries:
+            if dirEntry.is_dir(follow_symlinks=False): # Don't follow links round in circles
+                dirNames.append(dirEntry.name)
+            elif dirEntry.is_file():
+                fileNames.append(dirEntry.name)
+    return (sorted(fileNames), sorted(dirNames))
+    # END def ListTestDir(testDir):
+
+# IterTestFiles: Generator of the full path of every test definition file (.passtest or .expfail)
+# in the test dirs and all of their subdirectories - depth first, in name order.  Each test is
+# handed out as soon as its directory has been read, so a run can start on the first tests while
+# the rest of a big tree is still being searched.  ListDir is ListTestDir() or a caching stand-in.
+# Unreadable directories are skipped.
+def IterTestFiles(testDirs, ListDir=ListTestDir, testExts=testFileExts):
+    for testDir in testDirs:
+        pendingDirs = [testDir]
+        while pendingDirs:
+            currentDir = pendingDirs.pop()
+            try:
+                fileNames, dirNames = ListDir(currentDir)
+            except OSError:
+                continue
+            for fileName in fileNames:
+                if fileName.endswith(testExts):
+                    yield os.path.join(currentDir, fileName)
+            pendingDirs.extend(os.path.join(currentDir, dirName) for dirName in reversed(dirNames))
+    # END def IterTestFiles(testDirs):
+
+# IterTestListFile: Generator of the full path of each test named in a test list file, one per line,
+# read a line at a time.  Blank lines are skipped.
+def IterTestListFile(testListFileName, rootTestDir):
+    with open(testListFileName, 'r') as testListFile:
+        for line in testListFile:
+            line = line.rstrip() # clean up
+            if line != "":
+                yield GetFullPath(rootTestDir, line) # expand to full path
+    # END def IterTestListFile(testListFileName, rootTestDir):
+
 # GetDefaultTests: Get a list of all tests to run by looking in our test case directories
 def GetDefaultTests(testList, testDirs):
-    from os.path import isfile, join
-    for testDir in testDirs:
-        #printterm("DEBUG: Looking in directory %s for testcases...\n" % testDir)
-        for f in os.listdir(testDir):
-            fileFullPath = (join(testDir,f))
-            #printterm("DEBUG: Found %s - testing to see if it's a file...\n" % f)
-            if isfile(fileFullPath):
-                #printterm("DEBUG: %s is a file - append it to the testList[]\n" % f)
-                testList.append(fileFullPath)
-    #printterm("DEBUG: Default testList is %s\n" % testList)
+    testList.extend(IterTestFiles(testDirs))
     return testList
     # END def GetDefaultTests(testList, testDirs):
 
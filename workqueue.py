@@ -0,0 +1,212 @@
+'''
+      'workqueue' module - coordinator/worker distributed test runs for Run_SFCI_Tests.
+      One coordinator owns the test queue and the run's report, log & summary.  Any number
+      of workers - on this machine or others - connect to it over TCP ('host:port') or a
+      Unix socket ('unix:/path'), pull tests one at a time as they have room for them, and
+      stream each result back as soon as it's done.  A slow worker just pulls fewer tests,
+      and the tests a worker had out when it went away go back on the queue for the others.
+
+      The protocol is newline-delimited JSON, one message per line:
+          worker -> coordinator  {"type": "hello", "worker": name, "slots": N}
+                                 {"type": "next"}                      (room for one more test)
+                                 {"type": "result", "id": k, "result": {...}, "output": [[dest, data], ...]}
+          coordinator -> worker  {"type": "test", "id": k, "test": <path relative to the test root>}
+                                 {"type": "done"}                      (nothing left - finish up & go)
+
+      Tests are named by their path relative to the runner's start directory, so every
+      machine can find them in its own checkout.
+'''
+# Modules we'll need...
+import os
+import time
+import json
+import socket
+import asyncio
+import threading
+import collections
+import concurrent.futures
+
+maxMessageBytes = 64 * 1024 * 1024 # Longest message line we'll read - a test's output can be big
+hangUpSeconds = 5.0 # How long the coordinator gives its workers to hang up once every result is in
+
+# ParseAddress: Turn 'host:port' or 'unix:/path' into ("tcp", host, port) or ("unix", path).
+# Returns None if it's neither.
+def ParseAddress(address):
+    if address.startswith("unix:"):
+        if address[5:] == "":
+            return None
+        return ("unix", address[5:])
+    host, colon, port = address.rpartition(":")
+    if colon == "" or not(port.isdigit()):
+        return None
+    return ("tcp", host or "127.0.0.1", int(port))
+# END ParseAddress()
+
+# EncodeMessage: One protocol message as a JSON line
+def EncodeMessage(message):
+    return (json.dumps(message) + "\n").encode("utf-8")
+# END EncodeMessage()
+
+# Coordinator: Hands out numTests tests (by index into testNames) to workers and calls
+# RecordResult(testIndex, result, output) for each result, in test order.
+class Coordinator:
+    def __init__(self, testNames, RecordResult, Report):
+        self.testNames = testNames
+        self.RecordResult = RecordResult
+        self.Report = Report                  # Report(message) - coordinator progress messages
+        self.pendingTests = collections.deque(range(len(testNames)))
+        self.finishedResults = {}             # testIndex : (result, output) waiting for the tests before it
+        self.nextToRecord = 0
+        self.waitingWorkers = collections.deque() # (writer, outstanding) of workers that asked while the queue was empty
+        self.allDone = None                   # asyncio.Event, set once every result is recorded
+        self.connectedWorkers = set()         # writers of the workers connected now
+        self.noWorkers = None                 # asyncio.Event, set while no worker is connected
+        self.numWorkers = 0
+
+    # Send a test (or 'done' if there's nothing left to hand out) to a worker that has room for one.
+    # Returns False if we've got nothing for it yet but tests are still out with other workers.
+    def HandOutTest(self, writer, outstanding):
+        if self.pendingTests:
+            testIndex = self.pendingTests.popleft()
+            outstanding.add(testIndex)
+            writer.write(EncodeMessage({"type" : "test", "id" : testIndex, "test" : self.testNames[testIndex]}))
+            return True
+        if self.allDone.is_set():
+            writer.write(EncodeMessage({"type" : "done"}))
+            return True
+        return False
+
+    # Give any tests that came back on the queue to the workers that are waiting for one
+    def ServeWaitingWorkers(self):
+        while self.waitingWorkers and (self.pendingTests or self.allDone.is_set()):
+            writer, outstanding = self.waitingWorkers.popleft()
+            if not(writer.is_closing()):
+                self.HandOutTest(writer, outstanding)
+
+    # File a result, and record every result we now have in test order
+    def AddResult(self, testIndex, result, output):
+        self.finishedResults[testIndex] = (result, output)
+        while self.nextToRecord in self.finishedResults:
+            result, output = self.finishedResults.pop(self.nextToRecord)
+            self.RecordResult(self.nextToRecord, result, output)
+            self.nextToRecord += 1
+        if self.nextToRecord == len(self.testNames):
+            self.allDone.set()
+            self.ServeWaitingWorkers() # Tell the idle workers we're done
+
+    # One worker connection, from its hello to its last result
+    async def ServeWorker(self, reader, writer):
+        outstanding = set() # Test indexes this worker has out
+        workerName = "?"
+        self.connectedWorkers.add(writer)
+        self.noWorkers.clear()
+        try:
+            while True:
+                line = await reader.readline()
+                if line == b"":
+                    break
+                message = json.loads(line)
+                if message.get("type") == "hello":
+                    workerName = message.get("worker", "?")
+                    self.numWorkers += 1
+                    self.Report("Worker %s connected with %d test slot(s)." % (workerName, message.get("slots", 1)))
+                elif message.get("type") == "next":
+                    if not(self.HandOutTest(writer, outstanding)):
+                        self.waitingWorkers.append((writer, outstanding))
+                elif message.get("type") == "result" and message.get("id") in outstanding:
+                    outstanding.discard(message["id"])
+                    self.AddResult(message["id"], message.get("result", {}), message.get("output", []))
+                await writer.drain()
+        except (OSError, ValueError) as workerError:
+            if not(self.allDone.is_set()): # Otherwise it just hung up on the last of our 'done's
+                self.Report("Lost worker %s: %s" % (workerName, repr(workerError)))
+        finally:
+            if outstanding:
+                self.Report("Worker %s left with %d test(s) unfinished - putting them back on the queue." % (workerName, len(outstanding)))
+                self.pendingTests.extendleft(sorted(outstanding, reverse=True))
+                self.ServeWaitingWorkers()
+            writer.close()
+            self.connectedWorkers.discard(writer)
+            if not(self.connectedWorkers):
+                self.noWorkers.set()
+
+    # Listen on address until every test's result is in, and the workers have been told we're done
+    async def Serve(self, address):
+        self.allDone = asyncio.Event()
+        self.noWorkers = asyncio.Event()
+        self.noWorkers.set()
+        if self.testNames == []:
+            return
+        if address[0] == "unix":
+            if os.path.exists(address[1]):
+                os.remove(address[1]) # Left over from an earlier run
+            server = await asyncio.start_unix_server(self.ServeWorker, path=address[1], limit=maxMessageBytes)
+        else:
+            server = await asyncio.start_server(self.ServeWorker, address[1], address[2], limit=maxMessageBytes)
+        try:
+            await self.allDone.wait()
+            try:
+                await asyncio.wait_for(self.noWorkers.wait(), hangUpSeconds)
+            except asyncio.TimeoutError:
+                for writer in list(self.connectedWorkers): # Hang up on any that didn't
+                    writer.close()
+                await asyncio.sleep(0.1)
+        finally:
+            server.close()
+            if address[0] == "unix" and os.path.exists(address[1]):
+                os.remove(address[1])
+# END class Coordinator
+
+# ConnectToCoordinator: A socket connected to the coordinator at address.  Keeps trying for up to
+# connectSeconds, so workers can be started before their coordinator is listening.
+def ConnectToCoordinator(address, connectSeconds):
+    giveUpTime = time.monotonic() + connectSeconds
+    while True:
+        try:
+            if address[0] == "unix":
+                workerSocket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    workerSocket.connect(address[1])
+                except OSError:
+                    workerSocket.close()
+                    raise
+                return workerSocket
+            return socket.create_connection((address[1], address[2]))
+        except OSError:
+            if time.monotonic() >= giveUpTime:
+                raise
+            time.sleep(0.25)
+# END ConnectToCoordinator()
+
+# RunWorker: Connect to the coordinator at address and run tests for it, numSlots at a time, until
+# it says we're done.  RunOneTest(testName) runs one test and returns (result dict, output list).
+# Returns how many tests we ran.
+def RunWorker(address, numSlots, workerName, RunOneTest, connectSeconds=30.0):
+    workerSocket = ConnectToCoordinator(address, connectSeconds)
+    sendLock = threading.Lock() # Results go back from the executor threads
+    def Send(message):
+        with sendLock:
+            workerSocket.sendall(EncodeMessage(message))
+    def RunAndSend(testIndex, testName):
+        result, output = RunOneTest(testName)
+        Send({"type" : "result", "id" : testIndex, "result" : result,
+              "output" : [[destination, "%s" % data] for destination, data in output]})
+        Send({"type" : "next"})
+    numRun = 0
+    with workerSocket, workerSocket.makefile("rb") as coordinatorFile,\
+         concurrent.futures.ThreadPoolExecutor(max_workers=numSlots) as executor:
+        Send({"type" : "hello", "worker" : workerName, "slots" : numSlots})
+        for slotIter in range(numSlots):
+            Send({"type" : "next"})
+        runningTests = []
+        for line in coordinatorFile:
+            message = json.loads(line)
+            if message.get("type") == "done":
+                break
+            if message.get("type") == "test":
+                runningTests.append(executor.submit(RunAndSend, message["id"], message["test"]))
+                numRun += 1
+        for runningTest in runningTests:
+            runningTest.result() # Raise anything that went wrong sending results back
+    return numRun
+# END RunWorker()